@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2024 Mael FEURGARD <mael.feurgard@enac.fr>
+#
+# This file is part of messages_python.
+#
+# messages_python is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# messages_python is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with messages_python.  If not, see <https://www.gnu.org/licenses/>.
+
+"""End-to-end benchmark of the recording and display pipeline, on synthetic traffic.
+
+Messages are injected through IvyRecorder.injectLine (the path of the Ivy callbacks),
+without a bus, and the widgets run on the Qt offscreen platform. Reported numbers:
+
+- ingest: messages/s, from the first injection until the ingest worker has logged everything
+- model: IvyModel.update time (first call, then median of the following ones)
+- filter: median time to apply a new filter to FilteredIvyModel
+- plot: median PlotWidget.update time, and median time to repaint the plot
+"""
+
+import os
+os.environ.setdefault('QT_QPA_PLATFORM','offscreen')
+
+import typing
+import argparse
+import json
+import platform
+import statistics
+import time
+
+import numpy as np
+
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtCore import QT_VERSION_STR,QModelIndex
+
+from msgRecord.ivyRecorder import IvyRecorder
+from msgRecord.qtMessageModel import IvyModel,FilteredIvyModel
+from msgRecord.loadGenerator import TrafficSpec,SyntheticTraffic
+from msgRecord.messageSchema import SCHEMAS
+from plotting.plotWidget import PlotWidget
+
+def timed(f:typing.Callable,repeat:int) -> list[float]:
+    """Durations of `repeat` calls of `f`, in s."""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+def wait_until(app:QApplication,condition:typing.Callable[[],bool],timeout:float=60.):
+    end = time.monotonic() + timeout
+    while not(condition()):
+        if time.monotonic() > end:
+            raise TimeoutError()
+        app.processEvents()
+        time.sleep(0.001)
+
+def visible_rows(model:FilteredIvyModel,parent:QModelIndex=QModelIndex()) -> int:
+    """Number of rows accepted by the filter (walks the whole tree, as an expanded view would)."""
+    count = model.rowCount(parent)
+    return count + sum(visible_rows(model,model.index(i,0,parent)) for i in range(count))
+
+def plottable_fields(traffic:SyntheticTraffic,count:int) -> list[str]:
+    """Up to `count` plot descriptions (drag and drop format) of numeric fields of the first sender."""
+    out = []
+    for n in traffic.msg_names:
+        for field in SCHEMAS.get(traffic.spec.class_name,n).fields:
+            f,typestr = field.name,field.typestr
+            if typestr.startswith('char') or typestr.startswith('string'):
+                continue
+            field = f if not('[' in typestr) else f"{f}[0]"
+            out.append(f"1:{traffic.spec.class_name}:{n}:{field}:1.0")
+            if len(out) >= count:
+                return out
+    return out
+
+def run(args:argparse.Namespace) -> dict:
+    app = QApplication.instance() or QApplication([])
+
+    spec = TrafficSpec(senders=args.senders,messages=args.messages,rate=args.rate,
+                       array_size=args.array_size,seed=args.seed)
+    traffic = SyntheticTraffic(spec)
+    start = time.time_ns() - int(args.duration * 1e9)
+    lines = traffic.lines(args.duration,start)
+
+    ivy = IvyRecorder("Benchmark",buffer_size=args.buffer_size,columnar=args.columnar,lazy=not(args.eager),
+                      per_message_signals=False,queue_size=len(lines)+1000,live=False)
+
+    # Register the senders before timing anything
+    for s in range(1,spec.senders+1):
+        ivy.injectLine(start,str(s),traffic.msg_names[0],traffic.payloads[traffic.msg_names[0]][0])
+    wait_until(app,lambda: len(ivy.records) == spec.senders)
+    for s in ivy.records.keys():
+        ivy.recordSender(s)
+
+    ########## Ingest ##########
+
+    baseline = ivy.ingestedCount()
+    t0 = time.perf_counter()
+    for l in lines:
+        ivy.injectLine(*l)
+    t_inject = time.perf_counter() - t0
+    wait_until(app,lambda: ivy.ingestedCount() >= baseline + len(lines) - ivy.droppedCount())
+    t_ingest = time.perf_counter() - t0
+
+    results = {
+        'messages': len(lines),
+        'inject_rate': len(lines)/t_inject,
+        'ingest_rate': len(lines)/t_ingest,
+        'dropped': ivy.droppedCount(),
+    }
+
+    ########## Model ##########
+
+    model = IvyModel(ivy)
+    model.pauseUpdates(True)
+    results['model_first_update'] = timed(model.update,1)[0]
+    results['model_update'] = statistics.median(timed(model.update,args.repeat))
+
+    filtered = FilteredIvyModel(model)
+    patterns = [n[:3] for n in traffic.msg_names]
+    i = iter(range(args.repeat))
+    def apply_filter():
+        filtered.setFilterRegularExpression(patterns[next(i) % len(patterns)])
+        visible_rows(filtered)
+    results['filter'] = statistics.median(timed(apply_filter,args.repeat))
+
+    ########## Plot ##########
+
+    plot = PlotWidget(ivy)
+    plot.pauseUpdates(True)
+    fields = plottable_fields(traffic,args.plots)
+    for txt in fields:
+        plot.addPlots(txt)
+    results['plot_curves'] = len(fields)
+    results['plot_update'] = statistics.median(timed(plot.update,args.repeat))
+    plot.resize(800,600)
+    results['plot_redraw'] = statistics.median(timed(plot.grab,args.repeat))
+
+    ivy.stop()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--senders',type=int,default=2)
+    parser.add_argument('--messages',type=int,default=20,help="Different messages per sender")
+    parser.add_argument('--rate',type=float,default=50.,help="Rate of each message, in Hz")
+    parser.add_argument('--duration',type=float,default=10.,help="Duration of the generated traffic, in s")
+    parser.add_argument('--array-size',type=int,default=8,help="Length of variable length arrays")
+    parser.add_argument('--buffer-size',type=int,default=200,help="Samples kept per message")
+    parser.add_argument('--columnar',action='store_true',help="Use ColumnarMessageLog (as rtplotter.py)")
+    parser.add_argument('--eager',action='store_true',help="Decode messages on reception (no lazy decoding)")
+    parser.add_argument('--plots',type=int,default=8,help="Number of plotted fields")
+    parser.add_argument('--repeat',type=int,default=20,help="Repetitions of each timed GUI operation")
+    parser.add_argument('--seed',type=int,default=0)
+    parser.add_argument('--json',metavar='FILE',help="Also write the results (and the parameters) to FILE")
+    args = parser.parse_args()
+
+    results = run(args)
+
+    print(f"Messages injected      : {results['messages']} ({results['dropped']} dropped)")
+    print(f"Injection rate         : {results['inject_rate']:.0f} msg/s")
+    print(f"Ingest rate            : {results['ingest_rate']:.0f} msg/s")
+    print(f"IvyModel.update        : {results['model_first_update']*1e3:.2f} ms (first), {results['model_update']*1e3:.2f} ms (median)")
+    print(f"FilteredIvyModel filter: {results['filter']*1e3:.2f} ms (median)")
+    print(f"PlotWidget.update      : {results['plot_update']*1e3:.2f} ms (median, {results['plot_curves']} curves)")
+    print(f"PlotWidget redraw      : {results['plot_redraw']*1e3:.2f} ms (median)")
+
+    if args.json is not None:
+        with open(args.json,'w') as f:
+            json.dump({'parameters':vars(args),
+                       'environment':{'python':platform.python_version(),'numpy':np.__version__,'qt':QT_VERSION_STR,
+                                      'machine':platform.machine(),'system':platform.system()},
+                       'results':results},f,indent=2)
+
+if __name__ == '__main__':
+    main()
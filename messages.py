@@ -18,15 +18,26 @@
 # along with messages_python.  If not, see <https://www.gnu.org/licenses/>.
 
 import typing
+import argparse
+import sys
+
+# Before the other imports, so that they are timed too
+from msgRecord.importProfile import IMPORT_PROFILE
+if __name__ == "__main__" and '--profile-imports' in sys.argv:
+    IMPORT_PROFILE.install()
 
 from msgRecord.ivyRecorder import IvyRecorder
+from msgRecord.messageSchema import SCHEMAS
+from msgRecord.perfStats import PERF
+from msgWidgets.exportAction import ExportAction
+from msgWidgets.perfPanel import PerfPanel
 from msgRecord.qtMessageModel import IvyModel,FilteredIvyModel
 
 from PyQt5.QtWidgets import QWidget,QMainWindow,QApplication,\
                             QVBoxLayout,QTabWidget,QSplitter,QTreeView
                             
 
-from PyQt5.QtCore import Qt,pyqtSlot
+from PyQt5.QtCore import Qt,QTimer,pyqtSlot
 
 from msgWidgets.messagesWidget import MessagesWidget
 from msgWidgets.pinnedMessagesView import PinnedMessages
@@ -83,15 +94,62 @@ QSplitter::handle {
 
 
 if __name__ == "__main__":
+    IMPORT_PROFILE.mark('imports done')
     app = QApplication([])
     app.setApplicationName("messages")
     
-    ivy = IvyRecorder(buffer_size=1)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--replay',nargs='+',metavar='SEGMENT',help="Replay recorded segment files (or directories) instead of listening to the Ivy bus")
+    parser.add_argument('--speed',type=float,default=1.,help="Replay speed factor, 0 for as fast as possible")
+    parser.add_argument('--data',nargs='+',metavar='FILE',help="Open Paparazzi telemetry logs (.data) instead of listening to the Ivy bus")
+    parser.add_argument('--attach',metavar='NAME',help="View the messages shared by another recorder (e.g. pprzrecord.py --share NAME) instead of listening to the Ivy bus")
+    parser.add_argument('--serve',metavar='ADDRESS',help="Also serve the received messages to local clients, on a Unix socket path or host:port (TCP)")
+    parser.add_argument('--latest-only',action='store_true',help="Only keep the newest message of each message for the tree, decoded when shown, instead of recording every sender (grouped messages keep their history)")
+    parser.add_argument('--perf',action='store_true',help="Time the processing stages and show them in a performance panel (same as PPRZ_PERF=1)")
+    parser.add_argument('--profile-imports',action='store_true',help="Print the import times and startup milestones on stderr (same as PPRZ_IMPORT_PROFILE=1)")
+    args = parser.parse_args()
+    if args.perf:
+        PERF.setEnabled(True)
+    
+    if args.attach is not None:
+        if args.replay is not None or args.data is not None:
+            parser.error("--attach cannot be combined with --replay or --data")
+        # Imported here, as it needs NumPy and shared memory support
+        from msgRecord.sharedRecorder import SharedRecorder,SharedStoreError
+        try:
+            ivy = SharedRecorder(args.attach)
+        except SharedStoreError as e:
+            parser.error(str(e))
+    else:
+        ivy = IvyRecorder(buffer_size=1,per_message_signals=False,live=args.replay is None and args.data is None,
+                          track_interest=args.latest_only)
+    if args.serve is not None:
+        if args.attach is not None:
+            parser.error("--serve cannot be combined with --attach")
+        ivy.startServing(args.serve)
+    # Only imported when needed (the data files need NumPy)
+    if args.replay is not None:
+        from msgRecord.segmentFile import Recording
+        from msgRecord.replay import ReplaySource
+        replay = ReplaySource(ivy,Recording(args.replay),args.speed)
+        app.aboutToQuit.connect(replay.stop)
+        # Start once the event loop runs, so that the widgets see the first senders
+        QTimer.singleShot(0,replay.start)
+    if args.data is not None:
+        from msgRecord.dataImport import start_import
+        # Parsed in the background, so that the window stays responsive
+        QTimer.singleShot(0,lambda: start_import(args.data,ivy))
     window = QMainWindow()
     window.setCentralWidget(MessagesMain(ivy,window))
+    window.menuBar().addMenu("File").addAction(ExportAction(ivy,window))
+    if PERF.enabled:
+        window.addDockWidget(Qt.DockWidgetArea.BottomDockWidgetArea,PerfPanel(window))
     window.setWindowTitle("Paparazzi link Messages")
     
     app.aboutToQuit.connect(ivy.stop)
     
     window.show()
+    IMPORT_PROFILE.mark('window shown')
+    # Once the window is painted, load the message definitions before the first messages need them
+    QTimer.singleShot(0,lambda: IMPORT_PROFILE.reportWhenDone(SCHEMAS.preload(),'message definitions loaded'))
     app.exec()
\ No newline at end of file
@@ -0,0 +1,187 @@
+# Copyright (C) 2024 Mael FEURGARD <mael.feurgard@enac.fr>
+#
+# This file is part of messages_python.
+#
+# messages_python is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# messages_python is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with messages_python.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Asyncio iteration over the messages ingested by a RecorderCore (see RecorderCore.stream).
+
+    async with recorder.stream(FieldIndex.from_ints(1,1,6,'phi')) as phi:
+        async for sample in phi:
+            print(sample.timestamp,sample.value)
+
+The ingest worker appends the new messages to a bounded buffer, and only wakes
+up the event loop when the consumer is waiting, so a stream costs a lock and an
+append per message. It never blocks the worker: when the buffer is full, messages
+are dropped (the oldest ones with DROP_OLDEST, the new ones with DROP_NEWEST)
+and counted in `dropped`.
+"""
+
+import typing
+import asyncio
+import threading
+import time
+from collections import deque
+
+from msgRecord.messageLog import MessageIndex,FieldIndex,TimedPprzMessage
+
+if typing.TYPE_CHECKING:
+    from msgRecord.recorderCore import RecorderCore
+
+DROP_OLDEST = 'drop_oldest'
+DROP_NEWEST = 'drop_newest'
+
+class Sample(typing.NamedTuple):
+    timestamp:int # Reception time, in ns
+    value:typing.Any # Field value, or TimedPprzMessage for a message stream
+
+class RecordStream():
+    """Asynchronous iterator over the new samples of a message or of a field.
+
+    With `batch`, each iteration yields the list of all the samples received since
+    the previous one. With `coalesce` (in s), iterations are at least that far apart:
+    samples received in between are yielded together (with `batch`), or only the
+    newest one is (without). The stream ends when the recorder stops, or on `close`.
+    """
+    def __init__(self,recorder:'RecorderCore',index:typing.Union[MessageIndex,FieldIndex],maxsize:int=1000,
+                 batch:bool=False,coalesce:typing.Optional[float]=None,policy:str=DROP_OLDEST):
+        if policy not in (DROP_OLDEST,DROP_NEWEST):
+            raise ValueError(f"Unknown drop policy: {policy}")
+        self.recorder = recorder
+        self.index = index
+        self.maxsize = maxsize
+        self.batch = batch
+        self.coalesce = coalesce
+        self.policy = policy
+        self.dropped = 0
+
+        if isinstance(index,FieldIndex):
+            self.msgIndex = index.msgIndex
+            self.field:typing.Optional[str] = index.field
+            self.array_index = index.array_index
+        else:
+            self.msgIndex = index
+            self.field = None
+            self.array_index = None
+
+        # Filled by the ingest worker, emptied by the event loop
+        self.__lock = threading.Lock()
+        self.__buffer:deque[TimedPprzMessage] = deque()
+        self.__waiter:typing.Optional[asyncio.Future] = None
+        self.__loop:typing.Optional[asyncio.AbstractEventLoop] = None
+        self.__closed = False
+        self.__last = 0. # time.monotonic() of the last iteration
+
+    def key(self) -> tuple[typing.Optional[int],int,int]:
+        return (self.msgIndex.sender_id,self.msgIndex.class_id,self.msgIndex.message_id)
+
+    ########## Ingest worker side ##########
+
+    def push(self,msg:TimedPprzMessage):
+        with self.__lock:
+            if len(self.__buffer) >= self.maxsize:
+                self.dropped += 1
+                if self.policy == DROP_NEWEST:
+                    return
+                self.__buffer.popleft()
+            self.__buffer.append(msg)
+            self.__wake()
+
+    def finish(self):
+        """End the iteration (called when the recorder stops)."""
+        with self.__lock:
+            self.__closed = True
+            self.__wake()
+
+    def __wake(self):
+        # Called with the lock held
+        waiter,self.__waiter = self.__waiter,None
+        if waiter is not None:
+            self.__loop.call_soon_threadsafe(lambda: waiter.done() or waiter.set_result(None))
+
+    ########## Event loop side ##########
+
+    def __sample(self,msg:TimedPprzMessage) -> typing.Optional[Sample]:
+        if self.field is None:
+            return Sample(msg.timestamp,msg)
+        try:
+            val = msg[self.field]
+            if self.array_index is not None:
+                val = val[self.array_index]
+        except (KeyError,IndexError,TypeError):
+            # e.g. an array shorter than the requested index
+            return None
+        return Sample(msg.timestamp,val)
+
+    def __take(self) -> list[TimedPprzMessage]:
+        with self.__lock:
+            msgs = list(self.__buffer)
+            self.__buffer.clear()
+            return msgs
+
+    async def __wait(self):
+        """Wait until there is something in the buffer (or the stream is closed)."""
+        while True:
+            with self.__lock:
+                if len(self.__buffer) > 0 or self.__closed:
+                    return
+                self.__loop = asyncio.get_running_loop()
+                waiter = self.__waiter = self.__loop.create_future()
+            await waiter
+
+    def __aiter__(self) -> 'RecordStream':
+        return self
+
+    async def __anext__(self) -> typing.Union[Sample,list[Sample]]:
+        while True:
+            if self.coalesce is not None:
+                delay = self.__last + self.coalesce - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            await self.__wait()
+            if self.batch or self.coalesce is not None:
+                msgs = self.__take()
+            else:
+                with self.__lock:
+                    msgs = [self.__buffer.popleft()] if len(self.__buffer) > 0 else []
+
+            if len(msgs) == 0:
+                # Closed, and nothing left
+                raise StopAsyncIteration
+
+            if not(self.batch):
+                # Only the newest sample is of interest when coalescing
+                msgs = msgs[-1:] if self.coalesce is not None else msgs
+                sample = self.__sample(msgs[0])
+                if sample is None:
+                    continue
+                self.__last = time.monotonic()
+                return sample
+
+            samples = [s for s in map(self.__sample,msgs) if s is not None]
+            if len(samples) > 0:
+                self.__last = time.monotonic()
+                return samples
+
+    def close(self):
+        """Stop receiving samples. Those already buffered are still yielded."""
+        self.recorder._removeStream(self)
+        self.finish()
+
+    async def __aenter__(self) -> 'RecordStream':
+        return self
+
+    async def __aexit__(self,*exc):
+        self.close()
@@ -0,0 +1,333 @@
+# Copyright (C) 2024 Mael FEURGARD <mael.feurgard@enac.fr>
+#
+# This file is part of messages_python.
+#
+# messages_python is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# messages_python is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with messages_python.  If not, see <https://www.gnu.org/licenses/>.
+
+import typing
+from collections.abc import Sequence
+
+import numpy as np
+
+from pprzlink.message import PprzMessage
+
+from msgRecord.messageLog import MessageLog,TimedPprzMessage,NoMessageError
+
+# Mapping : pprzlink base type -> numpy dtype (anything else is stored as Python objects)
+# pprzlink decodes `float` fields as Python floats: they are stored as float64 too, so that
+# both log types return the same values
+DTYPES:dict[str,np.dtype] = {
+    'int8'  : np.dtype(np.int8),
+    'uint8' : np.dtype(np.uint8),
+    'int16' : np.dtype(np.int16),
+    'uint16': np.dtype(np.uint16),
+    'int32' : np.dtype(np.int32),
+    'uint32': np.dtype(np.uint32),
+    'int64' : np.dtype(np.int64),
+    'uint64': np.dtype(np.uint64),
+    'float' : np.dtype(np.float64),
+    'double': np.dtype(np.float64),
+}
+
+def field_dtype(typestr:str) -> np.dtype:
+    return DTYPES.get(typestr.split('[')[0],np.dtype(object))
+
+def python_value(val):
+    """Convert a value read from a column back to the Python type pprzlink uses."""
+    if isinstance(val,(np.ndarray,np.generic)):
+        return val.tolist()
+    return val
+
+
+class FieldColumn():
+    """Mirrored ring buffer holding a single column of a `ColumnarMessageLog`.
+
+    Each sample is written twice, at `slot` and `slot+capacity`, so that any run
+    of at most `capacity` consecutive samples is a contiguous slice of `data`.
+    """
+    def __init__(self,capacity:int,dtype:np.dtype,width:typing.Optional[int]=None):
+        self.capacity = capacity
+        self.width = width
+        shape = (2*capacity,) if width is None else (2*capacity,width)
+        self.data = np.empty(shape,dtype=dtype) if dtype != object else np.full(shape,None,dtype=object)
+
+    def write(self,slot:int,val):
+        self.data[slot] = val
+        self.data[slot+self.capacity] = val
+
+    def view(self,start:int,count:int) -> np.ndarray:
+        return self.data[start:start+count]
+
+    def promote(self):
+        """Fall back to a 1-D object column (used when a value does not fit the current dtype/shape)."""
+        if self.data.dtype == object and self.width is None:
+            return
+        new = np.full(2*self.capacity,None,dtype=object)
+        for i in range(2*self.capacity):
+            new[i] = self.data[i]
+        self.data = new
+        self.width = None
+
+    @staticmethod
+    def from_values(capacity:int,values:np.ndarray) -> 'FieldColumn':
+        """Column holding `values` (at most `capacity` of them, oldest first)."""
+        width = values.shape[1] if values.ndim == 2 else None
+        new = FieldColumn(capacity,values.dtype,width)
+        count = len(values)
+        new.data[:count] = values
+        new.data[capacity:capacity+count] = values
+        return new
+
+    def resized(self,capacity:int,start:int,count:int) -> 'FieldColumn':
+        """Copy the `count` samples starting at `start` into a new column (keeping the newest ones)."""
+        keep = min(count,capacity)
+        new = FieldColumn(capacity,self.data.dtype,self.width)
+        vals = self.view(start+count-keep,keep)
+        new.data[:keep] = vals
+        new.data[capacity:capacity+keep] = vals
+        return new
+
+
+class ColumnarRow():
+    """Read-only access to one stored sample, with the same item access as `TimedPprzMessage`."""
+    def __init__(self,log:'ColumnarMessageLog',pos:int):
+        self._log = log
+        self._pos = pos
+        self.timestamp = int(log._timestamps.data[pos])
+
+    def __getitem__(self,key:str):
+        return python_value(self._log._columns[key].data[self._pos])
+
+
+class ColumnarQueue(Sequence):
+    """Newest-first sequence over a `ColumnarMessageLog`, standing in for `MessageLog.queue`."""
+    def __init__(self,log:'ColumnarMessageLog'):
+        self._log = log
+
+    def __len__(self) -> int:
+        return self._log.sample_count()
+
+    def __getitem__(self,i:int) -> typing.Union[TimedPprzMessage,ColumnarRow]:
+        count = len(self)
+        if i < 0:
+            i += count
+        if not(0 <= i < count):
+            raise IndexError("ColumnarQueue index out of range")
+
+        if i == 0:
+            return self._log.newest()
+        return ColumnarRow(self._log,self._log._start() + count - 1 - i)
+
+
+class ColumnarMessageLog(MessageLog):
+    """MessageLog storing its history in preallocated NumPy ring buffers.
+
+    There is one column per field (2-D blocks for array fields) plus an int64
+    column of reception timestamps. `timestamps()` and `field_values()` return
+    zero-copy views, oldest first, which are only valid until the next append.
+    The newest sample is also kept as a `TimedPprzMessage`, so that `newest()`,
+    `get_full_field()` and the other accessors behave as for a plain `MessageLog`.
+
+    Without a sample limit (`size=None`), the buffers double in size when full, and
+    are halved when the samples no longer fill a quarter of them (e.g. once trimmed by
+    a memory budget). `nbytes()` is the memory allocated for the buffers, and
+    `max_bytes` caps it, by limiting their capacity.
+    """
+
+    INITIAL_CAPACITY = 64 # Capacity of the buffers when the number of samples is not capped
+
+    ########## Storage ##########
+
+    def _initStorage(self,size:typing.Optional[int]):
+        self._capacity = self.INITIAL_CAPACITY if size is None else max(size,1)
+        self._next = 0 # Next slot to be written
+        self._count = 0
+        self._newest:typing.Optional[TimedPprzMessage] = None
+
+        self._timestamps = FieldColumn(self._capacity,np.dtype(np.int64))
+        # Mapping : field_name -> FieldColumn (created on first message)
+        self._columns:dict[str,FieldColumn] = dict()
+
+    def _createColumns(self,msg:TimedPprzMessage):
+        # Only kept once all of them are created (reading a value of `msg` may fail)
+        columns = dict()
+        for field in msg.schema().fields:
+            f = field.name
+            dtype = field_dtype(field.typestr)
+            width = None
+            if field.array_type and dtype != object:
+                try:
+                    width = len(msg[f])
+                except TypeError:
+                    dtype = np.dtype(object)
+            columns[f] = FieldColumn(self._capacity,dtype,width)
+        self._columns = columns
+
+    def _rowBytes(self) -> int:
+        return self._timestamps.data.itemsize + sum(c.data[0:1].nbytes for c in self._columns.values())
+
+    def _writeField(self,fieldname:str,slot:int,val):
+        col = self._columns[fieldname]
+        try:
+            col.write(slot,val)
+        except (TypeError,ValueError,OverflowError):
+            col.promote()
+            col.write(slot,val)
+
+    def _capacityLimit(self) -> typing.Optional[int]:
+        """Most samples the buffers may hold: `size`, and what fits in `max_bytes` once allocated."""
+        limits = []
+        if self.size is not None:
+            limits.append(max(self.size,1))
+        if self.max_bytes is not None and len(self._columns) > 0:
+            # Each sample is stored twice (see FieldColumn)
+            limits.append(max(self.max_bytes // (2*self._rowBytes()),1))
+        return min(limits) if len(limits) > 0 else None
+
+    def _store(self,msg:TimedPprzMessage):
+        if len(self._columns) == 0:
+            self._createColumns(msg)
+        elif self._count == self._capacity:
+            limit = self._capacityLimit()
+            if limit is None or self._capacity < limit:
+                self._reallocate(2*self._capacity if limit is None else min(2*self._capacity,limit))
+
+        slot = self._next
+        self._timestamps.write(slot,msg.timestamp)
+        for f in self._columns.keys():
+            self._writeField(f,slot,msg[f])
+
+        self._next = (slot + 1) % self._capacity
+        self._count = min(self._count + 1,self._capacity)
+        self._newest = msg
+
+    def _start(self) -> int:
+        return (self._next - self._count) % self._capacity
+
+    def _oldestTimestamp(self) -> int:
+        return int(self._timestamps.data[self._start()])
+
+    def _dropOldest(self):
+        self._count -= 1
+        # Give the memory back once the buffers are mostly empty (amortized O(1), as growing)
+        if self._capacity > self.INITIAL_CAPACITY and self._count <= self._capacity // 4:
+            self._reallocate(max(2*self._count,self.INITIAL_CAPACITY))
+            
+    def _evictBytes(self,max_bytes:int):
+        # Dropping samples does not free the preallocated buffers: shrink them instead
+        limit = self._capacityLimit()
+        if limit is not None and self._capacity > limit:
+            self._reallocate(limit)
+
+    def _resizeStorage(self,s:typing.Optional[int]):
+        self._reallocate(max(self.INITIAL_CAPACITY,self._count) if s is None else max(s,1))
+
+    def _reallocate(self,capacity:int):
+        start = self._start()
+
+        self._timestamps = self._timestamps.resized(capacity,start,self._count)
+        for f,col in self._columns.items():
+            self._columns[f] = col.resized(capacity,start,self._count)
+
+        self._count = min(self._count,capacity)
+        self._next = self._count % capacity
+        self._capacity = capacity
+
+    def load(self,timestamps:np.ndarray,columns:dict[str,np.ndarray],newest:TimedPprzMessage,
+             sizes:typing.Optional[np.ndarray]=None):
+        """Replace the content of the log by whole columns, oldest first (e.g. imported from a file).
+        
+        `newest` is the last sample, decoded, and `sizes` the size of each sample on the link, if known."""
+        with self._lock:
+            self.stats.updateMany(timestamps,sizes)
+            
+            if self.size is not None:
+                timestamps = timestamps[-self.size:]
+                columns = {f:v[-self.size:] for f,v in columns.items()}
+            count = len(timestamps)
+            capacity = max(self.INITIAL_CAPACITY,count) if self.size is None else max(self.size,1)
+            
+            self._timestamps = FieldColumn.from_values(capacity,np.asarray(timestamps,dtype=np.int64))
+            self._columns = {f:FieldColumn.from_values(capacity,v) for f,v in columns.items()}
+            self._capacity = capacity
+            self._count = count
+            self._next = count % capacity
+            self._seq += count
+            self._newest = newest
+            # Rollups of the previous content are rebuilt on next use
+            self._rollups = dict()
+            
+            if count > 0:
+                self._evict()
+                
+        # Index the new content
+        groupedBy = self.groupedBy()
+        if groupedBy is not None:
+            self.clearGroupBy()
+            self.groupBy(groupedBy)
+
+    def _positions(self,seqs:typing.Sequence[int]) -> np.ndarray:
+        return self._start() + (np.asarray(seqs,dtype=np.int64) - self._oldestSeq())
+    
+    def _timestampsAt(self,seqs:typing.Sequence[int]) -> np.ndarray:
+        return self._timestamps.data[self._positions(seqs)]
+    
+    def _valuesAt(self,fieldname:str,seqs:typing.Sequence[int]) -> np.ndarray:
+        try:
+            col = self._columns[fieldname]
+        except KeyError:
+            if len(seqs) == 0:
+                return np.empty(0)
+            raise
+        return col.data[self._positions(seqs)]
+    
+    def _sampleMessage(self,seq:int) -> TimedPprzMessage:
+        if seq == self._seq - 1:
+            return self._newest
+        pos = self._start() + seq - self._oldestSeq()
+        msg = PprzMessage(self._newest.msg_class,self._newest.name)
+        msg.set_values([python_value(self._columns[f].data[pos]) for f in msg.fieldnames])
+        return TimedPprzMessage(msg,int(self._timestamps.data[pos]))
+    
+    def _keyValues(self,fieldname:str) -> list:
+        return self.field_values(fieldname).tolist()
+
+    @property
+    def queue(self) -> ColumnarQueue:
+        return ColumnarQueue(self)
+
+    ########## Accessors ##########
+
+    def newest(self) -> TimedPprzMessage:
+        if self._count == 0:
+            raise NoMessageError()
+        return self._newest
+
+    def sample_count(self) -> int:
+        return self._count
+
+    def nbytes(self) -> int:
+        return self._timestamps.data.nbytes + sum(c.data.nbytes for c in self._columns.values())
+
+    def timestamps(self) -> np.ndarray:
+        return self._timestamps.view(self._start(),self._count)
+
+    def field_values(self,fieldname:str) -> np.ndarray:
+        try:
+            col = self._columns[fieldname]
+        except KeyError:
+            if self._count == 0:
+                return np.empty(0)
+            raise
+        return col.view(self._start(),self._count)
@@ -0,0 +1,249 @@
+# Copyright (C) 2024 Mael FEURGARD <mael.feurgard@enac.fr>
+#
+# This file is part of messages_python.
+#
+# messages_python is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# messages_python is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with messages_python.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Bulk import of Paparazzi telemetry logs (`.data` files) into ColumnarMessageLog.
+
+Each line of a `.data` file is "{time in s} {ac_id} {msg_name} {payload}", with
+the payload encoded as on the Ivy bus. Files are cut in chunks (at line
+boundaries), and each chunk is tokenized and grouped by message, possibly in
+several processes; the columns of all the chunks are then concatenated.
+"""
+
+import typing
+import os
+import time
+import pathlib
+import threading
+import multiprocessing
+
+import numpy as np
+
+from msgRecord.messageLog import TimedPprzMessage
+from msgRecord.columnarLog import ColumnarMessageLog,field_dtype
+from msgRecord.ivyParsing import UnknownMessageError,message_class,split_ivy_payload,parse_field_value,decode_ivy_payload
+from msgRecord.messageSchema import SCHEMAS,MessageSchema
+
+if typing.TYPE_CHECKING:
+    from msgRecord.ivyRecorder import IvyRecorder
+
+DATA_SUFFIX = '.data'
+CHUNK_SIZE = 16*1024*1024 # in bytes
+PARALLEL_THRESHOLD = 4*CHUNK_SIZE # Files larger than this are parsed by several processes
+
+_NUMERIC_TYPES = {'int8','uint8','int16','uint16','int32','uint32','int64','uint64','float','double'}
+_WIDE_INT_TYPES = {'int64','uint64'} # Not exact through a float64 above 2**53
+
+# Result of the parsing of a chunk, for one message:
+# (timestamps in s, payload sizes, mapping : field_name -> values, last payload)
+ChunkColumns = tuple[np.ndarray,np.ndarray,dict[str,np.ndarray],str]
+
+########## Chunk parsing ##########
+
+def chunk_bounds(path:typing.Union[str,pathlib.Path],chunk_size:int=CHUNK_SIZE) -> list[tuple[int,int]]:
+    """(start,end) offsets cutting the file in chunks of about `chunk_size` bytes, at line boundaries."""
+    size = os.path.getsize(path)
+    bounds = []
+    with open(path,'rb') as f:
+        start = 0
+        while start < size:
+            f.seek(min(start + chunk_size,size))
+            f.readline()
+            end = min(f.tell(),size)
+            bounds.append((start,end))
+            start = end
+    return bounds
+
+def _parse_columns(schema:MessageSchema,payloads:list[str]) -> dict[str,np.ndarray]:
+    fields = schema.fieldnames
+    types = [f.typestr for f in schema.fields]
+
+    if all(t in _NUMERIC_TYPES for t in types):
+        # Only scalar numbers: tokenize all the payloads at once
+        tokens = ' '.join(payloads).split()
+        if len(tokens) == len(payloads) * len(fields):
+            if any(t in _WIDE_INT_TYPES for t in types):
+                # Convert each column from the strings, with its own dtype
+                values = np.array(tokens).reshape(len(payloads),len(fields))
+                try:
+                    return {f:values[:,i].astype(field_dtype(t)) for i,(f,t) in enumerate(zip(fields,types))}
+                except (ValueError,OverflowError):
+                    pass # e.g. an int64 written as a float: parse each value below
+            else:
+                values = np.array(tokens,dtype=np.float64).reshape(len(payloads),len(fields))
+                return {f:values[:,i].astype(field_dtype(t)) for i,(f,t) in enumerate(zip(fields,types))}
+
+    rows = [split_ivy_payload(p) for p in payloads]
+    columns = dict()
+    for i,(f,t) in enumerate(zip(fields,types)):
+        vals = [parse_field_value(t,r[i]) if i < len(r) else None for r in rows]
+        columns[f] = _to_array(vals,field_dtype(t))
+    return columns
+
+def _to_array(vals:list,dtype:np.dtype) -> np.ndarray:
+    if dtype != object:
+        try:
+            return np.array(vals,dtype=dtype)
+        except (TypeError,ValueError,OverflowError):
+            pass
+    arr = np.full(len(vals),None,dtype=object)
+    for i,v in enumerate(vals):
+        arr[i] = v
+    return arr
+
+def parse_chunk(path:typing.Union[str,pathlib.Path],start:int,end:int) -> dict[tuple[str,str],ChunkColumns]:
+    """Parse the lines between offsets `start` and `end`, grouped by (sender,msg_name)."""
+    with open(path,'rb') as f:
+        f.seek(start)
+        text = f.read(end-start).decode(errors='replace')
+
+    # Mapping : (sender,msg_name) -> (times,payloads)
+    groups:dict[tuple[str,str],tuple[list[str],list[str]]] = dict()
+    for line in text.splitlines():
+        split = line.split(' ',3)
+        if len(split) < 3:
+            continue
+        key = (split[1],split[2])
+        try:
+            times,payloads = groups[key]
+        except KeyError:
+            times,payloads = groups[key] = ([],[])
+        times.append(split[0])
+        payloads.append(split[3] if len(split) > 3 else "")
+
+    result = dict()
+    for (sender,msg_name),(times,payloads) in groups.items():
+        try:
+            schema = SCHEMAS.get(message_class(sender,msg_name),msg_name)
+        except (UnknownMessageError,KeyError) as e:
+            print(f"Skipping {msg_name} from {sender}: {e}")
+            continue
+        # The newest message is decoded from the last payload: drop the last lines if they are
+        # malformed (e.g. a log cut off in the middle of a line)
+        while len(payloads) > 0 and not(_decodes(schema,sender,payloads[-1])):
+            print(f"Skipping a malformed {msg_name} from {sender} at {times[-1]} s")
+            times.pop()
+            payloads.pop()
+        if len(payloads) == 0:
+            continue
+        try:
+            timestamps = np.array(times,dtype=np.float64)
+            columns = _parse_columns(schema,payloads)
+        except (ValueError,IndexError) as e:
+            print(f"Skipping {msg_name} from {sender}: {e}")
+            continue
+        sizes = np.fromiter(map(len,payloads),dtype=np.int64,count=len(payloads))
+        result[(sender,msg_name)] = (timestamps,sizes,columns,payloads[-1])
+    return result
+
+def _decodes(schema:MessageSchema,sender:str,payload:str) -> bool:
+    if len(split_ivy_payload(payload)) != len(schema.fields):
+        return False
+    try:
+        decode_ivy_payload(sender,schema.name,payload)
+    except (UnknownMessageError,KeyError,ValueError,IndexError,TypeError):
+        return False
+    return True
+
+def _parse_chunk_args(args:tuple) -> dict[tuple[str,str],ChunkColumns]:
+    return parse_chunk(*args)
+
+def _concatenate(parts:list[np.ndarray]) -> np.ndarray:
+    if len(parts) == 1:
+        return parts[0]
+    try:
+        return np.concatenate(parts)
+    except ValueError:
+        # Mismatched shapes (e.g. arrays whose length changed): fall back to Python objects
+        return _to_array([v for p in parts for v in p],np.dtype(object))
+
+########## Import ##########
+
+def log_start_time(path:typing.Union[str,pathlib.Path]) -> int:
+    """Start of the log (in ns since the epoch), from its name (YY_MM_DD__HH_MM_SS), else 0."""
+    name = pathlib.Path(path).stem
+    try:
+        return int(time.mktime(time.strptime(name[:20],"%y_%m_%d__%H_%M_%S")) * 1e9)
+    except ValueError:
+        return 0
+
+def read_data_file(path:typing.Union[str,pathlib.Path],processes:typing.Optional[int]=None,
+                   start_time:typing.Optional[int]=None,
+                   chunk_size:int=CHUNK_SIZE) -> dict[tuple[int,int,int],ColumnarMessageLog]:
+    """Read a whole `.data` file, as one unbounded ColumnarMessageLog per (sender_id,class_id,msg_id).
+
+    `processes` is the number of worker processes (default: one per CPU, only for large files).
+    They are spawned rather than forked, as the caller may be running threads (Qt, Ivy, ingest).
+    `start_time` (in ns) is added to the times of the file (default: from the file name)."""
+    if start_time is None:
+        start_time = log_start_time(path)
+
+    bounds = chunk_bounds(path,chunk_size)
+    tasks = [(path,start,end) for start,end in bounds]
+
+    if processes != 1 and len(tasks) > 1 and os.path.getsize(path) > PARALLEL_THRESHOLD:
+        with multiprocessing.get_context('spawn').Pool(processes) as pool:
+            chunks = pool.map(_parse_chunk_args,tasks)
+    else:
+        chunks = [parse_chunk(*t) for t in tasks]
+
+    # Mapping : (sender,msg_name) -> parsed columns of each chunk, in file order
+    merged:dict[tuple[str,str],list[ChunkColumns]] = dict()
+    for c in chunks:
+        for key,cols in c.items():
+            merged.setdefault(key,[]).append(cols)
+
+    logs = dict()
+    for (sender,msg_name),parts in merged.items():
+        timestamps = start_time + (_concatenate([p[0] for p in parts]) * 1e9).astype(np.int64)
+        sizes = _concatenate([p[1] for p in parts])
+        columns = {f:_concatenate([p[2][f] for p in parts]) for f in parts[0][2].keys()}
+
+        try:
+            s_id,msg = decode_ivy_payload(sender,msg_name,parts[-1][3])
+        except (UnknownMessageError,KeyError,ValueError,IndexError,TypeError) as e:
+            print(f"Skipping {msg_name} from {sender}: {e}")
+            continue
+        newest = TimedPprzMessage(msg,int(timestamps[-1]))
+
+        log = ColumnarMessageLog(None)
+        log.load(timestamps,columns,newest,sizes)
+        logs[(s_id,newest.class_id,newest.msg_id)] = log
+
+    return logs
+
+def import_data_file(path:typing.Union[str,pathlib.Path],recorder:'IvyRecorder',
+                     processes:typing.Optional[int]=None,start_time:typing.Optional[int]=None) -> int:
+    """Load a `.data` file into `recorder` (see `read_data_file`). Returns the number of messages read."""
+    logs = read_data_file(path,processes,start_time)
+    recorder.loadLogs(logs)
+    return sum(l.sample_count() for l in logs.values())
+
+def start_import(paths:typing.Iterable[typing.Union[str,pathlib.Path]],recorder:'IvyRecorder',
+                 processes:typing.Optional[int]=None) -> threading.Thread:
+    """Import `.data` files one after the other in a background thread (e.g. not to block a GUI),
+    see `import_data_file`. Files that cannot be read are reported and skipped."""
+    paths = list(paths)
+    def run():
+        for path in paths:
+            try:
+                import_data_file(path,recorder,processes)
+            except Exception as e:
+                # Whatever went wrong with a file, import the next ones
+                print(f"Could not import {path}: {e}")
+    thread = threading.Thread(target=run,name="DataImport",daemon=True)
+    thread.start()
+    return thread
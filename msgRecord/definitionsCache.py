@@ -0,0 +1,133 @@
+# Copyright (C) 2024 Mael FEURGARD <mael.feurgard@enac.fr>
+#
+# This file is part of messages_python.
+#
+# messages_python is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# messages_python is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with messages_python.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Binary cache of what is derived from the messages XML, so that it is parsed once per XML change.
+
+Cache files are pickles, stored in $PPRZ_MESSAGES_CACHE (an empty value disables
+the cache) or $XDG_CACHE_HOME/pprz_messages. Each one starts with a header holding
+the format version of its content and the SHA-1 of the messages XML: a file
+written from another XML (or by another version) is ignored, then rewritten.
+
+`load_definitions()` fills the pprzlink dictionaries (messages_xml_map) from
+such a file instead of parsing the XML. Call it instead of `parse_messages()`.
+"""
+
+import typing
+import hashlib
+import os
+import pathlib
+import pickle
+import threading
+
+from pprzlink import messages_xml_map
+
+DEFINITIONS_VERSION = 1 # Increment when the pprzlink dictionaries change layout
+
+# SHA-1 of the messages XML, computed once per process
+_hash:typing.Optional[str] = None
+_hashed = False
+
+# Held while filling the pprzlink dictionaries (e.g. by the ingest worker and a preloading thread)
+_lock = threading.Lock()
+
+def definitions_file() -> typing.Optional[pathlib.Path]:
+    """Messages XML used by pprzlink, if it can be found."""
+    path = getattr(messages_xml_map,'default_messages_file',None)
+    if path is None:
+        return None
+    path = pathlib.Path(path)
+    return path if path.is_file() else None
+
+def definitions_hash() -> typing.Optional[str]:
+    global _hash,_hashed
+    if not(_hashed):
+        path = definitions_file()
+        _hash = hashlib.sha1(path.read_bytes()).hexdigest() if path is not None else None
+        _hashed = True
+    return _hash
+
+def cache_dir() -> typing.Optional[pathlib.Path]:
+    """Directory of the cache files (None if PPRZ_MESSAGES_CACHE is empty)."""
+    directory = os.environ.get('PPRZ_MESSAGES_CACHE')
+    if directory is None:
+        return pathlib.Path(os.environ.get('XDG_CACHE_HOME',pathlib.Path.home() / '.cache')) / 'pprz_messages'
+    elif directory == '':
+        return None
+    return pathlib.Path(directory)
+
+def cache_path(filename:str) -> typing.Optional[pathlib.Path]:
+    directory = cache_dir()
+    return directory / filename if directory is not None else None
+
+def read_cache(path:pathlib.Path,version:int,source:str) -> typing.Any:
+    """Content of `path`, if it was written by `version` from the definitions hashed as `source` (None otherwise)."""
+    try:
+        with open(path,'rb') as f:
+            header = pickle.load(f)
+            if header != (version,source):
+                return None
+            return pickle.load(f)
+    except (OSError,pickle.UnpicklingError,EOFError,AttributeError,ImportError,ValueError):
+        return None
+
+def write_cache(path:pathlib.Path,version:int,source:str,content:typing.Any):
+    try:
+        path.parent.mkdir(parents=True,exist_ok=True)
+        # Written aside then renamed, so that a concurrent reader never sees a partial file
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp,'wb') as f:
+            pickle.dump((version,source),f)
+            pickle.dump(content,f,protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp,path)
+    except (OSError,pickle.PicklingError) as e:
+        print(f"Could not write the cache file {path}: {e}")
+
+########## pprzlink dictionaries ##########
+
+def _dictionaries() -> dict[str,dict]:
+    """Module level dictionaries of messages_xml_map (filled by parse_messages)."""
+    return {k:v for k,v in vars(messages_xml_map).items() if isinstance(v,dict) and not(k.startswith('_'))}
+
+def load_definitions(cache:typing.Optional[pathlib.Path]=None):
+    """Make sure the pprzlink dictionaries are filled, from the cache file when possible
+    (default: see `cache_path`), by parsing the messages XML otherwise."""
+    if len(messages_xml_map.message_dictionary) > 0:
+        return
+    with _lock:
+        if len(messages_xml_map.message_dictionary) == 0:
+            _load_definitions(cache)
+
+def _load_definitions(cache:typing.Optional[pathlib.Path]):
+    if cache is None:
+        cache = cache_path('definitions.pickle')
+    source = definitions_hash()
+    if cache is not None and source is not None:
+        content = read_cache(cache,DEFINITIONS_VERSION,source)
+        if content is not None:
+            current = _dictionaries()
+            for name,d in content.items():
+                if name in current:
+                    # Filled in place, as other modules may hold references to these dictionaries
+                    current[name].clear()
+                    current[name].update(d)
+                else:
+                    setattr(messages_xml_map,name,d)
+            return
+
+    messages_xml_map.parse_messages()
+    if cache is not None and source is not None:
+        write_cache(cache,DEFINITIONS_VERSION,source,_dictionaries())
@@ -0,0 +1,323 @@
+# Copyright (C) 2024 Mael FEURGARD <mael.feurgard@enac.fr>
+#
+# This file is part of messages_python.
+#
+# messages_python is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# messages_python is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with messages_python.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Export of the recorded history, as one table per message.
+
+Each table has a `timestamp` column (in ns), one column per scalar field, and
+one column per element of numeric array fields (`name[i]`); other arrays are
+written as comma separated strings. Tables are written chunk by chunk, so the
+history is never copied as a whole:
+
+- Parquet: a directory, with one `{table}.parquet` file per message (needs pyarrow)
+- HDF5: a single file, with one group per message (needs h5py)
+- NPZ: a single archive, with one `{table}/{column}.npy` entry per column
+"""
+
+import typing
+import abc
+import pathlib
+import threading
+import tempfile
+import shutil
+import zipfile
+
+import numpy as np
+
+from msgRecord.messageLog import MessageLog,FieldIndex
+from msgRecord.columnarLog import ColumnarMessageLog,field_dtype
+
+# Mapping : file suffix -> export format
+EXPORT_FORMATS = {
+    '.parquet' : 'parquet',
+    '.h5'      : 'hdf5',
+    '.hdf5'    : 'hdf5',
+    '.npz'     : 'npz',
+}
+
+CHUNK_ROWS = 65536
+
+# Mapping : (sender_id,class_id,msg_id) -> list of (field_name,array_index)
+FieldSelection = dict[tuple[int,int,int],list[tuple[str,typing.Optional[int]]]]
+
+class ExportError(Exception):
+    pass
+
+def export_format(path:typing.Union[str,pathlib.Path]) -> str:
+    try:
+        return EXPORT_FORMATS[pathlib.Path(path).suffix.lower()]
+    except KeyError:
+        raise ExportError(f"Unknown export format for '{path}' (known suffixes: {', '.join(EXPORT_FORMATS.keys())})")
+
+def table_name(sender_id:int,log:MessageLog) -> str:
+    return f"{sender_id}_{log.msg_class()}_{log.msg_name()}"
+
+########## Table chunks ##########
+
+def _expand(name:str,values:np.ndarray,array_index:typing.Optional[int]=None) -> dict[str,np.ndarray]:
+    """Columns of a field: one per array element for numeric arrays, strings for other arrays."""
+    if values.ndim == 2:
+        indexes = range(values.shape[1]) if array_index is None else [array_index]
+        return {f"{name}[{i}]":values[:,i] for i in indexes}
+
+    if values.dtype == object:
+        strings = np.full(len(values),None,dtype=object)
+        for i,v in enumerate(values):
+            if isinstance(v,(list,tuple,np.ndarray)):
+                if array_index is not None:
+                    v = v[array_index] if array_index < len(v) else None
+                else:
+                    v = ','.join(map(str,v))
+            strings[i] = None if v is None else str(v)
+        return {name if array_index is None else f"{name}[{array_index}]":strings}
+
+    return {name:values}
+
+def _columnar_chunks(log:ColumnarMessageLog,fields:list[tuple[str,typing.Optional[int]]],
+                     chunk_rows:int) -> typing.Iterator[dict[str,np.ndarray]]:
+    # Work on the buffers as they are now: a reallocation replaces them without modifying them
+    count = log._count
+    start = log._start()
+    timestamps = log._timestamps
+    columns = dict(log._columns)
+    if count == 0:
+        return
+    newest = int(timestamps.data[start+count-1])
+
+    for i in range(0,count,chunk_rows):
+        n = min(chunk_rows,count-i)
+        # Fields first: a sample overwritten in the meantime has a timestamp newer than `newest`
+        values = [(f,a,columns[f].view(start+i,n).copy()) for f,a in fields]
+        t = timestamps.view(start+i,n).copy()
+        keep = t <= newest
+
+        chunk = {'timestamp':t[keep]}
+        for f,a,v in values:
+            chunk.update(_expand(f,v[keep],a))
+        yield chunk
+
+def _queue_chunks(log:MessageLog,fields:list[tuple[str,typing.Optional[int]]],
+                  chunk_rows:int) -> typing.Iterator[dict[str,np.ndarray]]:
+    msgs = tuple(log.queue) # Newest first
+    if len(msgs) == 0:
+        return
+    schema = log.schema()
+    dtypes = {f:field_dtype(schema.field(f).typestr) for f,_ in fields}
+
+    for i in range(len(msgs),0,-chunk_rows):
+        rows = msgs[max(i-chunk_rows,0):i][::-1]
+        chunk = {'timestamp':np.array([m.timestamp for m in rows],dtype=np.int64)}
+        for f,a in fields:
+            vals = [m[f] for m in rows]
+            try:
+                arr = np.array(vals,dtype=dtypes[f])
+            except (TypeError,ValueError,OverflowError):
+                arr = np.full(len(vals),None,dtype=object)
+                for j,v in enumerate(vals):
+                    arr[j] = v
+            chunk.update(_expand(f,arr,a))
+        yield chunk
+
+def table_chunks(log:MessageLog,fields:typing.Optional[list[tuple[str,typing.Optional[int]]]]=None,
+                 chunk_rows:int=CHUNK_ROWS) -> typing.Iterator[dict[str,np.ndarray]]:
+    """Columns of the history of `log`, oldest first, `chunk_rows` samples at a time.
+    `fields` is a list of (field_name,array_index) (default: all the fields, whole arrays)."""
+    if log.sample_count() == 0:
+        return iter(())
+    if fields is None:
+        fields = [(f,None) for f in log.fieldnames()]
+
+    if isinstance(log,ColumnarMessageLog):
+        return _columnar_chunks(log,fields,chunk_rows)
+    else:
+        return _queue_chunks(log,fields,chunk_rows)
+
+########## Writers ##########
+
+class _TableWriter(abc.ABC):
+    @abc.abstractmethod
+    def writeChunk(self,table:str,chunk:dict[str,np.ndarray]):
+        pass
+
+    def endTable(self,table:str):
+        pass
+
+    def close(self):
+        pass
+
+
+class _ParquetWriter(_TableWriter):
+    def __init__(self,path:pathlib.Path):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ExportError("Parquet export needs pyarrow")
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+
+        self.directory = path
+        self.directory.mkdir(parents=True,exist_ok=True)
+        self.__writers:dict[str,typing.Any] = dict()
+
+    def writeChunk(self,table:str,chunk:dict[str,np.ndarray]):
+        t = self.pa.table({k:self.pa.array(v) for k,v in chunk.items()})
+        try:
+            writer = self.__writers[table]
+            t = t.cast(writer.schema)
+        except KeyError:
+            writer = self.__writers[table] = self.pq.ParquetWriter(self.directory / f"{table}.parquet",t.schema)
+        writer.write_table(t)
+
+    def endTable(self,table:str):
+        writer = self.__writers.pop(table,None)
+        if writer is not None:
+            writer.close()
+
+    def close(self):
+        for t in list(self.__writers.keys()):
+            self.endTable(t)
+
+
+class _HDF5Writer(_TableWriter):
+    def __init__(self,path:pathlib.Path):
+        try:
+            import h5py
+        except ImportError:
+            raise ExportError("HDF5 export needs h5py")
+        self.h5py = h5py
+        self.file = h5py.File(path,'w')
+
+    def writeChunk(self,table:str,chunk:dict[str,np.ndarray]):
+        group = self.file.require_group(table)
+        for k,v in chunk.items():
+            if v.dtype == object:
+                v = np.array(['' if s is None else s for s in v],dtype=object)
+                dtype = self.h5py.string_dtype()
+            else:
+                dtype = v.dtype
+
+            try:
+                dset = group[k]
+            except KeyError:
+                dset = group.create_dataset(k,shape=(0,),maxshape=(None,),dtype=dtype,chunks=True)
+
+            n = dset.shape[0]
+            dset.resize((n+len(v),))
+            dset[n:] = v
+
+    def close(self):
+        self.file.close()
+
+
+class _NPZWriter(_TableWriter):
+    """Columns are spooled to temporary files, then copied into the archive with their final length."""
+    def __init__(self,path:pathlib.Path):
+        self.archive = zipfile.ZipFile(path,'w',zipfile.ZIP_STORED,allowZip64=True)
+        # Mapping : column -> (temporary file or list of strings,dtype,length)
+        self.__columns:dict[str,list] = dict()
+
+    def writeChunk(self,table:str,chunk:dict[str,np.ndarray]):
+        for k,v in chunk.items():
+            try:
+                spool = self.__columns[k]
+            except KeyError:
+                spool = self.__columns[k] = [[] if v.dtype == object else tempfile.TemporaryFile(),v.dtype,0]
+
+            if isinstance(spool[0],list):
+                spool[0].extend('' if s is None else str(s) for s in v)
+            else:
+                spool[0].write(np.ascontiguousarray(v,dtype=spool[1]).tobytes())
+            spool[2] += len(v)
+
+    def endTable(self,table:str):
+        for k,(spool,dtype,length) in self.__columns.items():
+            with self.archive.open(f"{table}/{k}.npy",'w',force_zip64=True) as entry:
+                if isinstance(spool,list):
+                    np.lib.format.write_array(entry,np.array(spool,dtype=str))
+                else:
+                    header = {'descr':np.lib.format.dtype_to_descr(dtype),'fortran_order':False,'shape':(length,)}
+                    np.lib.format.write_array_header_2_0(entry,header)
+                    spool.seek(0)
+                    shutil.copyfileobj(spool,entry)
+                    spool.close()
+        self.__columns.clear()
+
+    def close(self):
+        self.archive.close()
+
+
+_WRITERS:dict[str,typing.Callable[[pathlib.Path],_TableWriter]] = {
+    'parquet' : _ParquetWriter,
+    'hdf5'    : _HDF5Writer,
+    'npz'     : _NPZWriter,
+}
+
+########## Export ##########
+
+def field_selection(fields:typing.Iterable[FieldIndex]) -> FieldSelection:
+    """Group FieldIndex by message. A FieldIndex without sender_id selects the field for all senders."""
+    selection:FieldSelection = dict()
+    for f in fields:
+        selection.setdefault((f.sender_id,f.class_id,f.message_id),[]).append((f.field,f.array_index))
+    return selection
+
+def export_records(records:dict[int,dict[int,dict[int,MessageLog]]],path:typing.Union[str,pathlib.Path],
+                   fields:typing.Optional[typing.Iterable[FieldIndex]]=None,fmt:typing.Optional[str]=None,
+                   chunk_rows:int=CHUNK_ROWS,progress:typing.Optional[typing.Callable[[int,int],None]]=None,
+                   cancelled:typing.Optional[threading.Event]=None) -> int:
+    """Write the history of every MessageLog in `records` (e.g. `IvyRecorder.records`), or
+    only of the given `fields`, to `path`. The format is given by `fmt` or by the suffix of `path`.
+
+    `progress` is called with (tables written,table count) after each table.
+    Returns the number of rows written."""
+    path = pathlib.Path(path)
+    fmt = export_format(path) if fmt is None else fmt
+    selection = None if fields is None else field_selection(fields)
+
+    tables = []
+    for sender_id,classes in records.items():
+        for class_id,msgs in classes.items():
+            for msg_id,log in msgs.items():
+                if selection is None:
+                    tables.append((sender_id,log,None))
+                    continue
+                selected = selection.get((sender_id,class_id,msg_id),[]) + selection.get((None,class_id,msg_id),[])
+                if len(selected) > 0:
+                    tables.append((sender_id,log,selected))
+
+    try:
+        writer = _WRITERS[fmt](path)
+    except KeyError:
+        raise ExportError(f"Unknown export format: {fmt}")
+
+    rows = 0
+    try:
+        for i,(sender_id,log,selected) in enumerate(tables):
+            if cancelled is not None and cancelled.is_set():
+                break
+            name = table_name(sender_id,log) if log.sample_count() > 0 else None
+            for chunk in table_chunks(log,selected,chunk_rows):
+                writer.writeChunk(name,chunk)
+                rows += len(chunk['timestamp'])
+            if name is not None:
+                writer.endTable(name)
+            if progress is not None:
+                progress(i+1,len(tables))
+    finally:
+        writer.close()
+
+    return rows
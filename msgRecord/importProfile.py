@@ -0,0 +1,153 @@
+# Copyright (C) 2024 Mael FEURGARD <mael.feurgard@enac.fr>
+#
+# This file is part of messages_python.
+#
+# messages_python is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# messages_python is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with messages_python.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Startup profile: time spent importing each module, and time of the startup milestones.
+
+Enabled with the PPRZ_IMPORT_PROFILE environment variable (any value but 0), or
+with --profile-imports in messages.py and rtplotter.py. It must be enabled before
+the modules of interest are imported, so this module only uses the standard library.
+
+    IMPORT_PROFILE.mark('window shown')
+    IMPORT_PROFILE.report() # Printed on stderr
+
+Imports made after `report` are still timed, and listed by the next one.
+"""
+
+import typing
+import importlib.abc
+import os
+import sys
+import threading
+import time
+
+class _TimedLoader():
+    """Loader proxy timing the creation (e.g. loading an extension module) and the execution of a module."""
+    def __init__(self,loader,name:str,profile:'ImportProfile'):
+        self.__loader = loader
+        self.__name = name
+        self.__profile = profile
+
+    def create_module(self,spec):
+        self.__profile._enter()
+        t0 = time.perf_counter_ns()
+        try:
+            return self.__loader.create_module(spec)
+        finally:
+            self.__profile._exit(self.__name,time.perf_counter_ns()-t0)
+
+    def exec_module(self,module):
+        self.__profile._enter()
+        t0 = time.perf_counter_ns()
+        try:
+            self.__loader.exec_module(module)
+        finally:
+            self.__profile._exit(self.__name,time.perf_counter_ns()-t0)
+
+    def __getattr__(self,name:str):
+        # Everything else (get_source, get_resource_reader...) is the wrapped loader's
+        return getattr(self.__loader,name)
+
+class ImportProfile(importlib.abc.MetaPathFinder):
+    """Meta path finder wrapping the loaders of the other finders, to time the module executions."""
+    def __init__(self):
+        self.installed = False
+        self.start = time.perf_counter_ns()
+        # Mapping : module name -> (cumulative,self) time in ns
+        self.times:dict[str,tuple[int,int]] = dict()
+        self.marks:list[tuple[str,int]] = [] # (label,time since start in ns)
+        self.__local = threading.local() # Stack of the children times of the modules being imported
+
+    def install(self):
+        if not(self.installed):
+            self.installed = True
+            self.start = time.perf_counter_ns()
+            sys.meta_path.insert(0,self)
+
+    def uninstall(self):
+        if self.installed:
+            self.installed = False
+            sys.meta_path.remove(self)
+
+    def find_spec(self,fullname:str,path,target=None):
+        for finder in sys.meta_path:
+            if finder is self or not(hasattr(finder,'find_spec')):
+                continue
+            spec = finder.find_spec(fullname,path,target)
+            if spec is not None:
+                break
+        else:
+            return None
+
+        if spec.loader is not None and hasattr(spec.loader,'exec_module') and not(isinstance(spec.loader,_TimedLoader)):
+            spec.loader = _TimedLoader(spec.loader,fullname,self)
+        return spec
+
+    def _enter(self):
+        stack = self.__stack()
+        stack.append(0)
+
+    def _exit(self,name:str,duration:int):
+        stack = self.__stack()
+        children = stack.pop()
+        if len(stack) > 0:
+            stack[-1] += duration
+        cumul,self_t = self.times.get(name,(0,0))
+        self.times[name] = (cumul+duration,self_t+duration-children)
+
+    def __stack(self) -> list[int]:
+        try:
+            return self.__local.stack
+        except AttributeError:
+            stack = self.__local.stack = []
+            return stack
+
+    def mark(self,label:str):
+        """Record a startup milestone (does nothing when the profile is not installed)."""
+        if self.installed:
+            self.marks.append((label,time.perf_counter_ns()-self.start))
+
+    def report(self,top:int=25,file:typing.Optional[typing.TextIO]=None):
+        """Print the milestones, the total import time and the `top` slowest imports (by self time)."""
+        if not(self.installed):
+            return
+        file = sys.stderr if file is None else file
+
+        total = sum(self_t for _,self_t in self.times.values())
+        print(f"Startup profile ({len(self.times)} modules imported, {total/1e6:.1f} ms importing)",file=file)
+        for label,t in self.marks:
+            print(f"  {t/1e6:9.1f} ms  {label}",file=file)
+
+        print(f"  {'cumulative':>12} {'self':>9}  module",file=file)
+        slowest = sorted(self.times.items(),key=lambda kv: kv[1][1],reverse=True)[:top]
+        for name,(cumul,self_t) in slowest:
+            print(f"  {cumul/1e6:9.1f} ms {self_t/1e6:6.1f} ms  {name}",file=file)
+        file.flush()
+
+    def reportWhenDone(self,thread:threading.Thread,label:str):
+        """`report` once `thread` (e.g. a preloading thread) is done, marking it as `label`."""
+        if not(self.installed):
+            return
+        def wait():
+            thread.join()
+            self.mark(label)
+            self.report()
+        threading.Thread(target=wait,name="ImportProfileReport",daemon=True).start()
+
+
+IMPORT_PROFILE = ImportProfile()
+if os.environ.get('PPRZ_IMPORT_PROFILE','0') not in ('','0'):
+    IMPORT_PROFILE.install()
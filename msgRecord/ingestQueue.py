@@ -0,0 +1,60 @@
+# Copyright (C) 2024 Mael FEURGARD <mael.feurgard@enac.fr>
+#
+# This file is part of messages_python.
+#
+# messages_python is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# messages_python is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with messages_python.  If not, see <https://www.gnu.org/licenses/>.
+
+import typing
+from collections import deque
+
+class IngestQueue():
+    """Bounded FIFO between the Ivy callbacks and the ingest worker.
+
+    Only `deque.append` (producer side) and `deque.popleft` (consumer side) are
+    used, which are atomic in CPython: neither side ever takes a lock or waits.
+    When the queue is full, new items are dropped and counted. Control items
+    (see `pushControl`) are never dropped, and keep their place among the others.
+    """
+    def __init__(self,capacity:int=100000):
+        self.capacity = capacity
+        self.__queue:typing.Deque = deque()
+        
+        self.pushed = 0
+        self.dropped = 0
+        
+    def __len__(self) -> int:
+        return len(self.__queue)
+        
+    def push(self,item) -> bool:
+        if len(self.__queue) >= self.capacity:
+            self.dropped += 1
+            return False
+        
+        self.__queue.append(item)
+        self.pushed += 1
+        return True
+    
+    def pushControl(self,item):
+        """Queue an item that must not be lost (e.g. a new sender), even if the queue is full."""
+        self.__queue.append(item)
+        self.pushed += 1
+    
+    def drain(self,max_items:typing.Optional[int]=None) -> list:
+        """Pop (at most `max_items`) queued items, oldest first."""
+        count = len(self.__queue)
+        if max_items is not None:
+            count = min(count,max_items)
+            
+        popleft = self.__queue.popleft
+        return [popleft() for _ in range(count)]
@@ -0,0 +1,111 @@
+# Copyright (C) 2024 Mael FEURGARD <mael.feurgard@enac.fr>
+#
+# This file is part of messages_python.
+#
+# messages_python is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# messages_python is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with messages_python.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Decoding of raw Ivy lines ("{sender} {msg_name} {payload}") into PprzMessage."""
+
+import typing
+import re
+
+from pprzlink import messages_xml_map
+from pprzlink.message import PprzMessage
+
+from msgRecord.definitionsCache import load_definitions
+
+class UnknownMessageError(Exception):
+    def __init__(self, msg_name:str) -> None:
+        super().__init__(f"Unknown message: {msg_name}")
+
+# Mapping : (numeric_sender,msg_name) -> class_name
+_class_cache:dict[tuple[bool,str],str] = dict()
+
+# Arrays are sent either as |a,b,c| or "a,b,c", char arrays may contain spaces
+_ARRAY_SPLIT = re.compile(r'([|"][^|"]*[|"])')
+
+_INT_TYPES = {'int8','uint8','int16','uint16','int32','uint32','int64','uint64'}
+_FLOAT_TYPES = {'float','double'}
+
+def sender_id(sender:str) -> int:
+    """Numeric id of an Ivy sender. Named senders (ground agents) are all mapped to 0."""
+    return int(sender) if sender.isdigit() else 0
+
+def message_class(sender:str,msg_name:str) -> str:
+    """Name of the class of `msg_name`, as sent by `sender`.
+
+    Messages from aircraft are looked up in 'telemetry' first, messages from
+    named agents in 'ground' first, then in all the other classes."""
+    numeric = sender.isdigit()
+    try:
+        return _class_cache[(numeric,msg_name)]
+    except KeyError:
+        pass
+
+    load_definitions()
+
+    preferred = 'telemetry' if numeric else 'ground'
+    classes = [preferred] + [c for c in messages_xml_map.message_dictionary.keys() if c != preferred]
+
+    for c in classes:
+        if msg_name in messages_xml_map.message_dictionary.get(c,()):
+            _class_cache[(numeric,msg_name)] = c
+            return c
+
+    raise UnknownMessageError(msg_name)
+
+def is_numeric(typestr:str) -> bool:
+    """True for the pprzlink types of integer and float fields (scalars or arrays)."""
+    base_type = typestr.split('[')[0]
+    return base_type in _INT_TYPES or base_type in _FLOAT_TYPES
+
+def split_ivy_payload(payload:str) -> list[str]:
+    """Split an Ivy payload into one token per field (same rules as pprzlink)."""
+    tokens = []
+    for s in _ARRAY_SPLIT.split(payload):
+        s = s.strip()
+        if s == '':
+            continue
+        if '|' in s or '"' in s:
+            tokens.append(s)
+        else:
+            # Consecutive spaces do not make empty tokens
+            tokens.extend(s.split())
+    return tokens
+
+def _scalar_converter(base_type:str) -> typing.Callable[[str],typing.Any]:
+    if base_type in _INT_TYPES:
+        return int
+    elif base_type in _FLOAT_TYPES:
+        return float
+    else:
+        return str
+
+def parse_field_value(typestr:str,token:str):
+    """Convert the Ivy token of a single field, of pprzlink type `typestr`."""
+    base_type = typestr.split('[')[0]
+    if not('[' in typestr):
+        return _scalar_converter(base_type)(token.strip('"'))
+    
+    token = token.strip('|"')
+    if base_type == 'char':
+        return token
+    conv = _scalar_converter(base_type)
+    return [conv(v) for v in token.split(',') if v != '']
+
+def decode_ivy_payload(sender:str,msg_name:str,payload:str) -> tuple[int,PprzMessage]:
+    """Decode an already split Ivy line into (sender_id,PprzMessage)."""
+    msg = PprzMessage(message_class(sender,msg_name),msg_name)
+    msg.ivy_string_to_payload(payload)
+    return sender_id(sender),msg
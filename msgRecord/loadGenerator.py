@@ -0,0 +1,107 @@
+# Copyright (C) 2024 Mael FEURGARD <mael.feurgard@enac.fr>
+#
+# This file is part of messages_python.
+#
+# messages_python is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# messages_python is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with messages_python.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Synthetic Ivy traffic, generated from the pprzlink message definitions (for benchmarks)."""
+
+import typing
+import dataclasses
+import random
+import string
+
+from pprzlink import messages_xml_map
+
+from msgRecord.messageSchema import SCHEMAS
+from msgRecord.definitionsCache import load_definitions
+
+_INT_RANGES = {
+    'int8'  : (-2**7,2**7-1),
+    'uint8' : (0,2**8-1),
+    'int16' : (-2**15,2**15-1),
+    'uint16': (0,2**16-1),
+    'int32' : (-2**31,2**31-1),
+    'uint32': (0,2**32-1),
+    'int64' : (-2**63,2**63-1),
+    'uint64': (0,2**64-1),
+}
+
+@dataclasses.dataclass
+class TrafficSpec:
+    senders:int = 1 # Number of aircraft (ids 1..senders)
+    messages:int = 10 # Number of different messages sent by each aircraft
+    rate:float = 10. # Rate of each message, in Hz
+    array_size:int = 8 # Length of variable length arrays
+    class_name:str = 'telemetry'
+    variants:int = 16 # Number of different payloads generated per message
+    seed:int = 0
+
+
+class SyntheticTraffic():
+    """Ivy lines (sender,msg_name,payload) with random field values, following `spec`.
+
+    The messages are picked among the ones of `spec.class_name` (in a repeatable
+    way, given `spec.seed`), and `variants` payloads are generated per message
+    beforehand, so that producing traffic is cheap."""
+    def __init__(self,spec:TrafficSpec):
+        self.spec = spec
+        self.__rng = random.Random(spec.seed)
+
+        load_definitions()
+        names = sorted(messages_xml_map.message_dictionary[spec.class_name].keys())
+        self.msg_names = self.__rng.sample(names,min(spec.messages,len(names)))
+
+        # Mapping : msg_name -> payloads
+        self.payloads:dict[str,list[str]] = {n:[self.__payload(n) for _ in range(spec.variants)] for n in self.msg_names}
+
+    def __value(self,typestr:str) -> str:
+        base_type = typestr.split('[')[0]
+        if base_type in _INT_RANGES.keys():
+            low,high = _INT_RANGES[base_type]
+            return str(self.__rng.randint(low,high))
+        elif base_type in ('float','double'):
+            return f"{self.__rng.uniform(-1000,1000):.6f}"
+        else:
+            return ''.join(self.__rng.choices(string.ascii_letters,k=8))
+
+    def __payload(self,msg_name:str) -> str:
+        tokens = []
+        for field in SCHEMAS.get(self.spec.class_name,msg_name).fields:
+            typestr = field.typestr
+            if not('[' in typestr):
+                tokens.append(self.__value(typestr))
+            elif typestr.startswith('char'):
+                tokens.append('"' + self.__value('char') + '"')
+            else:
+                length = typestr.split('[')[1][:-1]
+                length = int(length) if length != '' else self.spec.array_size
+                tokens.append('|' + ','.join(self.__value(typestr) for _ in range(length)) + '|')
+        return ' '.join(tokens)
+
+    def period(self) -> int:
+        """Time between two messages of the same type, in ns."""
+        return int(1e9/self.spec.rate)
+
+    def lines(self,duration:float,start:int=0) -> list[tuple[int,str,str,str]]:
+        """All the lines sent during `duration` s, from `start` (in ns), as (timestamp,sender,msg_name,payload)."""
+        period = self.period()
+        count = int(duration * self.spec.rate)
+        lines = []
+        for k in range(count):
+            t = start + k * period
+            for s in range(1,self.spec.senders+1):
+                for n in self.msg_names:
+                    lines.append((t,str(s),n,self.payloads[n][(k+s) % self.spec.variants]))
+        return lines
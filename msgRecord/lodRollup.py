@@ -0,0 +1,263 @@
+# Copyright (C) 2024 Mael FEURGARD <mael.feurgard@enac.fr>
+#
+# This file is part of messages_python.
+#
+# messages_python is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# messages_python is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with messages_python.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Multi-resolution min/max/mean rollups of a numeric field, for plotting long histories.
+
+Level 0 splits time into buckets of `BASE_BUCKET` ns, each following level
+uses buckets `FACTOR` times wider. A bucket keeps the min and max values (with
+their timestamps), the sum and the number of samples. Samples only update the
+current bucket of level 0; a closed bucket is merged into the current bucket of
+the next level, so the amortized cost per sample is O(1).
+
+Each level keeps its last `MAX_BUCKETS` closed buckets, so the coarse levels
+cover much more time than the raw history of a MessageLog. The newest samples are
+still in the open buckets of the finer levels: they are merged in when reading a
+coarse level, so that it reaches the live edge.
+"""
+
+import typing
+import threading
+from array import array
+
+import numpy as np
+
+BASE_BUCKET = 10_000_000 # Width of the level 0 buckets, in ns
+FACTOR = 4 # Ratio between the bucket widths of two successive levels
+LEVELS = 8 # Number of levels (the coarsest buckets are FACTOR**(LEVELS-1) * BASE_BUCKET wide)
+MAX_BUCKETS = 2048 # Closed buckets kept per level
+
+# Open bucket, as a list : [bucket_id,t_min,v_min,t_max,v_max,sum,count]
+Bucket = list
+
+def merge_bucket(o:Bucket,bucket:Bucket):
+    """Merge the samples of `bucket` into `o` (in place, the bucket id of `o` is kept)."""
+    if bucket[2] < o[2]:
+        o[1] = bucket[1]
+        o[2] = bucket[2]
+    if bucket[4] > o[4]:
+        o[3] = bucket[3]
+        o[4] = bucket[4]
+    o[5] += bucket[5]
+    o[6] += bucket[6]
+
+class RollupLevel():
+    """Closed buckets of one level (oldest first, in parallel arrays) and the bucket being filled."""
+    def __init__(self,width:int,capacity:int):
+        self.width = width
+        self.capacity = capacity
+
+        self.ids = array('q')
+        self.tmin = array('q')
+        self.vmin = array('d')
+        self.tmax = array('q')
+        self.vmax = array('d')
+        self.sum = array('d')
+        self.count = array('q')
+
+        self.open:typing.Optional[Bucket] = None
+
+    def __columns(self) -> tuple[array,...]:
+        return self.ids,self.tmin,self.vmin,self.tmax,self.vmax,self.sum,self.count
+
+    def __close(self,bucket:Bucket):
+        for col,val in zip(self.__columns(),bucket):
+            col.append(val)
+        # Trim by large blocks, so that the cost stays amortized O(1)
+        excess = len(self.ids) - self.capacity
+        if excess >= self.capacity:
+            for col in self.__columns():
+                del col[:excess]
+
+    def add(self,t:int,v:float) -> typing.Optional[Bucket]:
+        """Add one sample. Returns the bucket it closed, if any.
+
+        Samples older than the current bucket are merged into it."""
+        o = self.open
+        if o is not None and t // self.width <= o[0]:
+            if v < o[2]:
+                o[1] = t
+                o[2] = v
+            if v > o[4]:
+                o[3] = t
+                o[4] = v
+            o[5] += v
+            o[6] += 1
+            return None
+
+        self.open = [t // self.width,t,v,t,v,v,1]
+        if o is not None:
+            self.__close(o)
+        return o
+
+    def merge(self,bucket_id:int,bucket:Bucket) -> typing.Optional[Bucket]:
+        """Merge a bucket of a finer level, which falls in `bucket_id` at this level. Returns the bucket it closed, if any."""
+        o = self.open
+        if o is not None and bucket_id <= o[0]:
+            merge_bucket(o,bucket)
+            return None
+
+        self.open = [bucket_id] + bucket[1:]
+        if o is not None:
+            self.__close(o)
+        return o
+
+    def start(self) -> typing.Optional[int]:
+        """Timestamp of the oldest sample accounted for, in ns (approximately: the older of the min and max of the oldest bucket)."""
+        if len(self.ids) > 0:
+            return min(self.tmin[0],self.tmax[0])
+        if self.open is not None:
+            return min(self.open[1],self.open[3])
+        return None
+
+    def buckets(self,t0:int,t1:int,opened:typing.Optional[list[Bucket]]=None) -> tuple[np.ndarray,...]:
+        """Copies of the columns (ids,t_min,v_min,t_max,v_max,sum,count) of the buckets overlapping [t0,t1].
+        
+        The closed buckets are followed by `opened` (default: the open bucket of this level)."""
+        ids = np.frombuffer(self.ids,dtype=np.int64) if len(self.ids) > 0 else np.empty(0,dtype=np.int64)
+        lo = int(np.searchsorted(ids,t0 // self.width,'left'))
+        hi = int(np.searchsorted(ids,t1 // self.width,'right'))
+        del ids # Release the buffer, the arrays may be resized
+
+        cols = [np.array(c[lo:hi],dtype=np.int64 if c.typecode == 'q' else np.float64) for c in self.__columns()]
+        if opened is None:
+            opened = [self.open] if self.open is not None else []
+        opened = [o for o in opened if t0 // self.width <= o[0] <= t1 // self.width]
+        if len(opened) > 0:
+            cols = [np.append(c,v) for c,v in zip(cols,zip(*opened))]
+        return tuple(cols)
+
+    def nbytes(self) -> int:
+        return sum(c.itemsize * c.buffer_info()[1] for c in self.__columns())
+
+
+class FieldRollup():
+    """Rollups of a single numeric series (a scalar field, or one element of an array field)."""
+    def __init__(self,base:int=BASE_BUCKET,factor:int=FACTOR,levels:int=LEVELS,capacity:int=MAX_BUCKETS):
+        self.factor = factor
+        self.levels = [RollupLevel(base * factor**k,capacity) for k in range(levels)]
+
+        # Samples are added by the ingest worker and read by the GUI
+        self.__lock = threading.Lock()
+
+        # Samples received while the rollup is being backfilled (see beginBackfill)
+        self.__pending:typing.Optional[list[tuple[int,float]]] = None
+
+    def __cascade(self,closed:typing.Optional[Bucket]):
+        k = 1
+        while closed is not None and k < len(self.levels):
+            closed = self.levels[k].merge(closed[0] // self.factor,closed)
+            k += 1
+
+    def add(self,t:int,v):
+        with self.__lock:
+            if self.__pending is not None:
+                self.__pending.append((t,v))
+                return
+            self.__cascade(self.levels[0].add(t,float(v)))
+
+    def beginBackfill(self):
+        """Hold the samples added from now on, until `extend` has added the history received before."""
+        with self.__lock:
+            self.__pending = []
+
+    def extend(self,timestamps:np.ndarray,values:np.ndarray):
+        """Add a batch of samples, oldest first. Raises ValueError if the values are not numeric."""
+        timestamps = np.asarray(timestamps,dtype=np.int64)
+        values = np.asarray(values,dtype=np.float64)
+
+        with self.__lock:
+            if len(timestamps) > 0:
+                level = self.levels[0]
+                ids = timestamps // level.width
+                starts = np.flatnonzero(np.diff(ids,prepend=ids[0]-1))
+                ends = np.append(starts[1:],len(ids)) - 1
+
+                # Sorting by (bucket,value) puts the min of each bucket at its start and the max at its end
+                order = np.lexsort((values,ids))
+                imin = order[starts]
+                imax = order[ends]
+                sums = np.add.reduceat(values,starts)
+                counts = np.diff(np.append(starts,len(ids)))
+
+                for b,i,j,s,n in zip(ids[starts].tolist(),imin.tolist(),imax.tolist(),sums.tolist(),counts.tolist()):
+                    bucket = [b,int(timestamps[i]),float(values[i]),int(timestamps[j]),float(values[j]),s,n]
+                    self.__cascade(level.merge(b,bucket))
+
+            pending,self.__pending = self.__pending,None
+            last = timestamps[-1] if len(timestamps) > 0 else None
+            for t,v in pending or ():
+                if last is None or t > last:
+                    self.__cascade(self.levels[0].add(t,float(v)))
+
+    def start(self) -> typing.Optional[int]:
+        """Oldest time covered by the rollup, in ns (None if empty)."""
+        starts = [l.start() for l in self.levels if l.start() is not None]
+        return min(starts) if len(starts) > 0 else None
+
+    def __opened(self,k:int) -> list[Bucket]:
+        """Open buckets of level `k`, with the samples still in the open buckets of the finer levels
+        (not merged into level `k` yet) merged in, oldest first (called with the lock held)."""
+        opened:list[Bucket] = []
+        for j in range(k,-1,-1):
+            o = self.levels[j].open
+            if o is None:
+                continue
+            bucket_id = o[0] // self.factor**(k-j)
+            if len(opened) > 0 and bucket_id <= opened[-1][0]:
+                merge_bucket(opened[-1],o)
+            else:
+                opened.append([bucket_id] + o[1:])
+        return opened
+        
+    def __levelBuckets(self,t0:int,t1:int,n:int) -> tuple[RollupLevel,tuple[np.ndarray,...]]:
+        level = self.level(t0,t1,n)
+        return level,level.buckets(t0,t1,self.__opened(self.levels.index(level)))
+
+    def level(self,t0:int,t1:int,n:int) -> RollupLevel:
+        """Finest level with at most about `n` buckets in [t0,t1], going coarser if it does not reach back to t0."""
+        k = 0
+        while k < len(self.levels) - 1 and (t1 - t0) // self.levels[k].width > n:
+            k += 1
+        while k < len(self.levels) - 1:
+            start = self.levels[k].start()
+            if start is not None and start <= t0:
+                break
+            k += 1
+        return self.levels[k]
+
+    def buckets(self,t0:int,t1:int,n:int) -> tuple[np.ndarray,np.ndarray,np.ndarray,np.ndarray]:
+        """(start,min,max,mean) of at most about `n` buckets covering [t0,t1] (times in ns)."""
+        with self.__lock:
+            level,(ids,_,vmin,_,vmax,sums,counts) = self.__levelBuckets(t0,t1,n)
+        return ids*level.width,vmin,vmax,sums/np.maximum(counts,1)
+
+    def decimated(self,t0:int,t1:int,n:int) -> tuple[np.ndarray,np.ndarray]:
+        """At most about `n` points covering [t0,t1]: the min and the max of each bucket, in time order."""
+        with self.__lock:
+            _,(_,tmin,vmin,tmax,vmax,_,_) = self.__levelBuckets(t0,t1,max(n//2,1))
+
+        first = tmin <= tmax
+        times = np.empty(2*len(tmin),dtype=np.int64)
+        values = np.empty(2*len(tmin),dtype=np.float64)
+        times[0::2] = np.where(first,tmin,tmax)
+        times[1::2] = np.where(first,tmax,tmin)
+        values[0::2] = np.where(first,vmin,vmax)
+        values[1::2] = np.where(first,vmax,vmin)
+        return times,values
+
+    def nbytes(self) -> int:
+        return sum(l.nbytes() for l in self.levels)
@@ -18,21 +18,33 @@
 import dataclasses
 import typing
 import time
+import sys
+import threading
+import bisect
 from functools import total_ordering
 
 
-from collections import deque
+from collections import deque,OrderedDict
 
 from pprzlink.message import PprzMessage,PprzMessageField
 
+from msgRecord.messageStats import MessageStats
+
+# Only imported on use (see MessageLog.rollup), so that the headless recorder starts fast
+if typing.TYPE_CHECKING:
+    import numpy as np
+    from msgRecord.lodRollup import FieldRollup
+from msgRecord.ivyParsing import message_class,split_ivy_payload,parse_field_value
+from msgRecord.messageSchema import SCHEMAS,MessageSchema,FieldSchema
+
 @dataclasses.dataclass
 class MessageIndex:
     sender_id:typing.Optional[int] # Use None for Unknown sender
     class_id:int
     message_id:int
     
-    def pprzMsg(self) -> PprzMessage:
-        return PprzMessage(self.class_id,self.message_id)
+    def schema(self) -> MessageSchema:
+        return SCHEMAS.get(self.class_id,self.message_id)
     
 @dataclasses.dataclass
 class FieldIndex:
@@ -56,10 +68,18 @@ class FieldIndex:
     def message_id(self) -> int:
         return self.msgIndex.message_id
     
-    def pprzMsg(self) -> PprzMessage:
-        return self.msgIndex.pprzMsg()
+    def schema(self) -> MessageSchema:
+        return self.msgIndex.schema()
+    
+    def fieldSchema(self) -> FieldSchema:
+        return self.msgIndex.schema().field(self.field)
 
 
+# Rough memory cost of a record and of each decoded field, in bytes (see TimedPprzMessage.nbytes)
+RECORD_OVERHEAD = 200
+FIELD_OVERHEAD = 120
+TOKEN_OVERHEAD = 60 # String header and list slot of each token of a split payload (see LazyTimedMessage)
+
 @total_ordering
 class TimedPprzMessage():
     def __init__(self, msg:PprzMessage, t:typing.Optional[int]=None):
@@ -73,6 +93,9 @@ class TimedPprzMessage():
     def get_full_field(self, fieldname:str) -> PprzMessageField:
         return self.msg.get_full_field(fieldname)
     
+    def schema(self) -> MessageSchema:
+        return SCHEMAS.get(self.msg.class_id,self.msg.msg_id)
+    
     def __getattr__(self,key:str):
         return self.msg.__getattr__(key)
     
@@ -118,6 +141,104 @@ class TimedPprzMessage():
     
     def index(self) -> MessageIndex:
         return MessageIndex(None,self.class_id,self.msg_id)
+    
+    def nbytes(self) -> int:
+        """Rough estimate of the memory held by this record, in bytes."""
+        return RECORD_OVERHEAD + FIELD_OVERHEAD * len(self.schema().fields)
+    
+    def wire_size(self) -> typing.Optional[int]:
+        """Size of the message payload on the bus, in bytes (None if unknown)."""
+        return None
+        
+
+class LazyTimedMessage(TimedPprzMessage):
+    """TimedPprzMessage keeping the raw Ivy payload, decoded only on demand.
+    
+    Item access (`msg[field]`) only converts the requested field, and the result is
+    cached. The full `PprzMessage` (needed by `get_full_field`) is only built on
+    first use, then cached as well.
+    """
+    def __init__(self, sender:str, msg_name:str, payload:str, t:typing.Optional[int]=None):
+        self.payload = payload
+        self._timestamp = time.time_ns() if t is None else t
+        
+        self._schema = SCHEMAS.get(message_class(sender,msg_name),msg_name)
+        # Splitting is cheap, and catches truncated payloads before the message is logged
+        self._tokens = split_ivy_payload(payload)
+        if len(self._tokens) != len(self._schema.fields):
+            raise ValueError(f"{msg_name} has {len(self._schema.fields)} fields, got {len(self._tokens)}")
+        self._values:typing.Optional[dict[str,typing.Any]] = None
+        self._msg:typing.Optional[PprzMessage] = None
+        
+    @property
+    def msg(self) -> PprzMessage:
+        if self._msg is None:
+            msg = self._schema.newMessage()
+            msg.ivy_string_to_payload(self.payload)
+            self._msg = msg
+        return self._msg
+    
+    @property
+    def fieldnames(self) -> list[str]:
+        return self._schema.fieldnames
+    
+    def schema(self) -> MessageSchema:
+        return self._schema
+    
+    def __getitem__(self,key:str):
+        if self._values is None:
+            self._values = dict()
+        else:
+            try:
+                return self._values[key]
+            except KeyError:
+                pass
+            
+        field = self._schema.by_name[key]
+        val = self._values[key] = parse_field_value(field.typestr,self._tokens[field.position])
+        return val
+    
+    def __getattr__(self,key:str):
+        if key.startswith('_'):
+            raise AttributeError(key)
+        try:
+            return self[key]
+        except KeyError:
+            raise AttributeError(key)
+    
+    @property
+    def name(self) -> str:
+        return self._schema.name
+    
+    @property
+    def msg_class(self) -> str:
+        return self._schema.msg_class
+    
+    @property
+    def msg_id(self) -> int:
+        return self._schema.msg_id
+    
+    @property
+    def class_id(self) -> int:
+        return self._schema.class_id
+    
+    def wire_size(self) -> int:
+        return len(self.payload)
+    
+    def nbytes(self) -> int:
+        # The payload, and its tokens (about the same characters again)
+        raw = sys.getsizeof(self.payload) + len(self.payload) + TOKEN_OVERHEAD * len(self._tokens)
+        if self._msg is None and self._values is None:
+            return RECORD_OVERHEAD + raw
+        return super().nbytes() + raw
+        
+
+@dataclasses.dataclass
+class RetentionPolicy:
+    """How much history a MessageLog keeps. Any limit set to None is disabled."""
+    window:typing.Optional[float] = None # Keep the samples received during the last `window` seconds
+    max_samples:typing.Optional[int] = 10 # Hard cap on the number of samples
+    max_bytes:typing.Optional[int] = None # Hard cap on the (estimated) memory used by the samples
         
 
 class NoMessageError(Exception):
@@ -128,18 +249,141 @@ class GroupByError(Exception):
     pass
 
 class MessageLog():
-    def __init__(self,size:int=10):
-        self.queue:typing.Deque[TimedPprzMessage] = deque(maxlen=size)
-        self.period:typing.Optional[float] = None 
+    MAX_GROUPS = 256 # Default maximum number of subgroups (beyond, the least recently updated one is dropped)
+    
+    def __init__(self,size:typing.Optional[int]=10,window:typing.Optional[float]=None,max_bytes:typing.Optional[int]=None):
+        self.size = size # Maximum number of samples (None for no limit)
+        self.window = window # Duration kept, in s, relative to the newest sample (None for no limit)
+        self.max_bytes = max_bytes # Maximum memory used by the samples (None for no limit)
+        self.stats = MessageStats() # Reception statistics, over the whole life of the log
+        self.lastAccess = time.monotonic() # Last time a consumer read this log (see touch)
         
         self.__groupBy:typing.Optional[str] = None
-        self.__groups:dict[typing.Any,MessageLog] = dict()
+        # Mapping : value -> MessageGroup, least recently updated first
+        self.__groups:OrderedDict[typing.Any,MessageGroup] = OrderedDict()
+        self.maxGroups = self.MAX_GROUPS
+        
+        # Sequence number of the next stored sample (see MessageGroup)
+        self._seq = 0
         
+        # Held while storing samples, and while reading them for a MessageGroup (which may be in another thread)
+        self._lock = threading.Lock()
         
-    def updateSize(self,s:int):
-        self.queue = deque(self.queue,maxlen=s)
-        for m in self.__groups.values():
-            m.updateSize(s)
+        # Mapping : (field_name,array_index) -> FieldRollup (see decimated)
+        # Replaced, never modified in place, as it is read by the ingest worker
+        self._rollups:dict[tuple[str,typing.Optional[int]],'FieldRollup'] = dict()
+        
+        self._initStorage(size)
+        
+    ########## Storage ##########
+    
+    def _initStorage(self,size:typing.Optional[int]):
+        """Create the sample storage. Samples are kept newest first."""
+        self.queue:typing.Deque[TimedPprzMessage] = deque(maxlen=size)
+        # Size of each sample when it was stored, in the same order as `queue`: a lazy message
+        # grows once decoded, so subtracting its current size on eviction would not balance `_bytes`
+        self._sizes:typing.Deque[int] = deque(maxlen=size)
+        self._bytes = 0
+        
+    def _store(self,msg:TimedPprzMessage):
+        if len(self.queue) == self.queue.maxlen and len(self.queue) > 0:
+            # The oldest sample is about to be dropped by the deque
+            self._bytes -= self._sizes[-1]
+        size = msg.nbytes()
+        self.queue.appendleft(msg)
+        self._sizes.appendleft(size)
+        self._bytes += size
+        
+    def _resizeStorage(self,s:typing.Optional[int]):
+        # Keep the newest samples (the queue is filled from the left)
+        self.queue = deque(list(self.queue)[:s],maxlen=s)
+        self._sizes = deque(list(self._sizes)[:s],maxlen=s)
+        self._bytes = sum(self._sizes)
+        
+    def _oldestTimestamp(self) -> int:
+        return self.queue[-1].timestamp
+        
+    def _dropOldest(self):
+        self.queue.pop()
+        self._bytes -= self._sizes.pop()
+        
+    def _evict(self):
+        """Apply the time window and memory limits. The newest sample is always kept.
+        Each sample is dropped at most once, so this is amortized O(1) per append."""
+        if self.window is not None:
+            limit = self.newest().timestamp - int(self.window * 1e9)
+            while self.sample_count() > 1 and self._oldestTimestamp() < limit:
+                self._dropOldest()
+                
+        if self.max_bytes is not None:
+            self._evictBytes(self.max_bytes)
+                
+    def _evictBytes(self,max_bytes:int):
+        while self.sample_count() > 1 and self.nbytes() > max_bytes:
+            self._dropOldest()
+        
+    def _oldestSeq(self) -> int:
+        return self._seq - self.sample_count()
+    
+    def _samplesAt(self,seqs:typing.Sequence[int]) -> list:
+        """Stored samples, given their sequence numbers (called with `_lock` held)."""
+        q = self.queue
+        newest = self._seq - 1
+        return [q[newest - i] for i in seqs]
+    
+    def _timestampsAt(self,seqs:typing.Sequence[int]) -> typing.Sequence[int]:
+        return [m.timestamp for m in self._samplesAt(seqs)]
+    
+    def _valuesAt(self,fieldname:str,seqs:typing.Sequence[int]) -> typing.Sequence:
+        return [m[fieldname] for m in self._samplesAt(seqs)]
+    
+    def _sampleMessage(self,seq:int) -> TimedPprzMessage:
+        """Stored sample `seq`, as a TimedPprzMessage (called with `_lock` held)."""
+        return self.queue[self._seq - 1 - seq]
+    
+    def _keyValues(self,fieldname:str) -> typing.Sequence:
+        """Values of a field, oldest first, usable as dictionary keys."""
+        return self.field_values(fieldname)
+        
+    def updateSize(self,s:typing.Optional[int]):
+        with self._lock:
+            self.size = s
+            self._resizeStorage(s)
+            
+    def retention(self) -> RetentionPolicy:
+        return RetentionPolicy(self.window,self.size,self.max_bytes)
+            
+    def setRetention(self,policy:RetentionPolicy):
+        with self._lock:
+            self.window = policy.window
+            self.max_bytes = policy.max_bytes
+            if policy.max_samples != self.size:
+                self._resizeStorage(policy.max_samples)
+                self.size = policy.max_samples
+            if self.sample_count() > 0:
+                self._evict()
+            
+    def nbytes(self) -> int:
+        """Estimated memory used by the stored samples, in bytes."""
+        return self._bytes
+    
+    def totalBytes(self) -> int:
+        """Estimated memory used by this log, its rollups and all its subgroups, in bytes."""
+        return self.nbytes() + sum(r.nbytes() for r in self._rollups.values()) \
+                             + sum(m.totalBytes() for m in self.subgroups().values())
+    
+    def trim(self,n:int=1):
+        """Drop the oldest samples (of this log and its subgroups) to keep at most `n` of them (at least 1)."""
+        n = max(n,1)
+        with self._lock:
+            while self.sample_count() > n:
+                self._dropOldest()
+            for m in self.__groups.values():
+                m._prune()
+            
+    def touch(self):
+        """Mark the log as used, for least-recently-used eviction."""
+        self.lastAccess = time.monotonic()
         
     ########## Subgroup management ##########
      
@@ -149,68 +393,188 @@ class MessageLog():
     def groupedBy(self) -> typing.Optional[str]:
         return self.__groupBy
     
-    def groupBy(self,s:typing.Optional[str]):
-        if s != self.__groupBy:
-            self.__groups.clear()
+    def groupBy(self,s:typing.Optional[str],maxGroups:typing.Optional[int]=None):
+        """Index the samples by the value of field `s` (None to stop grouping), starting with the stored ones.
         
+        Only the `maxGroups` (default: MAX_GROUPS) most recently updated values are kept."""
         if s is not None:
-            field = self.get_full_field(s)
+            field = self.schema().field(s)
             if field.array_type:
                 raise GroupByError("Cannot group by an array type")
             
-        self.__groupBy = s
+        with self._lock:
+            if maxGroups is not None:
+                self.maxGroups = maxGroups
+            if s != self.__groupBy:
+                # Replaced rather than cleared, as readers may still iterate over the previous one
+                self.__groups = OrderedDict()
+                self.__groupBy = s
+                if s is not None:
+                    self.__backfillGroups(s)
     
     def clearGroupBy(self):
         self.groupBy(None)
+        
+    def __group(self,val) -> 'MessageGroup':
+        """Subgroup of `val`, created if needed (called with `_lock` held)."""
+        try:
+            group = self.__groups[val]
+            self.__groups.move_to_end(val)
+        except KeyError:
+            if len(self.__groups) >= self.maxGroups:
+                self.__groups.popitem(last=False)
+            group = self.__groups[val] = MessageGroup(self,val)
+        return group
+    
+    def _groupSample(self,seq:int,msg:TimedPprzMessage,key):
+        """Add stored sample `seq` to the subgroup of `key` (called with `_lock` held)."""
+        self.__group(key)._append(seq,msg)
     
-    def subgroup(self,val):
+    def __backfillGroups(self,fieldname:str):
+        keys = self._keyValues(fieldname)
+        
+        # Keep the most recently received values, least recent first
+        last = {v:i for i,v in enumerate(keys)}
+        for v in sorted(last.keys(),key=last.__getitem__)[-self.maxGroups:]:
+            self.__groups[v] = MessageGroup(self,v)
+            
+        first = self._oldestSeq()
+        for seq,(t,val) in enumerate(zip(self.timestamps(),keys),start=first):
+            group = self.__groups.get(val)
+            if group is not None:
+                group._index(seq,int(t))
+        for g in self.__groups.values():
+            g._newest = self._sampleMessage(g._seqs[-1])
+    
+    def subgroup(self,val) -> typing.Optional['MessageGroup']:
+        return self.__groups.get(val)
+        
+    def subgroups(self) -> dict[typing.Any,'MessageGroup']:
+        """Copy of the mapping : value -> MessageGroup, least recently updated first."""
+        with self._lock:
+            return dict(self.__groups)
+    
+    ########## Level of detail ##########
+    
+    def rollup(self,fieldname:str,array_index:typing.Optional[int]=None) -> 'FieldRollup':
+        """Min/max/mean rollups of a numeric field (see msgRecord.lodRollup), created and filled
+        from the stored samples on first use, then updated on each new message.
+        Raises ValueError if the field is not numeric."""
+        key = (fieldname,array_index)
         try:
-            return self.__groups[val]
+            return self._rollups[key]
         except KeyError:
-            return None
+            pass
+        
+        import numpy as np
+        from msgRecord.lodRollup import FieldRollup
+        
+        rollup = FieldRollup()
+        rollup.beginBackfill()
+        self._rollups = {**self._rollups,key:rollup}
+        try:
+            times = np.asarray(self.timestamps(),dtype=np.int64)
+            values = np.asarray(self.field_values(fieldname))
+            rollup.extend(times,values if array_index is None else values[:,array_index])
+        except (ValueError,TypeError,IndexError):
+            self.dropRollup(fieldname,array_index)
+            raise ValueError(f"Cannot build rollups of {fieldname}" + ("" if array_index is None else f"[{array_index}]"))
+        return rollup
+    
+    def dropRollup(self,fieldname:str,array_index:typing.Optional[int]=None):
+        """Stop maintaining the rollups of a field."""
+        key = (fieldname,array_index)
+        if key in self._rollups:
+            self._rollups = {k:r for k,r in self._rollups.items() if k != key}
+            
+    def dropRollups(self):
+        """Stop maintaining the rollups of all the fields (e.g. once nothing plots this message)."""
+        self._rollups = dict()
+            
+    def _rollupValues(self,msg:TimedPprzMessage) -> list[tuple['FieldRollup',float]]:
+        """Value of `msg` for each rollup, read before the message is stored (see addMessage)."""
+        values = []
+        for (f,a),r in self._rollups.items():
+            v = msg[f]
+            values.append((r,float(v if a is None else v[a])))
+        return values
+            
+    def _updateRollups(self,t:int,values:list[tuple['FieldRollup',float]]):
+        for r,v in values:
+            r.add(t,v)
+    
+    def decimated(self,fieldname:str,n:int,t0:typing.Optional[int]=None,t1:typing.Optional[int]=None,
+                  array_index:typing.Optional[int]=None) -> tuple['np.ndarray','np.ndarray']:
+        """About `n` points of a numeric field covering [t0,t1] (in ns, default: the stored samples),
+        as (timestamps,values), oldest first.
+        
+        If the stored samples in the range are few enough (and cover it), they are returned as is.
+        Otherwise, the points are the min and max of each time bucket of the rollups, so spikes
+        stay visible, and an explicit `t0` may reach further back than the stored samples."""
+        import numpy as np
         
-    def subgroups(self):
-        return self.__groups
+        rollup = self.rollup(fieldname,array_index)
+        start = rollup.start()
+        count = self.sample_count()
+        oldest = self._oldestTimestamp() if count > 0 else None
+        newest = self.newest().timestamp if count > 0 else None
+        
+        if t0 is None:
+            # The retention policy limits what is plotted by default, even though the rollups go further back
+            t0 = oldest if oldest is not None else (start or 0)
+        if t1 is None:
+            t1 = newest if newest is not None else t0
+            
+        covered = oldest is None or oldest <= t0 or start is None or start >= oldest
+        # Only read the stored samples if they cover the range, and may hold few enough points in it
+        if not(covered) or (count > n and t0 <= oldest and t1 >= newest):
+            return rollup.decimated(t0,t1,n)
+        
+        times = np.asarray(self.timestamps(),dtype=np.int64)
+        lo = int(np.searchsorted(times,t0,'left'))
+        hi = int(np.searchsorted(times,t1,'right'))
+        if hi - lo <= n:
+            values = np.asarray(self.field_values(fieldname))
+            if array_index is not None and len(values) > 0:
+                values = values[:,array_index]
+            return times[lo:hi],np.asarray(values[lo:hi],dtype=np.float64)
+        
+        return rollup.decimated(t0,t1,n)
                  
     ########## Manage messages ##########
                  
     def addMessage(self,msg:TimedPprzMessage):
-        if len(self.queue) > 0:
-            if self.period is None:
-                self.period = msg.timestamp - self.queue[0].timestamp
-            else:
-                self.period = (msg.timestamp - self.queue[0].timestamp + self.period)/2
-        
-        self.queue.appendleft(msg)
-        
-        if self.__groupBy is not None:
-            field = msg.get_full_field(self.__groupBy)
-            try:
-                sublog = self.__groups[field.val]
-            except KeyError:
-                sublog = MessageLog(self.queue.maxlen)
-                self.__groups[field.val] = sublog
-            sublog.addMessage(msg)
+        with self._lock:
+            # Decoded before storing the message, so that its size estimate already includes the decoded fields
+            # (and so that a value that cannot be decoded leaves the log untouched)
+            key = msg[self.__groupBy] if self.__groupBy is not None else None
+            rolled = self._rollupValues(msg) if self._rollups else None
+            self.stats.update(msg.timestamp,msg.wire_size())
+            
+            self._store(msg)
+            self._seq += 1
+            self._evict()
+            if rolled:
+                self._updateRollups(msg.timestamp,rolled)
+            
+            if self.__groupBy is not None:
+                self._groupSample(self._seq-1,msg,key)
                 
         
     def addMessages(self,msgs:typing.Iterable[TimedPprzMessage]):
         sorted_msgs = sorted(msgs)
-        if self.period is None:
-            self.period = (sorted_msgs[-1] - sorted_msgs[0])/len(sorted_msgs)
-        else:
-            self.period = ((sorted_msgs[-1] - sorted_msgs[0])/len(sorted_msgs) + self.period)/2
-        self.queue.extendleft(sorted_msgs)
-        
-        if self.__groupBy is not None:
-            for m in msgs:
-                field = m.get_full_field(self.__groupBy)
-                try:
-                    sublog = self.__groups[field.val]
-                except KeyError:
-                    sublog = MessageLog(self.queue.maxlen)
-                    self.__groups[field.val] = sublog
-                    
-                sublog.addMessage(m)
+        with self._lock:
+            for m in sorted_msgs:
+                key = m[self.__groupBy] if self.__groupBy is not None else None
+                rolled = self._rollupValues(m) if self._rollups else None
+                self.stats.update(m.timestamp,m.wire_size())
+                self._store(m)
+                self._seq += 1
+                if rolled:
+                    self._updateRollups(m.timestamp,rolled)
+                if self.__groupBy is not None:
+                    self._groupSample(self._seq-1,m,key)
+            self._evict()
                 
 
     ########## Accessors ##########                
@@ -221,11 +585,17 @@ class MessageLog():
         except IndexError:
             raise NoMessageError()
     
+    @property
+    def period(self) -> typing.Optional[float]:
+        """Average time between two messages, in ns."""
+        return self.stats.interval
+    
     def meanFreq(self) -> float:
-        if self.period is None:
+        freq = self.stats.rate()
+        if freq is None:
             raise NoMessageError()
         else:
-            return 10e9/self.period #ns to s, then s to Hz
+            return freq
     
     def msg_name(self) -> str:
         return self.newest().name
@@ -242,9 +612,20 @@ class MessageLog():
     def sample_count(self) -> int:
         return len(self.queue)
     
+    def timestamps(self) -> typing.Sequence[int]:
+        """Reception timestamps (in ns), oldest first."""
+        return [m.timestamp for m in reversed(tuple(self.queue))]
+    
+    def field_values(self,fieldname:str) -> typing.Sequence:
+        """Values of a field, oldest first (same order as `timestamps`)."""
+        return [m[fieldname] for m in reversed(tuple(self.queue))]
+    
     def get_full_field(self, fieldname:str) -> PprzMessageField:
         return self.newest().get_full_field(fieldname)
     
+    def schema(self) -> MessageSchema:
+        return self.newest().schema()
+    
     def fieldnames(self) -> list[str]:
         return self.newest().fieldnames
     
@@ -257,4 +638,161 @@ class MessageLog():
     
     
             
-    
\ No newline at end of file
+    
+    
+# Rough memory cost of a sample in the index of a MessageGroup, in bytes
+GROUP_SAMPLE_BYTES = 40
+
+class MessageGroup(MessageLog):
+    """Samples of a MessageLog sharing the same value of the group-by field (see MessageLog.groupBy).
+    
+    Only the sequence numbers of the samples are kept: the samples stay in the
+    storage of the parent log, and leave the group when the parent drops them.
+    The newest sample is kept, so that the group still shows its last value."""
+    def __init__(self,parent:MessageLog,value):
+        self.parent = parent
+        self.value = value
+        super().__init__(parent.size,parent.window,parent.max_bytes)
+        
+    def _initStorage(self,size:typing.Optional[int]):
+        self._seqs:typing.Deque[int] = deque() # Sequence numbers in the parent log, oldest first
+        self._newest:typing.Optional[TimedPprzMessage] = None
+        
+    def _index(self,seq:int,t:int):
+        self._seqs.append(seq)
+        self.stats.update(t)
+        
+    def _prune(self):
+        oldest = self.parent._oldestSeq()
+        while len(self._seqs) > 0 and self._seqs[0] < oldest:
+            self._seqs.popleft()
+        
+    def _append(self,seq:int,msg:TimedPprzMessage):
+        """Account for sample `seq` of the parent (called with the parent `_lock` held)."""
+        self._seqs.append(seq)
+        self._newest = msg
+        self.stats.update(msg.timestamp,msg.wire_size())
+        self._prune()
+        if self._rollups:
+            self._updateRollups(msg.timestamp,self._rollupValues(msg))
+    
+    def __liveSeqs(self) -> tuple[int,...]:
+        seqs = tuple(self._seqs)
+        return seqs[bisect.bisect_left(seqs,self.parent._oldestSeq()):]
+    
+    def groupBy(self,s:typing.Optional[str],maxGroups:typing.Optional[int]=None):
+        if s is not None:
+            raise GroupByError("Cannot group a subgroup")
+        
+    def addMessage(self,msg:TimedPprzMessage):
+        raise TypeError("Messages are added to the parent log")
+    
+    def addMessages(self,msgs:typing.Iterable[TimedPprzMessage]):
+        raise TypeError("Messages are added to the parent log")
+        
+    def trim(self,n:int=1):
+        pass
+    
+    def nbytes(self) -> int:
+        return GROUP_SAMPLE_BYTES * len(self._seqs)
+    
+    def newest(self) -> TimedPprzMessage:
+        if self._newest is None:
+            raise NoMessageError()
+        return self._newest
+    
+    def _oldestTimestamp(self) -> int:
+        return self.timestamps()[0]
+    
+    def sample_count(self) -> int:
+        return len(self.__liveSeqs())
+    
+    def timestamps(self) -> typing.Sequence[int]:
+        with self.parent._lock:
+            return self.parent._timestampsAt(self.__liveSeqs())
+    
+    def field_values(self,fieldname:str) -> typing.Sequence:
+        with self.parent._lock:
+            return self.parent._valuesAt(fieldname,self.__liveSeqs())
+
+
+class RateLog(MessageLog):
+    """Reception statistics and latest value of a message whose history nobody needs (see RecorderCore `track_interest`).
+    
+    The raw Ivy line of the last message is kept in a single slot, overwritten by
+    each new message and only decoded when read: `newest` is all there is, the
+    history stays empty. The message is recorded from that line as soon as
+    something needs its history (e.g. a plot)."""
+    def __init__(self,sender_id:int,schema:MessageSchema):
+        self.sender_id = sender_id
+        self._schema = schema
+        # Raw line (sender,msg_name,payload,t) of the last message, or the last message itself (see from_log)
+        self._last:typing.Union[tuple[str,str,str,int],TimedPprzMessage,None] = None
+        self._decoded:typing.Optional[tuple[tuple,TimedPprzMessage]] = None # (raw line,message) of the last decoding
+        super().__init__(0)
+        
+    @staticmethod
+    def from_log(sender_id:int,log:MessageLog) -> 'RateLog':
+        """Counter taking over from a log that is no longer recorded (its statistics and grouping are kept)."""
+        rate = RateLog(sender_id,log.schema())
+        rate.stats = log.stats
+        rate.maxGroups = log.maxGroups
+        if log.grouped():
+            rate.groupBy(log.groupedBy())
+        try:
+            rate._last = log.newest()
+        except NoMessageError:
+            pass
+        return rate
+    
+    def count(self,sender:str,msg_name:str,payload:str,t:int):
+        """Account for a message, without decoding it (called by the ingest worker)."""
+        self.stats.update(t,len(payload))
+        self._last = (sender,msg_name,payload,t)
+        
+    def lastMessage(self) -> typing.Optional[TimedPprzMessage]:
+        """Last message counted, decoded on demand (None if there was none)."""
+        last = self._last
+        if last is None or isinstance(last,TimedPprzMessage):
+            return last
+        # Decoded once per message, however many times it is read
+        decoded = self._decoded
+        if decoded is None or decoded[0] is not last:
+            decoded = self._decoded = (last,LazyTimedMessage(*last))
+        return decoded[1]
+    
+    def newest(self) -> TimedPprzMessage:
+        msg = self.lastMessage()
+        if msg is None:
+            raise NoMessageError()
+        return msg
+    
+    def addMessage(self,msg:TimedPprzMessage):
+        raise TypeError("Messages are only counted, record the message to store them")
+    
+    def addMessages(self,msgs:typing.Iterable[TimedPprzMessage]):
+        raise TypeError("Messages are only counted, record the message to store them")
+    
+    def totalBytes(self) -> int:
+        return RECORD_OVERHEAD
+    
+    def msg_name(self) -> str:
+        return self._schema.name
+    
+    def msg_class(self) -> str:
+        return self._schema.msg_class
+    
+    def msg_id(self) -> int:
+        return self._schema.msg_id
+    
+    def class_id(self) -> int:
+        return self._schema.class_id
+    
+    def schema(self) -> MessageSchema:
+        return self._schema
+    
+    def fieldnames(self) -> list[str]:
+        return self._schema.fieldnames
+    
+    def index(self) -> MessageIndex:
+        return MessageIndex(self.sender_id,self._schema.class_id,self._schema.msg_id)
@@ -0,0 +1,227 @@
+# Copyright (C) 2024 Mael FEURGARD <mael.feurgard@enac.fr>
+#
+# This file is part of messages_python.
+#
+# messages_python is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# messages_python is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with messages_python.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Immutable description of every message (field order, types, units, formats), built once.
+
+`SCHEMAS.get(class,msg)` accepts ids or names, and replaces building a
+`PprzMessage` (or reading the fields of a received one) when only the
+definition of a message is needed. The registry is built on first use from
+the pprzlink message definitions, or loaded from a cache file when the
+messages XML did not change (see `SchemaRegistry.load` and msgRecord.definitionsCache).
+"""
+
+import typing
+import dataclasses
+import pathlib
+import threading
+
+from pprzlink import messages_xml_map
+from pprzlink.message import PprzMessage,PprzMessageField
+
+from msgRecord.ivyParsing import is_numeric
+from msgRecord.definitionsCache import definitions_hash,cache_path,read_cache,write_cache,load_definitions
+
+SCHEMA_VERSION = 1 # Increment when the schema classes change, to invalidate the cache files
+
+@dataclasses.dataclass(frozen=True)
+class FieldSchema:
+    """Definition of a message field. Same attribute names as PprzMessageField, without the value."""
+    name:str
+    position:int # Index in the field list (and in the Ivy payload)
+    typestr:str
+    base_type:str # typestr without the array part
+    array_type:bool
+    length:typing.Optional[int] # Length of a fixed size array (None for scalars and variable arrays)
+    numeric:bool
+    format:typing.Optional[str]
+    unit:typing.Optional[str]
+    alt_unit:typing.Optional[str]
+    alt_unit_coef:typing.Optional[float]
+    enum:typing.Optional[tuple[str,...]] # Labels of the values of an enumeration
+
+    # Precomputed parts of the formatted values (see formatValue)
+    value_format:typing.Optional[str] = dataclasses.field(default=None,compare=False)
+    unit_suffix:str = dataclasses.field(default="",compare=False)
+    alt_suffix:str = dataclasses.field(default="",compare=False)
+
+    @staticmethod
+    def from_field(field:PprzMessageField,position:int) -> 'FieldSchema':
+        typestr = field.typestr
+        length = None
+        if '[' in typestr:
+            size = typestr.split('[')[1][:-1]
+            length = int(size) if size.isdigit() else None
+
+        enum = None
+        if getattr(field,'is_enum',False):
+            # pprzlink keeps the labels private
+            values = getattr(field,'_values',None)
+            enum = tuple(str(v) for v in values) if values is not None else ()
+
+        return FieldSchema(field.name,position,typestr,typestr.split('[')[0],field.array_type,length,is_numeric(typestr),
+                           field.format,field.unit,field.alt_unit,field.alt_unit_coef,enum,
+                           field.format if field.format and '%' in field.format else None,
+                           f" {field.unit}" if field.unit and field.unit != 'none' else "",
+                           f" {field.alt_unit}" if field.alt_unit else "")
+
+    @property
+    def is_enum(self) -> bool:
+        return self.enum is not None
+
+    def altCoef(self) -> float:
+        """Coefficient from the unit to the alternative unit (1 if there is none)."""
+        return 1. if self.alt_unit_coef is None else self.alt_unit_coef
+
+    def formatValue(self,val) -> tuple[str,str]:
+        """(value,alternative value) strings of `val`, with their units."""
+        if self.value_format is not None:
+            try:
+                valstr = self.value_format % val
+            except TypeError:
+                # e.g. an array with a scalar format
+                valstr = str(val)
+        else:
+            valstr = str(val)
+        valstr += self.unit_suffix
+
+        if self.enum is not None:
+            try:
+                valstr += f" ({self.enum[int(val)]})"
+            except (IndexError,ValueError,TypeError):
+                pass
+
+        altstr = ""
+        if val is not None and not(self.array_type) and self.altCoef() != 1.:
+            altstr = f"{val * self.alt_unit_coef:.3f}" + self.alt_suffix
+
+        return valstr,altstr
+
+
+@dataclasses.dataclass(frozen=True)
+class MessageSchema:
+    """Definition of a message: ids, names and fields (in payload order)."""
+    class_id:int
+    msg_class:str
+    msg_id:int
+    name:str
+    fields:tuple[FieldSchema,...]
+    by_name:dict[str,FieldSchema] = dataclasses.field(compare=False,repr=False)
+
+    @staticmethod
+    def from_message(msg:PprzMessage) -> 'MessageSchema':
+        fields = tuple(FieldSchema.from_field(msg.get_full_field(f),i) for i,f in enumerate(msg.fieldnames))
+        return MessageSchema(msg.class_id,msg.msg_class,msg.msg_id,msg.name,fields,{f.name:f for f in fields})
+
+    @property
+    def fieldnames(self) -> list[str]:
+        return [f.name for f in self.fields]
+
+    def field(self,name:str) -> FieldSchema:
+        """Raises KeyError for an unknown field."""
+        return self.by_name[name]
+
+    def get_full_field(self,name:str) -> FieldSchema:
+        # Same name as PprzMessage.get_full_field
+        return self.by_name[name]
+
+    def newMessage(self) -> PprzMessage:
+        return PprzMessage(self.msg_class,self.name)
+
+
+class SchemaRegistry():
+    """Schemas of all the messages, by (class_id,msg_id) and by (class_name,msg_name)."""
+    def __init__(self):
+        self.__by_id:dict[tuple[int,int],MessageSchema] = dict()
+        self.__by_name:dict[tuple[str,str],MessageSchema] = dict()
+        self.__loaded = False
+        self.__lock = threading.Lock()
+
+    def get(self,msg_class:typing.Union[int,str],msg:typing.Union[int,str]) -> MessageSchema:
+        """Schema of a message, given by ids or names. Raises KeyError for an unknown message."""
+        try:
+            if isinstance(msg_class,int):
+                return self.__by_id[(msg_class,msg)]
+            return self.__by_name[(msg_class,msg)]
+        except KeyError:
+            if self.__loaded:
+                raise
+        self.load()
+        return self.get(msg_class,msg)
+
+    def __iter__(self) -> typing.Iterator[MessageSchema]:
+        if not(self.__loaded):
+            self.load()
+        return iter(list(self.__by_id.values()))
+
+    def __len__(self) -> int:
+        return len(self.__by_id)
+
+    def __add(self,schema:MessageSchema):
+        self.__by_id[(schema.class_id,schema.msg_id)] = schema
+        self.__by_name[(schema.msg_class,schema.name)] = schema
+
+    @staticmethod
+    def build() -> list[MessageSchema]:
+        """Schemas of all the messages known to pprzlink (parses the messages XML if needed)."""
+        load_definitions()
+        schemas = []
+        for class_name,msgs in messages_xml_map.message_dictionary.items():
+            for msg_name in msgs.keys() if isinstance(msgs,dict) else msgs:
+                try:
+                    schemas.append(MessageSchema.from_message(PprzMessage(class_name,msg_name)))
+                except Exception as e:
+                    print(f"Skipping the schema of {class_name}:{msg_name}: {e}")
+        return schemas
+
+    def load(self,cache:typing.Optional[pathlib.Path]=None):
+        """Fill the registry, from the cache file if it matches the messages XML (otherwise it is rewritten).
+        Without a cache file (default: see `msgRecord.definitionsCache`), schemas are built from pprzlink.
+        Does nothing if the registry is already filled."""
+        with self.__lock:
+            if not(self.__loaded):
+                self.__load(cache)
+
+    def preload(self) -> threading.Thread:
+        """Fill the registry (and the pprzlink dictionaries) in a background thread, e.g. once the window is shown."""
+        thread = threading.Thread(target=self.__preload,name="SchemaPreload",daemon=True)
+        thread.start()
+        return thread
+
+    def __preload(self):
+        # Decoding also needs the pprzlink dictionaries, which the schema cache does not fill
+        load_definitions()
+        self.load()
+
+    def __load(self,cache:typing.Optional[pathlib.Path]):
+        if cache is None:
+            cache = cache_path('schemas.pickle')
+
+        source = definitions_hash()
+        schemas = None
+        if cache is not None and source is not None:
+            schemas = read_cache(cache,SCHEMA_VERSION,source)
+        if schemas is None:
+            schemas = self.build()
+            if cache is not None and source is not None:
+                write_cache(cache,SCHEMA_VERSION,source,schemas)
+
+        for s in schemas:
+            self.__add(s)
+        self.__loaded = True
+
+
+SCHEMAS = SchemaRegistry()
@@ -0,0 +1,172 @@
+# Copyright (C) 2024 Mael FEURGARD <mael.feurgard@enac.fr>
+#
+# This file is part of messages_python.
+#
+# messages_python is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# messages_python is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with messages_python.  If not, see <https://www.gnu.org/licenses/>.
+
+import typing
+import math
+
+# NumPy is only imported by updateMany, so that the headless recorder starts fast
+if typing.TYPE_CHECKING:
+    import numpy as np
+
+class MessageStats():
+    """Reception statistics of a message, updated in O(1) per sample.
+
+    Inter-arrival times are summarized by an exponentially weighted moving
+    average (EWMA), their extrema, and a histogram with logarithmic bins
+    (8 bins per octave, from 1 µs to ~1 h) from which percentiles are read.
+    An inter-arrival longer than `GAP_FACTOR` times the average is counted as a gap.
+    """
+    ALPHA = 0.1 # Weight of the newest sample in the averages
+    GAP_FACTOR = 3.
+    BINS_PER_OCTAVE = 8
+    BIN_COUNT = 32 * BINS_PER_OCTAVE # 1 µs * 2**32 ~ 1h11
+    EWMA_SPAN = 64 # Samples used to approximate the running average in updateMany (0.9**64 ~ 0.1%)
+
+    def __init__(self):
+        self.count = 0
+        self.last:typing.Optional[int] = None # Timestamp of the last sample, in ns
+
+        self.interval:typing.Optional[float] = None # EWMA of the inter-arrival time, in ns
+        self.minInterval:typing.Optional[int] = None # in ns
+        self.maxInterval:typing.Optional[int] = None # in ns
+        self.gaps = 0
+
+        self.size:typing.Optional[float] = None # EWMA of the message size, in bytes
+        self.totalBytes = 0
+
+        self.histogram = [0] * self.BIN_COUNT
+
+    def update(self,t:int,size:typing.Optional[int]=None):
+        """Account for a sample received at `t` (in ns), of `size` bytes on the link (if known)."""
+        self.count += 1
+
+        if size is not None:
+            self.totalBytes += size
+            self.size = size if self.size is None else self.size + self.ALPHA * (size - self.size)
+
+        if self.last is not None:
+            dt = t - self.last
+            if self.interval is None:
+                self.interval = dt
+                self.minInterval = dt
+                self.maxInterval = dt
+            else:
+                if dt > self.GAP_FACTOR * self.interval:
+                    self.gaps += 1
+                self.interval += self.ALPHA * (dt - self.interval)
+                self.minInterval = min(self.minInterval,dt)
+                self.maxInterval = max(self.maxInterval,dt)
+
+            self.histogram[self.__bin(dt)] += 1
+
+        self.last = t
+
+    def updateMany(self,timestamps:'np.ndarray',sizes:typing.Optional['np.ndarray']=None):
+        """Account for a whole series of samples (timestamps in ns, oldest first), as `update` would one by one.
+        
+        Gaps are detected against an EWMA truncated to the last `EWMA_SPAN` samples."""
+        import numpy as np
+        if len(timestamps) == 0:
+            return
+        timestamps = np.asarray(timestamps,dtype=np.int64)
+        
+        if sizes is not None and len(sizes) > 0:
+            self.totalBytes += int(np.sum(sizes))
+            sizes = np.asarray(sizes,dtype=np.float64)
+            start = sizes[0] if self.size is None else self.size
+            self.size = self.__ewma(start,sizes if self.size is not None else sizes[1:])
+        
+        dts = np.diff(timestamps) if self.last is None else np.diff(timestamps,prepend=self.last)
+        self.count += len(timestamps)
+        self.last = int(timestamps[-1])
+        if len(dts) == 0:
+            return
+        
+        if self.interval is None:
+            self.interval = float(dts[0])
+            self.minInterval = int(dts[0])
+            self.maxInterval = int(dts[0])
+            tail = dts[1:]
+        else:
+            tail = dts
+        
+        if len(tail) > 0:
+            kernel = self.ALPHA * (1-self.ALPHA)**np.arange(self.EWMA_SPAN)
+            running = np.convolve(tail,kernel)[:len(tail)] / np.cumsum(kernel)[np.minimum(np.arange(len(tail)),self.EWMA_SPAN-1)]
+            previous = np.concatenate(([self.interval],running[:-1]))
+            self.gaps += int(np.count_nonzero(tail > self.GAP_FACTOR * previous))
+            
+            self.interval = self.__ewma(self.interval,tail)
+            self.minInterval = min(self.minInterval,int(tail.min()))
+            self.maxInterval = max(self.maxInterval,int(tail.max()))
+        
+        bins = np.zeros(len(dts),dtype=np.int64)
+        large = dts >= 1000
+        bins[large] = np.minimum((np.log2(dts[large]/1000) * self.BINS_PER_OCTAVE).astype(np.int64),self.BIN_COUNT-1)
+        for i,c in enumerate(np.bincount(bins,minlength=self.BIN_COUNT)):
+            self.histogram[i] += int(c)
+            
+    def __ewma(self,start:float,values:'np.ndarray') -> float:
+        import numpy as np
+        n = len(values)
+        weights = self.ALPHA * (1-self.ALPHA)**np.arange(n-1,-1,-1,dtype=np.float64)
+        return float(start * (1-self.ALPHA)**n + np.dot(weights,values))
+
+    def __bin(self,dt:int) -> int:
+        if dt < 1000:
+            return 0
+        return min(int(math.log2(dt/1000) * self.BINS_PER_OCTAVE),self.BIN_COUNT-1)
+
+    def __binUpperBound(self,i:int) -> float:
+        return 1000 * 2**((i+1)/self.BINS_PER_OCTAVE)
+
+    ########## Accessors ##########
+
+    def rate(self) -> typing.Optional[float]:
+        """Average reception rate, in Hz."""
+        if self.interval is None or self.interval <= 0:
+            return None
+        return 1e9/self.interval
+
+    def byteRate(self) -> typing.Optional[float]:
+        """Average link usage, in bytes/s."""
+        rate = self.rate()
+        if rate is None or self.size is None:
+            return None
+        return rate * self.size
+
+    def percentile(self,p:float) -> typing.Optional[float]:
+        """Upper bound (within an eighth of an octave) of the `p`-th percentile of inter-arrival times, in ns."""
+        total = sum(self.histogram)
+        if total == 0:
+            return None
+
+        target = total * p / 100
+        cumulated = 0
+        for i,c in enumerate(self.histogram):
+            cumulated += c
+            if cumulated >= target:
+                return self.__binUpperBound(i)
+        return self.__binUpperBound(self.BIN_COUNT-1)
+
+    def jitter(self) -> typing.Optional[float]:
+        """Spread of the inter-arrival times (95th - 5th percentile), in ns."""
+        high = self.percentile(95)
+        low = self.percentile(5)
+        if high is None:
+            return None
+        return high - low
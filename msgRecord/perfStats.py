@@ -0,0 +1,129 @@
+# Copyright (C) 2024 Mael FEURGARD <mael.feurgard@enac.fr>
+#
+# This file is part of messages_python.
+#
+# messages_python is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# messages_python is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with messages_python.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Per-stage timing and counters of the recording and display pipeline.
+
+Disabled by default: enable it with the PPRZ_PERF environment variable (any
+value but 0) or `PERF.setEnabled(True)`. Instrumented code checks `PERF.enabled`
+before reading the clock, so a disabled instrumentation only costs an attribute lookup.
+
+    t0 = time.perf_counter_ns() if PERF.enabled else 0
+    ...
+    if PERF.enabled:
+        PERF.record('stage',time.perf_counter_ns()-t0)
+"""
+
+import typing
+import os
+import threading
+import time
+from collections import deque
+
+# NumPy is only imported when reading the statistics, so that the headless recorder starts fast
+if typing.TYPE_CHECKING:
+    import numpy as np
+
+# Stages timed by the application, in pipeline order
+STAGES = {
+    'decode'       : "Ivy line decoding (ingest worker)",
+    'log'          : "MessageLog insertion (ingest worker)",
+    'model_update' : "IvyModel.update",
+    'filter'       : "FilteredIvyModel.filterAcceptsRow",
+    'plot_update'  : "PlotWidget.update",
+    'plot_redraw'  : "PlotWidget repaint",
+}
+
+# Counters incremented by the application
+COUNTERS = {
+    'messages_in'    : "Messages received (Ivy callback)",
+    'messages_logged': "Messages added to the history",
+    'signals'        : "Signals emitted by IvyRecorder",
+    'rows_touched'   : "Tree rows updated by IvyModel",
+    'points_plotted' : "Points sent to pyqtgraph",
+}
+
+class StageStats():
+    """Durations of the last `window` runs of a stage, and totals since the start."""
+    def __init__(self,window:int):
+        self.durations:deque[int] = deque(maxlen=window) # in ns
+        self.count = 0
+        self.total = 0 # in ns
+
+    def record(self,duration:int):
+        self.durations.append(duration)
+        self.count += 1
+        self.total += duration
+
+    def percentiles(self,ps:typing.Sequence[float]) -> list[float]:
+        """Percentiles of the recent durations, in ns."""
+        import numpy as np
+        d = np.fromiter(tuple(self.durations),dtype=np.int64)
+        if len(d) == 0:
+            return [float('nan')] * len(ps)
+        return list(np.percentile(d,ps))
+
+    def histogram(self,bins:int=20) -> tuple['np.ndarray','np.ndarray']:
+        """(counts,edges) of the recent durations, with logarithmic bins (edges in ns)."""
+        import numpy as np
+        d = np.fromiter(tuple(self.durations),dtype=np.int64)
+        if len(d) == 0:
+            return np.zeros(bins,dtype=np.int64),np.zeros(bins+1)
+        low = max(d.min(),1)
+        edges = np.geomspace(low,max(d.max(),low+1),bins+1)
+        return np.histogram(d,edges)
+
+
+class PerfStats():
+    WINDOW = 1000 # Number of durations kept per stage
+
+    def __init__(self,enabled:bool=False):
+        self.enabled = enabled
+        self.start = time.monotonic()
+
+        self.__lock = threading.Lock()
+        self.stages:dict[str,StageStats] = dict()
+        self.counters:dict[str,int] = dict()
+
+    def setEnabled(self,b:bool):
+        self.enabled = b
+
+    def reset(self):
+        with self.__lock:
+            self.stages.clear()
+            self.counters.clear()
+            self.start = time.monotonic()
+
+    def record(self,stage:str,duration:int):
+        """Account for one run of `stage`, lasting `duration` ns."""
+        with self.__lock:
+            try:
+                s = self.stages[stage]
+            except KeyError:
+                s = self.stages[stage] = StageStats(self.WINDOW)
+            s.record(duration)
+
+    def count(self,counter:str,n:int=1):
+        with self.__lock:
+            self.counters[counter] = self.counters.get(counter,0) + n
+
+    def snapshot(self) -> tuple[dict[str,StageStats],dict[str,int]]:
+        """Copies of the stages and counters mappings (the stats themselves are shared)."""
+        with self.__lock:
+            return dict(self.stages),dict(self.counters)
+
+
+PERF = PerfStats(os.environ.get('PPRZ_PERF','0') not in ('','0'))
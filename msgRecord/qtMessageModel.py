@@ -21,10 +21,10 @@ import math
 
 import enum
 
-from pprzlink.message import PprzMessageField
-
 from msgRecord.ivyRecorder import IvyRecorder,MessageLog
 from msgRecord.messageLog import NoMessageError
+from msgRecord.messageStats import MessageStats
+from msgRecord.perfStats import PERF
 
 from PyQt5 import QtCore
 from PyQt5.QtWidgets import QInputDialog,QMessageBox
@@ -71,34 +71,19 @@ assert len(SenderColumns) <= COLUMN_COUNT
 
 #################### Helper function ####################
 
-def format_field_vals(field:PprzMessageField,val:typing.Optional[typing.Any] = None) -> typing.Tuple[str,str]: 
-    if val is None:
-        val = field.val
-       
-    if field.format and '%' in field.format:
-        valstr = field.format % val
-    else:
-        valstr = str(val)
+def format_stats(stats:MessageStats) -> str:
+    if stats.interval is None:
+        return f"{stats.count} message(s)"
     
-    if field.unit and field.unit != 'none':
-        valstr += " " + field.unit
+    lines = [f"{stats.count} messages, {stats.gaps} gap(s)",
+             f"Inter-arrival: {stats.interval/1e6:.1f} ms (min {stats.minInterval/1e6:.1f} ms, max {stats.maxInterval/1e6:.1f} ms)",
+             f"Percentiles: 50% < {stats.percentile(50)/1e6:.1f} ms, 95% < {stats.percentile(95)/1e6:.1f} ms, 99% < {stats.percentile(99)/1e6:.1f} ms"]
     
-    if field.is_enum:
-        valstr += f" ({field.val_enum})"
-        
+    byte_rate = stats.byteRate()
+    if byte_rate is not None:
+        lines.append(f"Bandwidth: {byte_rate:.0f} B/s")
         
-    altstr = ""
-    if field.val is not None and not(field.array_type):
-            alt_coef = 1. if field.alt_unit_coef is None else field.alt_unit_coef
-            
-            if alt_coef != 1.:
-                altstr = f"{field.val * field.alt_unit_coef:.3f}"
-                
-                if field.alt_unit:
-                    altstr += " " + field.alt_unit
-                    
-        
-    return valstr,altstr
+    return "\n".join(lines)
 
 
 #################### Specific items ####################
@@ -181,7 +166,8 @@ class MessageSubgroupItem(QStandardItem):
     
     def updateField(self,msg:MessageLog,fieldname:str):
         self.msg = msg
-        field = msg.get_full_field(fieldname)
+        field = msg.schema().field(fieldname)
+        val = msg.newest()[fieldname]
         
         try:
             rowNumber = self.fieldMap[fieldname]
@@ -212,17 +198,17 @@ class MessageSubgroupItem(QStandardItem):
             self.appendRow(newitems)
             
         
-        fieldValueItem.setData(field.val,Qt.ItemDataRole.UserRole)
+        fieldValueItem.setData(val,Qt.ItemDataRole.UserRole)
             
-        valstr,altstr = format_field_vals(field)
+        valstr,altstr = field.formatValue(val)
         
         fieldValueItem.setText(valstr)
         fieldAltValItem.setText(altstr)
                     
-        if field.val is not None and not(field.array_type):
-            alt_coef = 1. if field.alt_unit_coef is None else field.alt_unit_coef
+        if val is not None and not(field.array_type):
+            alt_coef = field.altCoef()
             
-            fieldAltValItem.setData(alt_coef * field.val,Qt.ItemDataRole.UserRole)
+            fieldAltValItem.setData(alt_coef * val,Qt.ItemDataRole.UserRole)
             fieldAltValItem.setData(alt_coef,Qt.ItemDataRole.UserRole+1)
 
                 
@@ -314,15 +300,28 @@ class MessageItem(QStandardItem):
         self.msg = msg
 
         if self.hasSubgroups():
-            for v,m in self.msg.subgroups().items():
+            groups = self.msg.subgroups()
+            if any(not(v in groups) for v in self.groupedMap.keys()):
+                self.removeStaleSubgroups(groups)
+            for v,m in groups.items():
                 self.updateSubgroup(m,v)
                 
         else:
-            for f in msg.fieldnames():
+            fieldnames = msg.fieldnames()
+            for f in fieldnames:
                 self.updateField(msg,f)
+            if PERF.enabled:
+                PERF.count('rows_touched',len(fieldnames))
+        
+    def removeStaleSubgroups(self,groups:dict):
+        """Remove the rows of the values no longer in `groups` (dropped by the group-by cardinality limit)."""
+        stale = sorted((r for v,r in self.groupedMap.items() if not(v in groups)),reverse=True)
+        for r in stale:
+            self.removeRow(r)
+        self.groupedMap = {self.child(r,MessageSubgroupColumns.ROOT).fieldVal:r for r in range(self.rowCount())}
         
     def updateSubgroup(self,submsg:MessageLog,val):
-        field = self.msg.get_full_field(self.msg.groupedBy())
+        field = self.msg.schema().field(self.msg.groupedBy())
         
         try:
             rowNumber = self.groupedMap[val]
@@ -355,13 +354,13 @@ class MessageItem(QStandardItem):
             
         submsgValueItem.setData(val,Qt.ItemDataRole.UserRole)
         
-        valstr,altstr = format_field_vals(field,val)
+        valstr,altstr = field.formatValue(val)
         
         submsgValueItem.setText(valstr)
         submsgAltValItem.setText(altstr)
                                         
         if val is not None and not(field.array_type):
-            alt_coef = 1. if field.alt_unit_coef is None else field.alt_unit_coef
+            alt_coef = field.altCoef()
             
             submsgAltValItem.setData(alt_coef * val,Qt.ItemDataRole.UserRole)
             submsgAltValItem.setData(alt_coef,Qt.ItemDataRole.UserRole+1)
@@ -372,7 +371,7 @@ class MessageItem(QStandardItem):
     
     def updateField(self,msg:MessageLog,fieldname:str):
         self.msg = msg
-        field = msg.get_full_field(fieldname)
+        field = msg.schema().field(fieldname)
         
         try:
             rowNumber = self.fieldMap[fieldname]
@@ -402,21 +401,26 @@ class MessageItem(QStandardItem):
             
             self.appendRow(newitems)
             
+        try:
+            val = msg.newest()[fieldname]
+        except NoMessageError:
+            # Not received yet (e.g. a RateLog taking over from an empty log): the row is kept without value
+            return
         
-        fieldValueItem.setData(field.val,Qt.ItemDataRole.UserRole)
+        fieldValueItem.setData(val,Qt.ItemDataRole.UserRole)
             
         # if field.array_type:
         #     print(f"Message {msg.msg_name()}, field {field.name}: {field.val} ({type(field.val)})")
         
-        valstr,altstr = format_field_vals(field)
+        valstr,altstr = field.formatValue(val)
         
         fieldValueItem.setText(valstr)
         fieldAltValItem.setText(altstr)
                     
-        if field.val is not None and not(field.array_type):
-            alt_coef = 1. if field.alt_unit_coef is None else field.alt_unit_coef
+        if val is not None and not(field.array_type):
+            alt_coef = field.altCoef()
             
-            fieldAltValItem.setData(alt_coef * field.val,Qt.ItemDataRole.UserRole)
+            fieldAltValItem.setData(alt_coef * val,Qt.ItemDataRole.UserRole)
             fieldAltValItem.setData(alt_coef,Qt.ItemDataRole.UserRole+1)
                     
                 
@@ -446,8 +450,9 @@ class MessageClassItem(QStandardItem):
     def updateMessage(self,msg:MessageLog):
         id = msg.msg_id()
         name = msg.msg_name()
-        timestamp = msg.newest().timestamp
-        dt = (time.time_ns() - timestamp)/10e9
+        # Also known for the messages that are only counted (see RateLog)
+        timestamp = msg.stats.last if msg.stats.last is not None else msg.newest().timestamp
+        dt = (time.time_ns() - timestamp)/1e9
         
         try:
             freq = msg.meanFreq()
@@ -491,6 +496,7 @@ class MessageClassItem(QStandardItem):
 
         msgReceptionItem.setData(dt,Qt.ItemDataRole.UserRole)
         msgReceptionItem.setText(f" {dt:.0f}s ({freq:.1f} Hz) ")
+        msgReceptionItem.setToolTip(format_stats(msg.stats))
                 
         msgRootItem.updateAllFields(msg)
         
@@ -648,12 +654,15 @@ class IvyModel(QStandardItemModel):
             msg_name = parent.msg.msg_name()
             field_name = rootItem.fieldName()
             
-            field = parent.msg.get_full_field(field_name)
+            field = parent.msg.schema().field(field_name)
             field_type = field.typestr
             field_scale = field.alt_unit_coef
             
-            if '[' in field_type:
-                array_len = len(field.val)
+            if field.array_type:
+                try:
+                    array_len = len(parent.msg.newest()[field_name])
+                except NoMessageError:
+                    array_len = field.length or 1
                 array_range,ok = QInputDialog.getText(None,
                                                    "Input index or range",
                                                    "Either a number, or a range (both inclusive)",
@@ -734,6 +743,8 @@ class IvyModel(QStandardItemModel):
     
     @pyqtSlot()
     def update(self):
+        t0 = time.perf_counter_ns() if PERF.enabled else 0
+        
         for senderId in self.ivyRecorder.records.keys():
             try:
                 rowNumber = self.senderMap[senderId]
@@ -755,6 +766,9 @@ class IvyModel(QStandardItemModel):
             
             for clsId in self.ivyRecorder.records[senderId].keys():
                 senderItem.updateMessageClass(self.ivyRecorder,clsId)
+                
+        if PERF.enabled:
+            PERF.record('model_update',time.perf_counter_ns()-t0)
                             
 
 
@@ -798,6 +812,15 @@ class FilteredIvyModel(QSortFilterProxyModel):
         return self.sourceModel().itemFromIndex(self.mapToSource(index))
     
     def filterAcceptsRow(self, source_row: int, source_parent: QModelIndex) -> bool:
+        if not(PERF.enabled):
+            return self.__filterAcceptsRow(source_row,source_parent)
+        
+        t0 = time.perf_counter_ns()
+        accepted = self.__filterAcceptsRow(source_row,source_parent)
+        PERF.record('filter',time.perf_counter_ns()-t0)
+        return accepted
+    
+    def __filterAcceptsRow(self, source_row: int, source_parent: QModelIndex) -> bool:
         firstIndex = source_parent.child(source_row,0)
         model:IvyModel = self.sourceModel()
         item = model.itemFromIndex(firstIndex)
@@ -826,7 +849,7 @@ class FilteredIvyModel(QSortFilterProxyModel):
             if not(regex_result):
                 # Child rows results:
                 for i in range(item.rowCount()):
-                    if self.filterAcceptsRow(i,item.index()):
+                    if self.__filterAcceptsRow(i,item.index()):
                         regex_result = True
                         break
             
@@ -0,0 +1,821 @@
+# Copyright (C) 2024 Mael FEURGARD <mael.feurgard@enac.fr>
+# 
+# This file is part of messages_python.
+# 
+# messages_python is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# messages_python is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with messages_python.  If not, see <https://www.gnu.org/licenses/>.
+
+import typing,dataclasses
+import threading
+import time
+import pathlib
+
+from ivy.std_api import IvyBindMsg,IvyUnBindMsg
+from pprzlink.ivy import IvyMessagesInterface
+from pprzlink.message import PprzMessage
+
+from msgRecord.messageLog import MessageLog,TimedPprzMessage,LazyTimedMessage,RateLog,MessageIndex,FieldIndex,RetentionPolicy,\
+                                 NoMessageError
+from msgRecord.ingestQueue import IngestQueue
+from msgRecord.segmentFile import SegmentWriter,SocketWriter
+from msgRecord.telemetryServer import TelemetryServer
+from msgRecord.ivyParsing import decode_ivy_payload,message_class,sender_id as ivy_sender_id
+from msgRecord.messageSchema import SCHEMAS,MessageSchema
+from msgRecord.perfStats import PERF
+
+# The shared memory store uses NumPy, it is only imported when sharing starts
+if typing.TYPE_CHECKING:
+    from msgRecord.sharedStore import SharedStorePublisher
+    from msgRecord.asyncStream import RecordStream
+
+class UnknownSenderError(Exception):
+    def __init__(self, sender_id:int,known_ids:list[int]) -> None:
+        super().__init__(f"Cannot record unknown sender: {sender_id}\nKnown senders are: {known_ids}")
+        
+
+class _Counted(typing.NamedTuple):
+    """Ingest queue item of a message that is only counted (see RecorderCore `track_interest`)."""
+    sender:str
+    msg_name:str
+    payload:str
+
+@dataclasses.dataclass
+class MemoryUsage:
+    """Estimated memory used by the message history, in bytes."""
+    total:int
+    per_sender:dict[int,int] # Mapping : sender_id -> bytes
+    per_message:dict[tuple[int,int,int],int] # Mapping : (sender_id,class_id,msg_id) -> bytes
+        
+
+class RecorderCore():
+    """Records the messages of an Ivy bus into MessageLog, without Qt.
+    
+    Notifications are plain callbacks, called from the ingest worker thread:
+    `on_data_updated(sender_id,class_id,msg_id,new_msg)` for every message (see setPerMessageSignals),
+    `on_batch_updated(updated,new)` every `notify_interval` ms, and `on_new_sender(sender_id)`.
+    
+    With `track_interest`, the messages that are not recorded (see recordSender and
+    recordMessage) are not dropped but counted: their log is a RateLog, holding their
+    reception statistics and their last raw line, enough for a view of the newest values
+    (e.g. the messages tree). It is replaced by a MessageLog, starting from that line, as
+    soon as something needs the history of the message (it is recorded, or grouped),
+    and goes back to a RateLog when nothing does. The same decoded message feeds the
+    MessageLog, the streams and the sinks, which only see the messages with a history.
+    """
+    INGEST_PERIOD = 0.005 # Sleep time of the ingest worker when there is nothing to do, in s
+    INGEST_BATCH = 1000 # Maximum number of messages handled between two publications of `records`
+    BUDGET_PERIOD = 0.5 # Time between two checks of the memory budget, in s
+    
+    def __init__(self,name:str="RecorderCore",ivy_bus:typing.Optional[str]=None,buffer_size:int=10,columnar:bool=False,
+                 notify_interval:typing.Optional[int]=None,per_message_signals:bool=True,queue_size:int=100000,
+                 lazy:bool=True,retention:typing.Optional[RetentionPolicy]=None,memory_budget:typing.Optional[int]=None,
+                 live:bool=True,record_all_senders:bool=False,track_interest:bool=False,
+                 on_data_updated:typing.Optional[typing.Callable[[int,int,int,bool],None]]=None,
+                 on_batch_updated:typing.Optional[typing.Callable[[set,set],None]]=None,
+                 on_new_sender:typing.Optional[typing.Callable[[int],None]]=None) -> None:
+        self.on_data_updated = on_data_updated
+        self.on_batch_updated = on_batch_updated
+        self.on_new_sender = on_new_sender
+        
+        # Without a live bus, messages are only fed through injectLine (e.g. by msgRecord.replay.ReplaySource)
+        if live:
+            self.ivy = IvyMessagesInterface(name,ivy_bus=ivy_bus) if ivy_bus is not None else IvyMessagesInterface(name)
+        else:
+            self.ivy = None
+        
+        # Default retention policy for MessageLog (buffer_size is only used if retention is None)
+        self.__retention = RetentionPolicy(max_samples=buffer_size) if retention is None else retention
+        
+        # Mapping : (sender_id,class_id,msg_id) -> RetentionPolicy (overrides the default one)
+        self.__retention_overrides:dict[tuple[int,int,int],RetentionPolicy] = dict()
+        
+        # Type of MessageLog to create (ColumnarMessageLog keeps the history in NumPy ring buffers)
+        if columnar:
+            # Imported here, so that NumPy is only loaded when needed
+            from msgRecord.columnarLog import ColumnarMessageLog
+            self.__log_type:typing.Type[MessageLog] = ColumnarMessageLog
+        else:
+            self.__log_type = MessageLog
+        
+        # Store raw payloads (LazyTimedMessage) and only decode the fields that are read
+        self.__lazy = lazy
+        
+        # Mapping : sender_id -> number of recordSender requests (0 if the sender is known but not recorded)
+        self.__known_senders:dict[int,int] = dict()
+        
+        # Record new senders from their first message (as if recordSender had been called once)
+        self.__record_all_senders = record_all_senders
+        
+        # Dispatch table, mapping : (sender_id,msg_name) -> number of recordMessage requests
+        self.__registered_msgs:dict[tuple[int,str],int] = dict()
+        
+        # Count the messages that are not recorded, instead of dropping them (see RateLog)
+        self.__track_interest = track_interest
+        
+        # (sender_id,class_id,msg_id) of the logs added by loadLogs, never replaced by a RateLog
+        self.__loaded_logs:set[tuple[int,int,int]] = set()
+        
+        # Mapping : (sender,msg_name) -> (sender_id,schema), of the counted messages (only used by the ingest worker)
+        self.__counted_schemas:dict[tuple[str,str],tuple[int,MessageSchema]] = dict()
+        
+        # Mapping : sender_id -> class_id -> message_id -> MessageLog
+        # Read-only snapshot published by the ingest worker (see __publish)
+        self.records:dict[int,dict[int,dict[int,MessageLog]]] = dict()
+        
+        # Same mapping, only ever modified by the ingest worker
+        self.__live_records:dict[int,dict[int,dict[int,MessageLog]]] = dict()
+        self.__structure_changed = False
+        self.__pending_senders:list[int] = []
+        
+        # Mapping : class_id -> class_name
+        self.classNames:dict[int,str] = dict()
+        
+        # Emit data_updated for every received message
+        self.__per_message_signals = per_message_signals
+        
+        # Batched notifications: (sender_id,class_id,msg_id) updated/created since the last data_batch_updated
+        self.__dirty_lock = threading.Lock()
+        self.__dirty:set[tuple[int,int,int]] = set()
+        self.__dirty_new:set[tuple[int,int,int]] = set()
+        
+        self.__last_notification = time.monotonic()
+        self.setNotifyInterval(notify_interval)
+        
+        
+        # Raw Ivy lines, timestamped on reception, waiting to be decoded and logged
+        self.__ingest_queue = IngestQueue(queue_size)
+        self.__ingested = 0
+        self.__errors = 0 # Messages that could not be decoded (only the first one is reported)
+        
+        # Where to write every ingested message (see startRecording)
+        self.__sink:typing.Optional[SegmentWriter] = None
+        
+        # Where to stream every ingested message (see startStreaming)
+        self.__stream:typing.Optional[SocketWriter] = None
+        
+        # Where to serve the subscribed messages and fields (see startServing)
+        self.__server:typing.Optional[TelemetryServer] = None
+        
+        # Shared memory ring buffers for viewer processes (see startSharing)
+        self.__shared:typing.Optional['SharedStorePublisher'] = None
+        
+        # Mapping : (sender_id,class_id,msg_id) -> RecordStream fed by the ingest worker (see stream)
+        # sender_id is None for the streams of any sender. Replaced, never modified in place.
+        self.__streams:dict[tuple[typing.Optional[int],int,int],tuple['RecordStream',...]] = dict()
+        self.__streams_lock = threading.Lock()
+        
+        # Maximum memory used by all the MessageLog together, in bytes (None for no limit)
+        self.__memory_budget = memory_budget
+        self.__last_budget_check = time.monotonic()
+        
+        self.__stopping = threading.Event()
+        self.__ingest_thread = threading.Thread(target=self.__ingestLoop,name=f"{name}-ingest",daemon=True)
+        self.__ingest_thread.start()
+        
+        if self.ivy is not None:
+            # Single bind on the bus: lines are routed internally (see injectLine)
+            self.__bind_id = IvyBindMsg(self.__onIvyLine,r'^(\S+ \S+.*)')
+            
+            # Start Ivy
+            self.ivy.start()
+        
+    def getMessage(self,i:MessageIndex) -> MessageLog:
+        log = self.records[i.sender_id][i.class_id][i.message_id]
+        log.touch()
+        return log
+    
+    ########## Recording to disk ##########
+    
+    def startRecording(self,directory:typing.Union[str,pathlib.Path],prefix:str="recording",segment_size:int=256*1024*1024) -> SegmentWriter:
+        """Write every ingested message to segment files in `directory` (see msgRecord.segmentFile)."""
+        self.stopRecording()
+        self.__sink = SegmentWriter(directory,prefix,segment_size)
+        return self.__sink
+    
+    def stopRecording(self):
+        sink,self.__sink = self.__sink,None
+        if sink is not None:
+            sink.close()
+            
+    def recordingSink(self) -> typing.Optional[SegmentWriter]:
+        return self.__sink
+    
+    def startStreaming(self,address:str) -> SocketWriter:
+        """Stream every ingested message to the clients of a local socket (see msgRecord.segmentFile.SocketWriter)."""
+        self.stopStreaming()
+        self.__stream = SocketWriter(address)
+        return self.__stream
+    
+    def stopStreaming(self):
+        stream,self.__stream = self.__stream,None
+        if stream is not None:
+            stream.close()
+            
+    def streamingSink(self) -> typing.Optional[SocketWriter]:
+        return self.__stream
+    
+    def startServing(self,address:str,max_pending:int=TelemetryServer.MAX_PENDING) -> TelemetryServer:
+        """Serve the ingested messages to the clients of a local socket, filtered by their subscriptions
+        (see msgRecord.telemetryServer)."""
+        self.stopServing()
+        self.__server = TelemetryServer(address,max_pending)
+        return self.__server
+    
+    def stopServing(self):
+        server,self.__server = self.__server,None
+        if server is not None:
+            server.close()
+            
+    def servingSink(self) -> typing.Optional[TelemetryServer]:
+        return self.__server
+    
+    def startSharing(self,name:str,capacity:typing.Optional[int]=None) -> 'SharedStorePublisher':
+        """Publish every ingested message to shared memory ring buffers of `capacity` samples,
+        for viewers in other processes (see msgRecord.sharedStore)."""
+        # Imported here, so that NumPy is only loaded when needed
+        from msgRecord.sharedStore import SharedStorePublisher,CAPACITY
+        self.stopSharing()
+        self.__shared = SharedStorePublisher(name,CAPACITY if capacity is None else capacity)
+        return self.__shared
+    
+    def stopSharing(self):
+        shared,self.__shared = self.__shared,None
+        if shared is not None:
+            shared.close()
+            
+    def sharingSink(self) -> typing.Optional['SharedStorePublisher']:
+        return self.__shared
+    
+    ########## Asyncio streams ##########
+    
+    def stream(self,index:typing.Union[MessageIndex,FieldIndex],maxsize:int=1000,batch:bool=False,
+               coalesce:typing.Optional[float]=None,policy:str='drop_oldest') -> 'RecordStream':
+        """Asynchronous iterator over the new samples of a message or a field (see msgRecord.asyncStream).
+        
+        The message is recorded while the stream is open. With a sender_id of None, the
+        messages of all the recorded senders are streamed."""
+        # Imported here, so that asyncio is only loaded when needed
+        from msgRecord.asyncStream import RecordStream
+        s = RecordStream(self,index,maxsize,batch,coalesce,policy)
+        sender_id,class_id,msg_id = s.key()
+        if sender_id is not None:
+            self.recordMessage(sender_id,s.msgIndex.schema())
+        with self.__streams_lock:
+            streams = dict(self.__streams)
+            streams[s.key()] = streams.get(s.key(),()) + (s,)
+            self.__streams = streams
+        return s
+    
+    def _removeStream(self,s:'RecordStream'):
+        with self.__streams_lock:
+            current = self.__streams.get(s.key(),())
+            if not(s in current):
+                return
+            streams = dict(self.__streams)
+            remaining = tuple(x for x in current if x is not s)
+            if len(remaining) > 0:
+                streams[s.key()] = remaining
+            else:
+                del streams[s.key()]
+            self.__streams = streams
+        if s.msgIndex.sender_id is not None:
+            self.stopRecordingMessage(s.msgIndex.sender_id,s.msgIndex.schema())
+            
+    def __pushToStreams(self,streams:dict,sender_id:int,timed_msg:TimedPprzMessage):
+        class_id,msg_id = timed_msg.class_id,timed_msg.msg_id
+        for s in streams.get((sender_id,class_id,msg_id),()):
+            s.push(timed_msg)
+        for s in streams.get((None,class_id,msg_id),()):
+            s.push(timed_msg)
+    
+    ########## Memory budget ##########
+    
+    def memoryBudget(self) -> typing.Optional[int]:
+        return self.__memory_budget
+    
+    def setMemoryBudget(self,budget:typing.Optional[int]):
+        """Limit the memory used by the history of all messages, in bytes (None for no limit).
+        When exceeded, the history of the least recently used messages is dropped first."""
+        self.__memory_budget = budget
+    
+    def memoryUsage(self) -> MemoryUsage:
+        per_sender:dict[int,int] = dict()
+        per_message:dict[tuple[int,int,int],int] = dict()
+        
+        for s_id,s in self.records.items():
+            sender_total = 0
+            for c_id,c in s.items():
+                for m_id,m in c.items():
+                    b = m.totalBytes()
+                    per_message[(s_id,c_id,m_id)] = b
+                    sender_total += b
+            per_sender[s_id] = sender_total
+            
+        return MemoryUsage(sum(per_sender.values()),per_sender,per_message)
+    
+    def __enforceMemoryBudget(self):
+        # Called by the ingest worker, which is the only one appending to the logs
+        now = time.monotonic()
+        if self.__memory_budget is None or now - self.__last_budget_check < self.BUDGET_PERIOD:
+            return
+        self.__last_budget_check = now
+        
+        logs = [m for s in self.__live_records.values() for c in s.values() for m in c.values()]
+        total = sum(m.totalBytes() for m in logs)
+        if total <= self.__memory_budget:
+            return
+        
+        # Coldest first: keep only their newest sample, which is all the tree needs
+        for m in sorted(logs,key=lambda m : m.lastAccess):
+            before = m.totalBytes()
+            m.trim(1)
+            total -= before - m.totalBytes()
+            if total <= self.__memory_budget:
+                break
+        
+    ########## Notifications ##########
+    
+    def setPerMessageSignals(self,b:bool):
+        """Enable or disable the `data_updated` notification, sent once per received message."""
+        self.__per_message_signals = b
+        
+    def perMessageSignals(self) -> bool:
+        return self.__per_message_signals
+        
+    def setNotifyInterval(self,interval:typing.Optional[int]):
+        """Send `data_batch_updated` every `interval` ms with the messages updated in the meantime.
+        Use None to disable batched notifications."""
+        self.__notify_interval = interval
+        if interval is None:
+            with self.__dirty_lock:
+                self.__dirty.clear()
+                self.__dirty_new.clear()
+            
+    def notifyInterval(self) -> typing.Optional[int]:
+        return self.__notify_interval
+    
+    def flushNotifications(self):
+        """Send `data_batch_updated` now, if anything changed since the last one."""
+        with self.__dirty_lock:
+            if len(self.__dirty) == 0:
+                return
+            dirty,self.__dirty = self.__dirty,set()
+            dirty_new,self.__dirty_new = self.__dirty_new,set()
+        
+        self._batchUpdated(dirty,dirty_new)
+        if PERF.enabled:
+            PERF.count('signals')
+        
+    def _dataUpdated(self,sender_id:int,class_id:int,msg_id:int,new_msg:bool):
+        if self.on_data_updated is not None:
+            self.on_data_updated(sender_id,class_id,msg_id,new_msg)
+            
+    def _batchUpdated(self,updated:set[tuple[int,int,int]],new:set[tuple[int,int,int]]):
+        if self.on_batch_updated is not None:
+            self.on_batch_updated(updated,new)
+            
+    def _newSender(self,sender_id:int):
+        if self.on_new_sender is not None:
+            self.on_new_sender(sender_id)
+        
+    ########## Retention ##########
+    
+    def updateBufferSize(self,bsize:int):
+        self.setRetention(dataclasses.replace(self.__retention,max_samples=bsize))
+        
+    def retention(self,index:typing.Optional[MessageIndex]=None) -> RetentionPolicy:
+        """Retention policy of the message at `index` (or the default one)."""
+        if index is not None:
+            try:
+                return self.__retention_overrides[(index.sender_id,index.class_id,index.message_id)]
+            except KeyError:
+                pass
+        return self.__retention
+        
+    def setRetention(self,policy:RetentionPolicy,index:typing.Optional[MessageIndex]=None):
+        """Set the default retention policy (if `index` is None), or the one of a single message."""
+        if index is None:
+            self.__retention = policy
+            for s_id,s in self.records.items():
+                for c_id,c in s.items():
+                    for m_id,m in c.items():
+                        if not((s_id,c_id,m_id) in self.__retention_overrides):
+                            m.setRetention(policy)
+        else:
+            self.__retention_overrides[(index.sender_id,index.class_id,index.message_id)] = policy
+            try:
+                self.getMessage(index).setRetention(policy)
+            except KeyError:
+                pass
+                
+    def clearRetention(self,index:MessageIndex):
+        """Make the message at `index` use the default retention policy again."""
+        self.__retention_overrides.pop((index.sender_id,index.class_id,index.message_id),None)
+        try:
+            self.getMessage(index).setRetention(self.__retention)
+        except KeyError:
+            pass
+            
+    def __newLog(self,sender_id:int,class_id:int,msg_id:int) -> MessageLog:
+        try:
+            policy = self.__retention_overrides[(sender_id,class_id,msg_id)]
+        except KeyError:
+            policy = self.__retention
+        return self.__log_type(policy.max_samples,policy.window,policy.max_bytes)
+                    
+    ########## Ingestion ##########
+    
+    def queueDepth(self) -> int:
+        """Number of Ivy messages waiting for the ingest worker."""
+        return len(self.__ingest_queue)
+    
+    def droppedCount(self) -> int:
+        """Number of Ivy messages dropped because the ingest queue was full."""
+        return self.__ingest_queue.dropped
+    
+    def ingestedCount(self) -> int:
+        """Number of Ivy messages logged (or counted, see `track_interest`), without the ones that could not be decoded."""
+        return self.__ingested
+    
+    def errorCount(self) -> int:
+        """Number of Ivy messages that could not be decoded (e.g. unknown messages)."""
+        return self.__errors
+    
+    def __decodeError(self,text:str):
+        # Called by the ingest worker, possibly for every message of a bad sender: report the first one only
+        self.__errors += 1
+        if self.__errors == 1:
+            print(f"{text} (further errors are only counted, see errorCount)")
+    
+    def __onIvyLine(self,agent,line:str):
+        # Called from Ivy threads, for every message on the bus: keep it cheap
+        t = time.time_ns()
+        split = line.split(' ',2)
+        self.injectLine(t,split[0],split[1],split[2] if len(split) > 2 else "")
+        
+    def injectLine(self,t:int,sender:str,msg_name:str,payload:str):
+        """Handle a message exactly as if it had been received from the bus at `t` (in ns).
+        
+        `sender` is the first word of the Ivy line (aircraft id, or agent name),
+        `payload` is the Ivy encoded payload (everything after the message name)."""
+        if PERF.enabled:
+            PERF.count('messages_in')
+        s_id = ivy_sender_id(sender)
+        
+        try:
+            recorded = self.__known_senders[s_id] > 0
+        except KeyError:
+            # Let the ingest worker create the entry, so that `records` only has one writer
+            self.__ingest_queue.pushControl((None,s_id))
+            self.__known_senders[s_id] = 1 if self.__record_all_senders else 0
+            recorded = self.__record_all_senders
+            
+        if recorded or (s_id,msg_name) in self.__registered_msgs:
+            self.__ingest_queue.push((t,(sender,msg_name,payload)))
+        elif self.__track_interest:
+            self.__ingest_queue.push((t,_Counted(sender,msg_name,payload)))
+        
+    def __ingestLoop(self):
+        while not(self.__stopping.is_set()):
+            interval = self.__notify_interval
+            if interval is not None and time.monotonic() - self.__last_notification >= interval/1000:
+                self.__last_notification = time.monotonic()
+                self.flushNotifications()
+            
+            batch = self.__ingest_queue.drain(self.INGEST_BATCH)
+            
+            if len(batch) == 0:
+                self.__stopping.wait(self.INGEST_PERIOD)
+                continue
+            
+            perf = PERF.enabled
+            decode_time = 0
+            log_time = 0
+            # Only the messages logged (or counted) without error make the throughput
+            received = 0
+            errors = self.__errors
+            
+            for t,item in batch:
+                if t is None:
+                    if isinstance(item,dict):
+                        self.__insertLogs(item)
+                    elif isinstance(item,tuple):
+                        self.__updateRecording(*item)
+                    else:
+                        self.__addSender(item)
+                    continue
+                received += 1
+                
+                # Counted messages whose history is needed (e.g. grouped) are logged as the others
+                if type(item) is _Counted and self.__countMessage(t,item):
+                    continue
+                
+                if perf:
+                    t0 = time.perf_counter_ns()
+                
+                try:
+                    if self.__lazy:
+                        sender_id = ivy_sender_id(item[0])
+                        timed_msg = LazyTimedMessage(*item,t)
+                    else:
+                        sender_id,msg = decode_ivy_payload(*item)
+                        timed_msg = TimedPprzMessage(msg,t)
+                except Exception as e:
+                    self.__decodeError(f"Could not decode Ivy message '{' '.join(item)}': {e}")
+                    continue
+                
+                if perf:
+                    t1 = time.perf_counter_ns()
+                    decode_time += t1 - t0
+                
+                # Lazy messages are only decoded here, field by field: a bad value must not stop the worker
+                try:
+                    self.__logMessage(sender_id,timed_msg)
+                    
+                    streams = self.__streams
+                    if len(streams) > 0:
+                        self.__pushToStreams(streams,sender_id,timed_msg)
+                    
+                    if perf:
+                        log_time += time.perf_counter_ns() - t1
+                    
+                    sink = self.__sink
+                    if sink is not None:
+                        sink.write(t,sender_id,timed_msg.class_id,timed_msg.msg_id,item[2])
+                    stream = self.__stream
+                    if stream is not None:
+                        stream.write(t,sender_id,timed_msg.class_id,timed_msg.msg_id,item[2])
+                    server = self.__server
+                    if server is not None:
+                        server.write(t,sender_id,timed_msg.class_id,timed_msg.msg_id,item[2],timed_msg)
+                    shared = self.__shared
+                    if shared is not None:
+                        shared.write(t,sender_id,timed_msg.class_id,timed_msg.msg_id,item[2],timed_msg)
+                except Exception as e:
+                    self.__decodeError(f"Could not log Ivy message '{' '.join(item)}': {e}")
+                
+            logged = received - (self.__errors - errors)
+            self.__ingested += logged
+            if perf:
+                # One sample per batch: the time spent on the whole batch
+                PERF.record('decode',decode_time)
+                PERF.record('log',log_time)
+                PERF.count('messages_logged',logged)
+            self.__enforceMemoryBudget()
+            self.__publish()
+            
+    def __publish(self):
+        """Replace the published `records` by a fresh copy, if the worker added any new entry.
+        Published mappings are never modified afterwards, so the GUI can iterate them freely."""
+        if not(self.__structure_changed):
+            return
+        
+        self.__structure_changed = False
+        self.records = {s:{c:dict(md) for c,md in cd.items()} for s,cd in self.__live_records.items()}
+        
+        for sender_id in self.__pending_senders:
+            self._newSender(sender_id)
+        if PERF.enabled:
+            PERF.count('signals',len(self.__pending_senders))
+        self.__pending_senders.clear()
+        
+    def __addSender(self,sender_id:int):
+        if not(sender_id in self.__live_records.keys()):
+            self.__live_records[sender_id] = dict()
+            self.__structure_changed = True
+            self.__pending_senders.append(sender_id)
+        
+    def __classDict(self,sender_id:int,class_id:int,class_name:str) -> dict[int,MessageLog]:
+        try:
+            sender_dict = self.__live_records[sender_id]
+        except KeyError:
+            self.__addSender(sender_id)
+            sender_dict = self.__live_records[sender_id]
+        
+        try:
+            return sender_dict[class_id]
+        except KeyError:
+            sender_dict[class_id] = dict()
+            self.classNames[class_id] = class_name
+            self.__structure_changed = True
+            return sender_dict[class_id]
+        
+    def __markDirty(self,key:tuple[int,int,int],new_msg:bool):
+        if self.__notify_interval is not None:
+            with self.__dirty_lock:
+                self.__dirty.add(key)
+                if new_msg:
+                    self.__dirty_new.add(key)
+        
+    def __logMessage(self,sender_id:int,timed_msg:TimedPprzMessage):
+        new_msg = False
+        class_dict = self.__classDict(sender_id,timed_msg.class_id,timed_msg.msg_class)
+        
+        try:
+            log = class_dict[timed_msg.msg_id]
+        except KeyError:
+            log = class_dict[timed_msg.msg_id] = self.__newLog(sender_id,timed_msg.class_id,timed_msg.msg_id)
+            self.__structure_changed = True
+            new_msg = True
+        else:
+            if type(log) is RateLog:
+                # Recorded before its recording update was handled, or grouped
+                log = self.__upgradeLog(sender_id,class_dict,log)
+                new_msg = True
+        log.addMessage(timed_msg)
+        
+        self.__markDirty((sender_id,timed_msg.class_id,timed_msg.msg_id),new_msg)
+        
+        if self.__per_message_signals:
+            self._dataUpdated(sender_id,timed_msg.class_id,timed_msg.msg_id,new_msg)
+            if PERF.enabled:
+                PERF.count('signals')
+        
+    def __needsHistory(self,sender_id:int,class_id:int,msg_id:int,msg_name:str,log:MessageLog) -> bool:
+        """True if something reads more than the newest message of `log`: it is recorded, grouped or loaded."""
+        return self.__known_senders.get(sender_id,0) > 0 or (sender_id,msg_name) in self.__registered_msgs \
+            or log.grouped() or (sender_id,class_id,msg_id) in self.__loaded_logs
+        
+    def __countMessage(self,t:int,item:_Counted) -> bool:
+        """Overwrite the latest value of a message that is not recorded, without decoding it.
+        Returns False if the message must be logged anyway (see __needsHistory)."""
+        try:
+            sender_id,schema = self.__counted_schemas[(item.sender,item.msg_name)]
+        except KeyError:
+            try:
+                schema = SCHEMAS.get(message_class(item.sender,item.msg_name),item.msg_name)
+            except Exception as e:
+                self.__decodeError(f"Could not count Ivy message '{item.sender} {item.msg_name}': {e}")
+                return True
+            sender_id = ivy_sender_id(item.sender)
+            self.__counted_schemas[(item.sender,item.msg_name)] = (sender_id,schema)
+        
+        class_dict = self.__classDict(sender_id,schema.class_id,schema.msg_class)
+        try:
+            log = class_dict[schema.msg_id]
+        except KeyError:
+            log = class_dict[schema.msg_id] = RateLog(sender_id,schema)
+            self.__structure_changed = True
+        
+        if type(log) is not RateLog or log.grouped():
+            if self.__needsHistory(sender_id,schema.class_id,schema.msg_id,schema.name,log):
+                return False
+            # No longer grouped
+            log = class_dict[schema.msg_id] = RateLog.from_log(sender_id,log)
+            self.__structure_changed = True
+        
+        log.count(item.sender,item.msg_name,item.payload,t)
+        return True
+            
+    def __upgradeLog(self,sender_id:int,class_dict:dict[int,MessageLog],rate:RateLog) -> MessageLog:
+        """Replace a RateLog by a MessageLog, starting with the last message counted."""
+        log = self.__newLog(sender_id,rate.class_id(),rate.msg_id())
+        last = rate.lastMessage()
+        if last is not None:
+            log.addMessage(last)
+            if rate.grouped():
+                log.groupBy(rate.groupedBy(),rate.maxGroups)
+        # Already accounts for the last message
+        log.stats = rate.stats
+        class_dict[rate.msg_id()] = log
+        self.__structure_changed = True
+        return log
+        
+    def __updateRecording(self,sender_id:int,msg_name:typing.Optional[str]):
+        """Follow the start (or the end) of the recording of the logs of `sender_id` named `msg_name`
+        (all of them if None): upgrade (or downgrade) them when tracking interest, free the ones
+        no longer recorded otherwise."""
+        try:
+            sender_dict = self.__live_records[sender_id]
+        except KeyError:
+            return
+        
+        for class_id,class_dict in sender_dict.items():
+            for msg_id,log in list(class_dict.items()):
+                try:
+                    name = log.msg_name()
+                except NoMessageError:
+                    continue
+                if msg_name is not None and name != msg_name:
+                    continue
+                
+                if self.__needsHistory(sender_id,class_id,msg_id,name,log):
+                    if type(log) is RateLog:
+                        log = self.__upgradeLog(sender_id,class_dict,log)
+                        if log.sample_count() > 0:
+                            self.__markDirty((sender_id,class_id,msg_id),True)
+                elif self.__track_interest:
+                    if type(log) is not RateLog:
+                        class_dict[msg_id] = RateLog.from_log(sender_id,log)
+                        self.__structure_changed = True
+                else:
+                    # Nobody reads it anymore: drop its history
+                    del class_dict[msg_id]
+                    self.__structure_changed = True
+        
+    def __insertLogs(self,logs:dict[tuple[int,int,int],MessageLog]):
+        for (sender_id,class_id,msg_id),log in logs.items():
+            self.__loaded_logs.add((sender_id,class_id,msg_id))
+            self.__addSender(sender_id)
+            class_dict = self.__live_records[sender_id].setdefault(class_id,dict())
+            new_msg = not(msg_id in class_dict.keys())
+            class_dict[msg_id] = log
+            self.classNames[class_id] = log.msg_class()
+            self.__structure_changed = True
+            
+            self.__markDirty((sender_id,class_id,msg_id),new_msg)
+            
+            if self.__per_message_signals:
+                self._dataUpdated(sender_id,class_id,msg_id,new_msg)
+                
+    def loadLogs(self,logs:dict[tuple[int,int,int],MessageLog]):
+        """Add already filled MessageLog (e.g. imported from a file, see msgRecord.dataImport),
+        keyed by (sender_id,class_id,msg_id). Existing logs with the same key are replaced."""
+        self.__ingest_queue.pushControl((None,dict(logs)))
+        for sender_id,_,_ in logs.keys():
+            self.__known_senders.setdefault(sender_id,0)
+        
+    def recordMessage(self,sender_id:int,msg:typing.Union[PprzMessage,MessageSchema]):
+        """Record `msg` from `sender_id` (0 for ground agents). Calls are reference-counted:
+        the message is recorded until `stopRecordingMessage` has been called as many times.
+        Its log is then freed (or replaced by a RateLog, see `track_interest`), unless its sender is recorded."""
+        key = (int(sender_id),msg.name)
+        self.__registered_msgs[key] = self.__registered_msgs.get(key,0) + 1
+        if self.__track_interest and self.__registered_msgs[key] == 1:
+            self.__ingest_queue.pushControl((None,key))
+            
+    def stopRecordingMessage(self,sender_id:int,msg:typing.Union[PprzMessage,MessageSchema]):
+        key = (int(sender_id),msg.name)
+        try:
+            count = self.__registered_msgs[key]
+        except KeyError:
+            return
+        
+        if count <= 1:
+            del self.__registered_msgs[key]
+            self.__ingest_queue.pushControl((None,key))
+        else:
+            self.__registered_msgs[key] = count - 1
+            
+    def acquire(self,index:MessageIndex):
+        """Record the message at `index` for one more consumer (same as `recordMessage`)."""
+        self.recordMessage(index.sender_id,index.schema())
+        
+    def release(self,index:MessageIndex):
+        """Drop one consumer of the message at `index`: its log is freed when the last one is gone
+        (same as `stopRecordingMessage`)."""
+        self.stopRecordingMessage(index.sender_id,index.schema())
+        
+    def consumerCount(self,index:MessageIndex) -> int:
+        """Number of `acquire` (or `recordMessage`) not yet released for the message at `index`."""
+        return self.__registered_msgs.get((index.sender_id,index.schema().name),0)
+
+    def tracksInterest(self) -> bool:
+        """True if the messages that are not recorded are counted (see RateLog)."""
+        return self.__track_interest
+
+    def recordSender(self,sender_id:int):
+        """Record every message from `sender_id`. Calls are reference-counted, as for `recordMessage`."""
+        try:
+            count = self.__known_senders[sender_id]
+        except KeyError:
+            raise UnknownSenderError(sender_id,list(self.__known_senders.keys()))
+        
+        self.__known_senders[sender_id] = count + 1
+        if self.__track_interest and count == 0:
+            self.__ingest_queue.pushControl((None,(sender_id,None)))
+            
+    def stopRecordingSender(self,sender_id:int):
+        try:
+            count = self.__known_senders[sender_id]
+        except KeyError:
+            raise UnknownSenderError(sender_id,list(self.__known_senders.keys()))
+        
+        self.__known_senders[sender_id] = max(count-1,0)
+        if count == 1:
+            self.__ingest_queue.pushControl((None,(sender_id,None)))
+            
+    def stop(self):
+        if self.ivy is not None:
+            IvyUnBindMsg(self.__bind_id)
+            self.ivy.stop()
+        self.__stopping.set()
+        self.__ingest_thread.join()
+        self.stopRecording()
+        self.stopStreaming()
+        self.stopServing()
+        self.stopSharing()
+        for streams in self.__streams.values():
+            for s in streams:
+                s.finish()
+        
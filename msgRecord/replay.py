@@ -0,0 +1,166 @@
+# Copyright (C) 2024 Mael FEURGARD <mael.feurgard@enac.fr>
+#
+# This file is part of messages_python.
+#
+# messages_python is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# messages_python is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with messages_python.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Replay of recorded segment files (see msgRecord.segmentFile) into an IvyRecorder."""
+
+import typing
+import threading
+import time
+
+from msgRecord.ivyRecorder import IvyRecorder
+from msgRecord.messageSchema import SCHEMAS
+from msgRecord.segmentFile import Recording
+
+class ReplaySource():
+    """Feed the messages of a `Recording` to `recorder.injectLine`, from a background thread.
+
+    With `speed` > 0, messages are injected at `speed` times their recorded pace;
+    with `speed` None (or 0), as fast as the recorder ingests them.
+    Reception timestamps are shifted so that they follow the wall clock (they
+    keep their recorded spacing, divided by `speed`), so the recorder and the
+    views behave as with a live bus.
+    """
+    MAX_SLEEP = 0.05 # Longest uninterrupted sleep, in s (bounds the reaction time to controls)
+    MAX_QUEUE_DEPTH = 10000 # Back-pressure threshold on the recorder ingest queue
+
+    def __init__(self,recorder:IvyRecorder,recording:Recording,speed:typing.Optional[float]=1.):
+        self.recorder = recorder
+        self.recording = recording
+
+        self.__lock = threading.Lock()
+        self.__wake = threading.Event()
+        self.__stopping = threading.Event()
+        self.__paused = False
+
+        self.__speed = speed if speed else None
+        self.__index = 0
+        self.__position:typing.Optional[int] = None # Recorded timestamp of the last injected message
+        self.__last_out = 0 # Last injected timestamp
+        self.skipped = 0 # Records of messages unknown to the current definitions (only the first one is reported)
+
+        # Injected timestamp = anchor_out + (recorded timestamp - anchor_t)/speed
+        self.__anchor_t = 0
+        self.__anchor_out = 0
+        self.__anchor_wall = 0
+
+        self.__thread:typing.Optional[threading.Thread] = None
+
+    ########## Controls ##########
+
+    def start(self):
+        with self.__lock:
+            self.__reanchor()
+        self.__thread = threading.Thread(target=self.__replayLoop,name="ReplaySource",daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        self.__stopping.set()
+        self.__wake.set()
+        if self.__thread is not None:
+            self.__thread.join()
+
+    def pause(self):
+        with self.__lock:
+            self.__paused = True
+        self.__wake.set()
+
+    def resume(self):
+        with self.__lock:
+            self.__paused = False
+            self.__reanchor()
+        self.__wake.set()
+
+    def isPaused(self) -> bool:
+        return self.__paused
+
+    def isFinished(self) -> bool:
+        return self.__index >= len(self.recording)
+
+    def seek(self,t:int):
+        """Continue the replay from the first message recorded at or after `t` (in ns)."""
+        with self.__lock:
+            self.__index = self.recording.find(t)
+            self.__reanchor()
+        self.__wake.set()
+
+    def setSpeed(self,speed:typing.Optional[float]):
+        with self.__lock:
+            self.__speed = speed if speed else None
+            self.__reanchor()
+        self.__wake.set()
+
+    def speed(self) -> typing.Optional[float]:
+        return self.__speed
+
+    def position(self) -> typing.Optional[int]:
+        """Recorded timestamp (in ns) of the last replayed message."""
+        return self.__position
+
+    ########## Replay ##########
+
+    def __reanchor(self):
+        # Must be called with the lock held
+        if self.__index >= len(self.recording):
+            return
+        self.__anchor_t = self.recording.timestamp(self.__index)
+        self.__anchor_wall = time.time_ns()
+        # Injected timestamps never go backwards, even when seeking back
+        self.__anchor_out = max(self.__anchor_wall,self.__last_out + 1)
+
+    def __replayLoop(self):
+        while not(self.__stopping.is_set()):
+            with self.__lock:
+                if self.__paused or self.__index >= len(self.recording):
+                    delay = self.MAX_SLEEP
+                    record = None
+                else:
+                    record = self.recording.record(self.__index)
+                    elapsed = record[0] - self.__anchor_t
+                    if self.__speed is None:
+                        t_out = self.__anchor_out + elapsed
+                        delay = 0
+                    else:
+                        t_out = self.__anchor_out + int(elapsed / self.__speed)
+                        delay = (self.__anchor_wall + elapsed / self.__speed - time.time_ns()) / 1e9
+
+                    if self.__speed is None and self.recorder.queueDepth() > self.MAX_QUEUE_DEPTH:
+                        # Let the recorder catch up, rather than dropping messages
+                        delay = self.MAX_SLEEP / 10
+                        record = None
+                    elif delay <= 0:
+                        self.__index += 1
+                        self.__position = record[0]
+                        self.__last_out = t_out
+                    else:
+                        record = None
+
+            if record is None:
+                self.__wake.wait(min(delay,self.MAX_SLEEP))
+                self.__wake.clear()
+                continue
+
+            t,sender_id,class_id,msg_id,payload = record
+            try:
+                msg_name = SCHEMAS.get(class_id,msg_id).name
+            except Exception as e:
+                # e.g. a recording made with other message definitions: the same ids come back at replay rate
+                self.skipped += 1
+                if self.skipped == 1:
+                    print(f"Skipping recorded message ({class_id},{msg_id}): {e} (further ones are only counted, see skipped)")
+                continue
+
+            self.recorder.injectLine(t_out,str(sender_id) if sender_id != 0 else "ground",msg_name,payload)
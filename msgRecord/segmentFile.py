@@ -0,0 +1,365 @@
+# Copyright (C) 2024 Mael FEURGARD <mael.feurgard@enac.fr>
+#
+# This file is part of messages_python.
+#
+# messages_python is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# messages_python is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with messages_python.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Append-only binary recording of received messages.
+
+A segment file starts with `MAGIC`, followed by records made of a
+`RECORD_HEADER` (timestamp in ns, sender_id, class_id, msg_id, payload length)
+and the Ivy payload of the message, UTF-8 encoded.
+
+Only numeric sender ids are stored: messages from named agents are all recorded
+with sender_id 0, and replayed as sent by "ground". Records that do not fit the
+header (e.g. a payload longer than 65535 bytes) are skipped, and counted as dropped.
+"""
+
+import typing
+import struct
+import threading
+import time
+import pathlib
+import mmap
+import bisect
+import socket
+import os
+from array import array
+
+from msgRecord.ingestQueue import IngestQueue
+
+MAGIC = b'PPRZREC\x01'
+RECORD_HEADER = struct.Struct('<qHBBH') # (timestamp,sender_id,class_id,msg_id,payload_length)
+SEGMENT_SUFFIX = '.pprzrec'
+
+class SegmentError(Exception):
+    pass
+
+def pack_records(batch:typing.Iterable[tuple[int,int,int,int,str]]) -> tuple[bytearray,int]:
+    """Encode (timestamp,sender_id,class_id,msg_id,payload) records.
+    Returns the encoded records, and the number of records skipped because they do not fit `RECORD_HEADER`."""
+    buffer = bytearray()
+    skipped = 0
+    pack = RECORD_HEADER.pack
+    for t,sender_id,class_id,msg_id,payload in batch:
+        data = payload.encode()
+        try:
+            buffer += pack(t,sender_id,class_id,msg_id,len(data))
+        except struct.error:
+            skipped += 1
+            continue
+        buffer += data
+    return buffer,skipped
+
+def open_server(address:str) -> socket.socket:
+    """Listening socket on `address`: a path (Unix domain socket) or "host:port" (TCP)."""
+    if ':' in address:
+        host,port = address.rsplit(':',1)
+        return socket.create_server((host,int(port)))
+    if os.path.exists(address):
+        os.unlink(address)
+    server = socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+    server.bind(address)
+    server.listen()
+    return server
+
+def close_server(server:socket.socket,address:str):
+    server.close()
+    if not(':' in address) and os.path.exists(address):
+        os.unlink(address)
+
+def connect(address:str) -> socket.socket:
+    """Client socket connected to a server opened with `open_server`."""
+    if ':' in address:
+        host,port = address.rsplit(':',1)
+        return socket.create_connection((host,int(port)))
+    client = socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+    client.connect(address)
+    return client
+
+class SegmentWriter():
+    """Write received messages to a series of segment files, in a background thread.
+
+    `write` only queues the message, so it never blocks the caller; messages are
+    dropped (and counted) if the writer falls behind by more than `queue_size`.
+    A new segment is started once the current one exceeds `segment_size` bytes.
+    """
+    FLUSH_PERIOD = 0.2 # Time between two writes to disk, in s
+    CHUNK = 1000 # Records encoded at once (a segment may exceed `segment_size` by one chunk)
+
+    def __init__(self,directory:typing.Union[str,pathlib.Path],prefix:str="recording",
+                 segment_size:int=256*1024*1024,queue_size:int=1000000):
+        self.directory = pathlib.Path(directory)
+        self.directory.mkdir(parents=True,exist_ok=True)
+        self.prefix = prefix
+        self.segment_size = segment_size
+
+        self.__queue = IngestQueue(queue_size)
+        self.__session = time.strftime("%Y%m%d_%H%M%S")
+        self.__segment_index = 0
+        self.__file:typing.Optional[typing.BinaryIO] = None
+        self.__file_size = 0
+
+        # Paths of all the segments written so far
+        self.segments:list[pathlib.Path] = []
+        self.written = 0
+        self.skipped = 0 # Records that do not fit the format (see pack_records)
+
+        self.__stopping = threading.Event()
+        self.__thread = threading.Thread(target=self.__writeLoop,name="SegmentWriter",daemon=True)
+        self.__thread.start()
+
+    def write(self,t:int,sender_id:int,class_id:int,msg_id:int,payload:str):
+        self.__queue.push((t,sender_id,class_id,msg_id,payload))
+
+    def droppedCount(self) -> int:
+        return self.__queue.dropped + self.skipped
+
+    def queueDepth(self) -> int:
+        return len(self.__queue)
+
+    def close(self):
+        """Write everything still queued, then close the current segment."""
+        self.__stopping.set()
+        self.__thread.join()
+
+    def __openSegment(self):
+        if self.__file is not None:
+            self.__file.close()
+
+        path = self.directory / f"{self.prefix}_{self.__session}_{self.__segment_index:04d}{SEGMENT_SUFFIX}"
+        self.__segment_index += 1
+
+        self.__file = open(path,'wb',buffering=1024*1024)
+        self.__file.write(MAGIC)
+        self.__file_size = len(MAGIC)
+        self.segments.append(path)
+
+    def __writeBatch(self,batch:list):
+        if self.__file is None:
+            self.__openSegment()
+
+        for i in range(0,len(batch),self.CHUNK):
+            chunk = batch[i:i+self.CHUNK]
+            buffer,skipped = pack_records(chunk)
+            self.__file.write(buffer)
+            self.__file_size += len(buffer)
+            self.skipped += skipped
+            self.written += len(chunk) - skipped
+
+            if self.__file_size >= self.segment_size:
+                self.__openSegment()
+        self.__file.flush()
+
+    def __writeLoop(self):
+        while True:
+            stopping = self.__stopping.wait(self.FLUSH_PERIOD)
+            batch = self.__queue.drain()
+            if len(batch) > 0:
+                self.__writeBatch(batch)
+            if stopping:
+                break
+
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
+
+
+class SocketWriter():
+    """Stream received messages to the clients of a local socket, in the segment file format.
+
+    `address` is either a path (Unix domain socket) or "host:port" (TCP).
+    Each client first receives `MAGIC`, then the records received after it connected.
+    A client that does not keep up (send blocked for more than `SEND_TIMEOUT`) is disconnected.
+    """
+    FLUSH_PERIOD = 0.05 # Time between two sends, in s
+    SEND_TIMEOUT = 1. # in s
+
+    def __init__(self,address:str,queue_size:int=1000000):
+        self.address = address
+        self.__server = open_server(address)
+        self.__server.settimeout(self.FLUSH_PERIOD)
+
+        self.__queue = IngestQueue(queue_size)
+        self.__clients:list[socket.socket] = []
+        self.written = 0
+        self.skipped = 0 # Records that do not fit the format (see pack_records)
+
+        self.__stopping = threading.Event()
+        self.__thread = threading.Thread(target=self.__sendLoop,name="SocketWriter",daemon=True)
+        self.__thread.start()
+
+    def write(self,t:int,sender_id:int,class_id:int,msg_id:int,payload:str):
+        self.__queue.push((t,sender_id,class_id,msg_id,payload))
+
+    def droppedCount(self) -> int:
+        return self.__queue.dropped + self.skipped
+
+    def queueDepth(self) -> int:
+        return len(self.__queue)
+
+    def clientCount(self) -> int:
+        return len(self.__clients)
+
+    def close(self):
+        self.__stopping.set()
+        self.__thread.join()
+
+    def __accept(self):
+        try:
+            client,_ = self.__server.accept()
+        except (socket.timeout,BlockingIOError):
+            return
+        client.settimeout(self.SEND_TIMEOUT)
+        try:
+            client.sendall(MAGIC)
+        except OSError:
+            client.close()
+            return
+        self.__clients.append(client)
+
+    def __send(self,data:bytes):
+        for c in list(self.__clients):
+            try:
+                c.sendall(data)
+            except OSError:
+                self.__clients.remove(c)
+                c.close()
+
+    def __sendLoop(self):
+        while not(self.__stopping.is_set()):
+            # Waits up to FLUSH_PERIOD for a new client
+            self.__accept()
+            batch = self.__queue.drain()
+            if len(batch) > 0:
+                buffer,skipped = pack_records(batch)
+                self.__send(bytes(buffer))
+                self.skipped += skipped
+                self.written += len(batch) - skipped
+
+        for c in self.__clients:
+            c.close()
+        close_server(self.__server,self.address)
+
+
+class SegmentReader():
+    """Memory-mapped, read-only access to a single segment file.
+    
+    Opening a segment only scans the record headers, to index their offsets and
+    timestamps. A truncated last record (e.g. after a crash) is ignored.
+    """
+    def __init__(self,path:typing.Union[str,pathlib.Path]):
+        self.path = pathlib.Path(path)
+        
+        self.__file = open(self.path,'rb')
+        try:
+            self.__map = mmap.mmap(self.__file.fileno(),0,access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty file
+            self.__file.close()
+            raise SegmentError(f"Not a segment file: {self.path}")
+            
+        if self.__map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise SegmentError(f"Not a segment file: {self.path}")
+        
+        self.timestamps = array('q')
+        self.offsets = array('Q')
+        self.__index()
+        
+    def __index(self):
+        pos = len(MAGIC)
+        end = len(self.__map)
+        header_size = RECORD_HEADER.size
+        unpack_from = RECORD_HEADER.unpack_from
+        
+        while pos + header_size <= end:
+            t,_,_,_,length = unpack_from(self.__map,pos)
+            if pos + header_size + length > end:
+                break
+            self.timestamps.append(t)
+            self.offsets.append(pos)
+            pos += header_size + length
+            
+    def __len__(self) -> int:
+        return len(self.offsets)
+    
+    def record(self,i:int) -> tuple[int,int,int,int,str]:
+        """Record `i`, as (timestamp,sender_id,class_id,msg_id,payload)."""
+        pos = self.offsets[i]
+        t,sender_id,class_id,msg_id,length = RECORD_HEADER.unpack_from(self.__map,pos)
+        start = pos + RECORD_HEADER.size
+        return t,sender_id,class_id,msg_id,self.__map[start:start+length].decode()
+    
+    def find(self,t:int) -> int:
+        """Index of the first record received at or after `t`."""
+        return bisect.bisect_left(self.timestamps,t)
+    
+    def close(self):
+        self.__map.close()
+        self.__file.close()
+        
+        
+class Recording():
+    """Successive segment files of a recording session, seen as a single sequence of records."""
+    def __init__(self,paths:typing.Iterable[typing.Union[str,pathlib.Path]]):
+        files = []
+        for p in map(pathlib.Path,paths):
+            if p.is_dir():
+                files.extend(p.glob(f"*{SEGMENT_SUFFIX}"))
+            else:
+                files.append(p)
+        
+        self.segments = [SegmentReader(p) for p in sorted(files)]
+        self.segments = [s for s in self.segments if len(s) > 0]
+        
+        # Index of the first record of each segment
+        self.starts:list[int] = []
+        total = 0
+        for s in self.segments:
+            self.starts.append(total)
+            total += len(s)
+        self.__length = total
+        
+    @staticmethod
+    def from_directory(directory:typing.Union[str,pathlib.Path],prefix:str="") -> 'Recording':
+        return Recording(pathlib.Path(directory).glob(f"{prefix}*{SEGMENT_SUFFIX}"))
+        
+    def __len__(self) -> int:
+        return self.__length
+    
+    def record(self,i:int) -> tuple[int,int,int,int,str]:
+        seg = bisect.bisect_right(self.starts,i) - 1
+        return self.segments[seg].record(i - self.starts[seg])
+    
+    def timestamp(self,i:int) -> int:
+        seg = bisect.bisect_right(self.starts,i) - 1
+        return self.segments[seg].timestamps[i - self.starts[seg]]
+    
+    def find(self,t:int) -> int:
+        """Index of the first record received at or after `t`."""
+        for start,s in zip(self.starts,self.segments):
+            if s.timestamps[-1] >= t:
+                return start + s.find(t)
+        return len(self)
+    
+    def startTime(self) -> typing.Optional[int]:
+        return self.segments[0].timestamps[0] if len(self) > 0 else None
+    
+    def endTime(self) -> typing.Optional[int]:
+        return self.segments[-1].timestamps[-1] if len(self) > 0 else None
+    
+    def close(self):
+        for s in self.segments:
+            s.close()
@@ -0,0 +1,128 @@
+# Copyright (C) 2024 Mael FEURGARD <mael.feurgard@enac.fr>
+#
+# This file is part of messages_python.
+#
+# messages_python is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# messages_python is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with messages_python.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Viewer side of msgRecord.sharedStore: the messages published by another process, as an IvyRecorder would expose them."""
+
+import typing
+
+from pprzlink.message import PprzMessage
+
+from msgRecord.messageLog import MessageLog,MessageIndex
+from msgRecord.messageSchema import MessageSchema
+from msgRecord.sharedStore import SharedIndex,SharedMessageLog,SharedStoreError
+
+from PyQt5.QtCore import QObject,QTimer,pyqtSignal
+
+class SharedRecorder(QObject):
+    """Read-only replacement of IvyRecorder, attached to the shared memory of a recorder
+    started with `RecorderCore.startSharing(name)` (e.g. `pprzrecord.py --share name`).
+
+    The shared logs are polled every `period` ms from the Qt event loop, and the same
+    signals as IvyRecorder are emitted. The publisher records every sender and every
+    message, so `recordSender` and `recordMessage` do nothing; `acquire` and `release`
+    only count the consumers (see `consumerCount`).
+    """
+    data_updated = pyqtSignal(int,int,int,bool) # (sender_id,class_id,msg_id,new_msg)
+    data_batch_updated = pyqtSignal(object,object) # (updated,new) sets of (sender_id,class_id,msg_id)
+    new_sender = pyqtSignal(int) # (sender_id)
+
+    def __init__(self,name:str,period:int=100,per_message_signals:bool=False,parent:typing.Optional[QObject]=None) -> None:
+        super().__init__(parent)
+        self.name = name
+        self.__index = SharedIndex(name)
+        self.__entries = 0 # Index entries already attached
+        self.__per_message_signals = per_message_signals
+
+        # Same layout as RecorderCore.records, replaced (never modified in place) when a message appears
+        self.records:dict[int,dict[int,dict[int,SharedMessageLog]]] = dict()
+        self.__logs:list[tuple[tuple[int,int,int],SharedMessageLog]] = []
+        # Mapping : (sender_id,class_id,msg_id) -> number of consumers
+        self.__consumers:dict[tuple[int,int,int],int] = dict()
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.poll)
+        self.timer.start(period)
+
+    def getMessage(self,i:MessageIndex) -> MessageLog:
+        log = self.records[i.sender_id][i.class_id][i.message_id]
+        log.touch()
+        return log
+
+    def recordSender(self,sender_id:int):
+        pass
+
+    def recordMessage(self,sender_id:int,msg:typing.Union[PprzMessage,MessageSchema]):
+        pass
+    
+    def acquire(self,index:MessageIndex):
+        key = (index.sender_id,index.class_id,index.message_id)
+        self.__consumers[key] = self.__consumers.get(key,0) + 1
+    
+    def release(self,index:MessageIndex):
+        key = (index.sender_id,index.class_id,index.message_id)
+        count = self.__consumers.get(key,0)
+        if count <= 1:
+            self.__consumers.pop(key,None)
+        else:
+            self.__consumers[key] = count - 1
+            
+    def consumerCount(self,index:MessageIndex) -> int:
+        return self.__consumers.get((index.sender_id,index.class_id,index.message_id),0)
+
+    def poll(self):
+        """Attach the newly published messages, and account for the new samples of all of them."""
+        new:set[tuple[int,int,int]] = set()
+        new_senders:list[int] = []
+
+        entries = self.__index.entries(self.__entries)
+        if len(entries) > 0:
+            records = {s:{c:dict(md) for c,md in cd.items()} for s,cd in self.records.items()}
+            for key in entries:
+                sender_id,class_id,msg_id = key
+                try:
+                    log = SharedMessageLog(self.name,sender_id,class_id,msg_id)
+                except (FileNotFoundError,SharedStoreError) as e:
+                    print(f"Could not attach {key}: {e}")
+                    continue
+                if sender_id not in records:
+                    new_senders.append(sender_id)
+                records.setdefault(sender_id,dict()).setdefault(class_id,dict())[msg_id] = log
+                self.__logs.append((key,log))
+                new.add(key)
+            self.__entries += len(entries)
+            self.records = records
+
+        updated:set[tuple[int,int,int]] = set()
+        for key,log in self.__logs:
+            if log.refresh():
+                updated.add(key)
+
+        for sender_id in new_senders:
+            self.new_sender.emit(sender_id)
+        if self.__per_message_signals:
+            for key in updated:
+                self.data_updated.emit(*key,key in new)
+        if len(updated) > 0:
+            self.data_batch_updated.emit(updated,new & updated)
+
+    def stop(self):
+        self.timer.stop()
+        for _,log in self.__logs:
+            log.close()
+        self.__logs.clear()
+        self.records = dict()
+        self.__index.close()
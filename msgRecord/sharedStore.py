@@ -0,0 +1,460 @@
+# Copyright (C) 2024 Mael FEURGARD <mael.feurgard@enac.fr>
+#
+# This file is part of messages_python.
+#
+# messages_python is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# messages_python is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with messages_python.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Per-message ring buffers in shared memory, written by one recorder and read by any number of viewers.
+
+The publisher (`SharedStorePublisher`, a sink of RecorderCore) creates one
+shared memory block per message, `{name}_{sender_id}_{class_id}_{msg_id}`, and
+lists them in the index block `{name}_index`. Viewers open them with
+`SharedMessageLog`, which reads the buffers in place (see msgRecord.sharedRecorder
+for the Qt side).
+
+A ring block is made of:
+- a header (`RING_HEADER`): seqlock counter (odd while a sample is being
+  written), number of samples written so far, capacity, payload slot size and
+  layout length,
+- the layout (JSON): ids of the message and position of each column,
+- the columns: timestamps and numeric fields (scalars and fixed size arrays),
+  as mirrored ring buffers (see msgRecord.columnarLog.FieldColumn), so that the
+  newest samples are always a contiguous slice,
+- the raw Ivy payloads (fixed size slots), from which the other fields and the
+  newest message are decoded.
+
+The index block is a header (`INDEX_HEADER`: magic, entry count) followed by
+`INDEX_ENTRY` entries (sender_id, class_id, msg_id). There is a single writer;
+an entry is written before the count is incremented.
+"""
+
+import typing
+import json
+import struct
+import threading
+from multiprocessing import shared_memory,resource_tracker
+
+import numpy as np
+
+from msgRecord.messageLog import MessageLog,TimedPprzMessage,LazyTimedMessage,NoMessageError
+from msgRecord.columnarLog import field_dtype
+from msgRecord.messageSchema import SCHEMAS
+
+INDEX_MAGIC = b'PPRZSHM\x01'
+INDEX_HEADER = struct.Struct('<8sq') # (magic,entry count)
+INDEX_ENTRY = struct.Struct('<HBBi') # (sender_id,class_id,msg_id,reserved)
+MAX_MESSAGES = 4096 # Entries of the index
+
+RING_HEADER = struct.Struct('<qqqqq') # (seqlock,written,capacity,payload_size,layout_length)
+LAYOUT_SIZE = 8192 # Space reserved for the layout, in bytes
+DATA_OFFSET = RING_HEADER.size + LAYOUT_SIZE
+
+CAPACITY = 10000 # Default number of samples per message
+PAYLOAD_SIZE = 128 # Minimum size of a payload slot, in bytes (at least twice the first payload of the message)
+GUARD_FRACTION = 8 # Readers only see capacity*(1-1/GUARD_FRACTION) samples, the rest is a margin for the writer
+
+class SharedStoreError(Exception):
+    pass
+
+def ring_name(name:str,sender_id:int,class_id:int,msg_id:int) -> str:
+    return f"{name}_{sender_id}_{class_id}_{msg_id}"
+
+def index_name(name:str) -> str:
+    return f"{name}_index"
+
+# Blocks created by this process (see attach)
+_owned:set[str] = set()
+
+def attach(name:str) -> shared_memory.SharedMemory:
+    """Open an existing block, without letting this process unlink it on exit."""
+    shm = shared_memory.SharedMemory(name)
+    # The resource tracker would destroy the block when this process exits (only the publisher owns it)
+    if name not in _owned:
+        resource_tracker.unregister(shm._name,'shared_memory')
+    return shm
+
+def create(name:str,size:int) -> shared_memory.SharedMemory:
+    try:
+        shm = shared_memory.SharedMemory(name,create=True,size=size)
+    except FileExistsError:
+        # Left over by a publisher that did not exit cleanly
+        stale = shared_memory.SharedMemory(name)
+        stale.close()
+        stale.unlink()
+        shm = shared_memory.SharedMemory(name,create=True,size=size)
+    _owned.add(name)
+    return shm
+
+def destroy(shm:shared_memory.SharedMemory):
+    """Close and remove a block created by `create`."""
+    shm.close()
+    shm.unlink()
+    _owned.discard(shm.name)
+
+def sender_name(sender_id:int) -> str:
+    """First word of the Ivy line of a sender (see msgRecord.replay)."""
+    return str(sender_id) if sender_id != 0 else "ground"
+
+########## Layout ##########
+
+def message_layout(msg:TimedPprzMessage,capacity:int,payload_size:int) -> dict:
+    """Layout of the ring of `msg`: offset, dtype and width of every column."""
+    offset = DATA_OFFSET
+    def place(nbytes:int) -> int:
+        nonlocal offset
+        start = offset
+        offset += (nbytes + 7) // 8 * 8
+        return start
+
+    columns = dict()
+    for field in msg.schema().fields:
+        dtype = field_dtype(field.typestr)
+        if dtype == object:
+            continue
+        width = None
+        if field.array_type:
+            if field.length is None:
+                # Variable length array: only available from the payloads
+                continue
+            width = field.length
+        columns[field.name] = {'dtype':dtype.str,'width':width,'offset':place(2*capacity*dtype.itemsize*(width or 1))}
+
+    return {'sender_id':None,'class_id':msg.class_id,'msg_id':msg.msg_id,
+            'timestamps':place(2*capacity*8),
+            'lengths':place(capacity*4),
+            'payloads':place(capacity*payload_size),
+            'columns':columns,
+            'size':offset}
+
+class RingView():
+    """NumPy arrays over a ring block (shared by the writer and the readers)."""
+    def __init__(self,shm:shared_memory.SharedMemory,layout:dict,capacity:int,payload_size:int,writeable:bool):
+        self.shm = shm
+        self.layout = layout
+        self.capacity = capacity
+        self.payload_size = payload_size
+
+        buf = shm.buf
+        self.header = np.ndarray((RING_HEADER.size//8,),dtype=np.int64,buffer=buf)
+        self.timestamps = np.ndarray((2*capacity,),dtype=np.int64,buffer=buf,offset=layout['timestamps'])
+        self.lengths = np.ndarray((capacity,),dtype=np.int32,buffer=buf,offset=layout['lengths'])
+        self.payloads = np.ndarray((capacity,payload_size),dtype=np.uint8,buffer=buf,offset=layout['payloads'])
+        self.columns:dict[str,np.ndarray] = dict()
+        for f,c in layout['columns'].items():
+            shape = (2*capacity,) if c['width'] is None else (2*capacity,c['width'])
+            self.columns[f] = np.ndarray(shape,dtype=np.dtype(c['dtype']),buffer=buf,offset=c['offset'])
+
+        if not(writeable):
+            for a in [self.timestamps,self.lengths,self.payloads] + list(self.columns.values()):
+                a.flags.writeable = False
+
+    def release(self):
+        """Drop the arrays, so that the block can be closed."""
+        self.header = self.timestamps = self.lengths = self.payloads = None
+        self.columns = dict()
+
+    def payload(self,slot:int) -> str:
+        return self.payloads[slot,:self.lengths[slot]].tobytes().decode()
+
+########## Publisher ##########
+
+class SharedRingWriter():
+    def __init__(self,name:str,sender_id:int,msg:TimedPprzMessage,payload:str,capacity:int):
+        self.capacity = capacity
+        payload_size = max(PAYLOAD_SIZE,(2*len(payload.encode()) + 7) // 8 * 8)
+        layout = message_layout(msg,capacity,payload_size)
+        layout['sender_id'] = sender_id
+        text = json.dumps(layout).encode()
+        if len(text) > LAYOUT_SIZE:
+            raise SharedStoreError(f"Layout of {msg.name} too large")
+
+        self.shm = create(ring_name(name,sender_id,msg.class_id,msg.msg_id),layout['size'])
+        self.shm.buf[RING_HEADER.size:RING_HEADER.size+len(text)] = text
+        RING_HEADER.pack_into(self.shm.buf,0,0,0,capacity,payload_size,len(text))
+
+        self.view = RingView(self.shm,layout,capacity,payload_size,True)
+        self.written = 0
+        self.truncated = 0
+
+    def write(self,t:int,payload:str,msg:TimedPprzMessage):
+        v = self.view
+        slot = self.written % self.capacity
+        mirror = slot + self.capacity
+        data = payload.encode()
+        if len(data) > v.payload_size:
+            self.truncated += 1
+            data = b''
+
+        v.header[0] += 1 # Odd: writing
+        v.timestamps[slot] = t
+        v.timestamps[mirror] = t
+        for f,col in v.columns.items():
+            val = msg[f]
+            col[slot] = val
+            col[mirror] = val
+        v.lengths[slot] = len(data)
+        v.payloads[slot,:len(data)] = np.frombuffer(data,dtype=np.uint8)
+        self.written += 1
+        v.header[1] = self.written
+        v.header[0] += 1 # Even: consistent
+
+    def close(self):
+        self.view.release()
+        destroy(self.shm)
+
+class SharedStorePublisher():
+    """Publish every ingested message to per-message ring buffers in shared memory (see RecorderCore.startSharing)."""
+    def __init__(self,name:str,capacity:int=CAPACITY):
+        self.name = name
+        self.capacity = capacity
+        self.__index = create(index_name(name),INDEX_HEADER.size + MAX_MESSAGES*INDEX_ENTRY.size)
+        INDEX_HEADER.pack_into(self.__index.buf,0,INDEX_MAGIC,0)
+        # Mapping : (sender_id,class_id,msg_id) -> SharedRingWriter
+        self.__rings:dict[tuple[int,int,int],typing.Optional[SharedRingWriter]] = dict()
+        self.written = 0
+        self.errors = 0
+        # Written by the ingest worker, closed by the thread stopping the recorder
+        self.__lock = threading.Lock()
+        self.__closed = False
+
+    def write(self,t:int,sender_id:int,class_id:int,msg_id:int,payload:str,msg:TimedPprzMessage):
+        key = (sender_id,class_id,msg_id)
+        with self.__lock:
+            if self.__closed:
+                return
+            try:
+                ring = self.__rings[key]
+            except KeyError:
+                ring = self.__newRing(sender_id,msg,payload)
+            if ring is None:
+                return
+            try:
+                ring.write(t,payload,msg)
+            except (ValueError,TypeError,OverflowError) as e:
+                # A value that does not fit its column (e.g. an array of unexpected length)
+                self.errors += 1
+                if self.errors == 1:
+                    print(f"Could not publish {msg.name}: {e}")
+                return
+            self.written += 1
+
+    def __newRing(self,sender_id:int,msg:TimedPprzMessage,payload:str) -> typing.Optional[SharedRingWriter]:
+        key = (sender_id,msg.class_id,msg.msg_id)
+        count = len(self.__rings)
+        if count >= MAX_MESSAGES:
+            return None
+        try:
+            ring = SharedRingWriter(self.name,sender_id,msg,payload,self.capacity)
+        except SharedStoreError as e:
+            print(e)
+            self.__rings[key] = None
+            return None
+        self.__rings[key] = ring
+        INDEX_ENTRY.pack_into(self.__index.buf,INDEX_HEADER.size + count*INDEX_ENTRY.size,*key,0)
+        INDEX_HEADER.pack_into(self.__index.buf,0,INDEX_MAGIC,count+1)
+        return ring
+
+    def messageCount(self) -> int:
+        return len(self.__rings)
+
+    def close(self):
+        """Remove the blocks. Viewers already attached keep their mappings."""
+        with self.__lock:
+            if self.__closed:
+                return
+            self.__closed = True
+            for r in self.__rings.values():
+                if r is not None:
+                    r.close()
+            self.__rings.clear()
+            destroy(self.__index)
+
+########## Readers ##########
+
+class SharedIndex():
+    """Read-only access to the index of a publisher."""
+    def __init__(self,name:str):
+        self.name = name
+        try:
+            self.__shm = attach(index_name(name))
+        except FileNotFoundError:
+            raise SharedStoreError(f"No shared recorder named '{name}'")
+        magic,_ = INDEX_HEADER.unpack_from(self.__shm.buf,0)
+        if magic != INDEX_MAGIC:
+            self.close()
+            raise SharedStoreError(f"'{index_name(name)}' is not a shared recorder index")
+
+    def entries(self,start:int=0) -> list[tuple[int,int,int]]:
+        """(sender_id,class_id,msg_id) of the messages published, from the `start`-th one."""
+        _,count = INDEX_HEADER.unpack_from(self.__shm.buf,0)
+        return [INDEX_ENTRY.unpack_from(self.__shm.buf,INDEX_HEADER.size + i*INDEX_ENTRY.size)[:3] for i in range(start,count)]
+
+    def close(self):
+        self.__shm.close()
+
+
+class SharedMessageLog(MessageLog):
+    """Read-only MessageLog over the ring of one message published by a `SharedStorePublisher`.
+
+    `timestamps()` and `field_values()` of numeric fields are zero-copy views of
+    the shared buffers, like for `ColumnarMessageLog` they are only valid until the
+    publisher writes `capacity/GUARD_FRACTION` more samples. Other fields are decoded
+    from the payloads. `refresh()` accounts for the samples written since its last call.
+    """
+    SEQLOCK_RETRIES = 100
+
+    def __init__(self,name:str,sender_id:int,class_id:int,msg_id:int):
+        self.shm = attach(ring_name(name,sender_id,class_id,msg_id))
+        _,_,capacity,payload_size,layout_length = RING_HEADER.unpack_from(self.shm.buf,0)
+        layout = json.loads(bytes(self.shm.buf[RING_HEADER.size:RING_HEADER.size+layout_length]).decode())
+        self.view = RingView(self.shm,layout,capacity,payload_size,False)
+        self.capacity = capacity
+        self.sender = sender_name(sender_id)
+        self.name = SCHEMAS.get(class_id,msg_id).name
+
+        self.__newest:typing.Optional[TimedPprzMessage] = None
+        self.__newestSeq = -1
+        self.__seen = 0 # Samples accounted for by refresh
+
+        super().__init__(capacity - capacity // GUARD_FRACTION)
+
+    ########## Storage ##########
+
+    def _initStorage(self,size:typing.Optional[int]):
+        self._bytes = 0
+
+    def _resizeStorage(self,s:typing.Optional[int]):
+        pass
+
+    def _evict(self):
+        pass
+
+    def addMessage(self,msg:TimedPprzMessage):
+        raise TypeError("Shared logs are read-only")
+
+    def addMessages(self,msgs:typing.Iterable[TimedPprzMessage]):
+        raise TypeError("Shared logs are read-only")
+
+    def trim(self,n:int=1):
+        pass
+
+    def nbytes(self) -> int:
+        # Held by the publisher
+        return 0
+
+    def close(self):
+        self.view.release()
+        self.shm.close()
+
+    def __written(self) -> int:
+        """Number of samples written so far, read under the seqlock."""
+        header = self.view.header
+        for _ in range(self.SEQLOCK_RETRIES):
+            v1 = int(header[0])
+            written = int(header[1])
+            if v1 % 2 == 0 and int(header[0]) == v1:
+                return written
+        return int(header[1])
+
+    def refresh(self) -> bool:
+        """Account for the new samples (statistics, rollups and subgroups). Returns True if there were any."""
+        written = self.__written()
+        if written == self.__seen:
+            return False
+
+        with self._lock:
+            self._seq = written
+            count = self.sample_count()
+            new = min(written - self.__seen,count)
+            first = written - new
+            seqs = range(first,written)
+
+            times = self._timestampsAt(seqs)
+            self.stats.updateMany(times,self.view.lengths[np.arange(first,written) % self.capacity])
+            for (f,a),r in self._rollups.items():
+                values = np.asarray(self._valuesAt(f,seqs))
+                r.extend(times,values if a is None else values[:,a])
+            groupedBy = self.groupedBy()
+            if groupedBy is not None:
+                for seq in seqs:
+                    msg = self._sampleMessage(seq)
+                    self._groupSample(seq,msg,msg[groupedBy])
+            self.__seen = written
+        return True
+
+    ########## Samples ##########
+
+    def __slot(self,seq:int) -> int:
+        return seq % self.capacity
+
+    def __decode(self,seq:int) -> TimedPprzMessage:
+        v = self.view
+        slot = self.__slot(seq)
+        return LazyTimedMessage(self.sender,self.name,v.payload(slot),int(v.timestamps[slot]))
+
+    def _positions(self,seqs:typing.Sequence[int]) -> np.ndarray:
+        return np.asarray(seqs,dtype=np.int64) % self.capacity
+
+    def _samplesAt(self,seqs:typing.Sequence[int]) -> list:
+        return [self.__decode(s) for s in seqs]
+
+    def _timestampsAt(self,seqs:typing.Sequence[int]) -> np.ndarray:
+        return self.view.timestamps[self._positions(seqs)]
+
+    def _valuesAt(self,fieldname:str,seqs:typing.Sequence[int]) -> typing.Sequence:
+        try:
+            return self.view.columns[fieldname][self._positions(seqs)]
+        except KeyError:
+            return [m[fieldname] for m in self._samplesAt(seqs)]
+
+    def _sampleMessage(self,seq:int) -> TimedPprzMessage:
+        return self.__decode(seq)
+
+    def _keyValues(self,fieldname:str) -> list:
+        values = self.field_values(fieldname)
+        return values.tolist() if isinstance(values,np.ndarray) else values
+
+    ########## Accessors ##########
+
+    @property
+    def queue(self) -> list[TimedPprzMessage]:
+        """Decoded samples, newest first (as MessageLog.queue)."""
+        return self._samplesAt(range(self._seq-1,self._oldestSeq()-1,-1))
+
+    def newest(self) -> TimedPprzMessage:
+        if self._seq == 0:
+            raise NoMessageError()
+        if self._seq - 1 != self.__newestSeq:
+            self.__newest = self.__decode(self._seq - 1)
+            self.__newestSeq = self._seq - 1
+        return self.__newest
+
+    def _oldestTimestamp(self) -> int:
+        return int(self.timestamps()[0])
+
+    def sample_count(self) -> int:
+        return min(self._seq,self.size)
+
+    def __start(self) -> int:
+        return (self._seq - self.sample_count()) % self.capacity
+
+    def timestamps(self) -> np.ndarray:
+        return self.view.timestamps[self.__start():self.__start()+self.sample_count()]
+
+    def field_values(self,fieldname:str) -> typing.Sequence:
+        try:
+            col = self.view.columns[fieldname]
+        except KeyError:
+            return self._valuesAt(fieldname,range(self._oldestSeq(),self._seq))
+        return col[self.__start():self.__start()+self.sample_count()]
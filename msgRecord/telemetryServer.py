@@ -0,0 +1,488 @@
+# Copyright (C) 2024 Mael FEURGARD <mael.feurgard@enac.fr>
+#
+# This file is part of messages_python.
+#
+# messages_python is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# messages_python is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with messages_python.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Fan-out of the ingested messages to several local clients, each receiving only what it subscribed to.
+
+Unlike `SocketWriter`, which streams everything, clients of a `TelemetryServer`
+(see RecorderCore.startServing) subscribe to messages (MessageIndex) or to single
+numeric fields (FieldIndex). Both directions use frames made of a `FRAME_HEADER`
+(frame type, body length) and a body. On connection, the server sends `MAGIC`.
+
+Client to server:
+- SUBSCRIBE_MESSAGE, UNSUBSCRIBE_MESSAGE: `MESSAGE_KEY` (sender_id,class_id,msg_id),
+  ANY_SENDER / ANY_ID match any value,
+- SUBSCRIBE_FIELD: `FIELD_KEY` (subscription id chosen by the client, sender_id,
+  class_id, msg_id, array index or -1) followed by the field name (UTF-8),
+- UNSUBSCRIBE_FIELD: subscription id (`SUBSCRIPTION_ID`).
+
+Server to client, once per batch (every `FLUSH_PERIOD`):
+- MESSAGES: records in the segment file format (see msgRecord.segmentFile),
+- FIELDS: `FIELD_SAMPLE` (subscription id, timestamp, value count) followed by the values (float64),
+- DROPPED: number of messages not sent to this client since the last notice (`DROPPED_COUNT`),
+- ERROR: subscription id (`SUBSCRIPTION_ID`) followed by a message (UTF-8).
+
+Messages are dropped for a client, and counted, while `max_pending` bytes or more
+are waiting to be sent to it; a client making no progress for `STALL_TIMEOUT`
+is disconnected. The ingest worker only queues messages, so a slow client never
+delays the ingestion nor the other clients.
+"""
+
+import typing
+import struct
+import threading
+import selectors
+import socket
+import time
+
+from msgRecord.ingestQueue import IngestQueue
+from msgRecord.segmentFile import RECORD_HEADER,pack_records,open_server,close_server,connect
+from msgRecord.messageLog import MessageIndex,FieldIndex,TimedPprzMessage
+from msgRecord.messageSchema import SCHEMAS
+
+MAGIC = b'PPRZSRV\x01'
+FRAME_HEADER = struct.Struct('<BI') # (frame type,body length)
+
+# Client to server
+SUBSCRIBE_MESSAGE = 1
+UNSUBSCRIBE_MESSAGE = 2
+SUBSCRIBE_FIELD = 3
+UNSUBSCRIBE_FIELD = 4
+
+# Server to client
+MESSAGES = 16
+FIELDS = 17
+DROPPED = 18
+ERROR = 19
+
+MESSAGE_KEY = struct.Struct('<HBB') # (sender_id,class_id,msg_id)
+FIELD_KEY = struct.Struct('<IHBBh') # (subscription id,sender_id,class_id,msg_id,array index)
+FIELD_SAMPLE = struct.Struct('<IqH') # (subscription id,timestamp,value count)
+SUBSCRIPTION_ID = struct.Struct('<I')
+DROPPED_COUNT = struct.Struct('<Q')
+
+ANY_SENDER = 0xFFFF
+ANY_ID = 0xFF
+NO_ARRAY_INDEX = -1
+
+MAX_REQUEST = 4096 # Largest frame accepted from a client, in bytes
+
+# (sender_id,class_id,msg_id), None matching any value
+Pattern = tuple[typing.Optional[int],typing.Optional[int],typing.Optional[int]]
+
+def frame(frame_type:int,body:typing.Union[bytes,bytearray]) -> bytes:
+    return FRAME_HEADER.pack(frame_type,len(body)) + body
+
+def matches(pattern:Pattern,key:tuple[int,int,int]) -> bool:
+    return all(p is None or p == k for p,k in zip(pattern,key))
+
+def pack_pattern(sender_id:typing.Optional[int],class_id:typing.Optional[int],msg_id:typing.Optional[int]) -> bytes:
+    return MESSAGE_KEY.pack(ANY_SENDER if sender_id is None else sender_id,
+                            ANY_ID if class_id is None else class_id,
+                            ANY_ID if msg_id is None else msg_id)
+
+def unpack_pattern(sender_id:int,class_id:int,msg_id:int) -> Pattern:
+    return (None if sender_id == ANY_SENDER else sender_id,
+            None if class_id == ANY_ID else class_id,
+            None if msg_id == ANY_ID else msg_id)
+
+def split_frames(buffer:bytearray) -> list[tuple[int,bytes]]:
+    """Remove the complete frames at the start of `buffer`, and return them as (type,body)."""
+    frames = []
+    pos = 0
+    while pos + FRAME_HEADER.size <= len(buffer):
+        frame_type,length = FRAME_HEADER.unpack_from(buffer,pos)
+        end = pos + FRAME_HEADER.size + length
+        if end > len(buffer):
+            break
+        frames.append((frame_type,bytes(buffer[pos+FRAME_HEADER.size:end])))
+        pos = end
+    del buffer[:pos]
+    return frames
+
+class FieldSubscription(typing.NamedTuple):
+    id:int
+    pattern:Pattern
+    field:str
+    array_index:typing.Optional[int]
+
+class ServerClient():
+    """Connection and subscriptions of one client of a TelemetryServer."""
+    def __init__(self,sock:socket.socket):
+        self.sock = sock
+        self.inbuf = bytearray()
+        self.outbuf = bytearray()
+        self.messages:list[Pattern] = []
+        self.fields:dict[int,FieldSubscription] = dict()
+
+        self.dropped = 0 # Messages dropped since the last DROPPED notice
+        self.droppedTotal = 0
+        self.lastProgress = time.monotonic() # Last time the pending data was (partly) sent, or empty
+
+    def wants(self,key:tuple[int,int,int]) -> bool:
+        return any(matches(p,key) for p in self.messages) or any(matches(f.pattern,key) for f in self.fields.values())
+
+    def handle(self,frame_type:int,body:bytes):
+        """Apply a request of the client."""
+        if frame_type in (SUBSCRIBE_MESSAGE,UNSUBSCRIBE_MESSAGE):
+            pattern = unpack_pattern(*MESSAGE_KEY.unpack_from(body))
+            if frame_type == SUBSCRIBE_MESSAGE:
+                if pattern not in self.messages:
+                    self.messages.append(pattern)
+            elif pattern in self.messages:
+                self.messages.remove(pattern)
+
+        elif frame_type == SUBSCRIBE_FIELD:
+            sub_id,sender_id,class_id,msg_id,array_index = FIELD_KEY.unpack_from(body)
+            fieldname = body[FIELD_KEY.size:].decode()
+            sub = FieldSubscription(sub_id,unpack_pattern(sender_id,class_id,msg_id),fieldname,
+                                    None if array_index == NO_ARRAY_INDEX else array_index)
+            error = self.__checkField(sub)
+            if error is None:
+                self.fields[sub_id] = sub
+            else:
+                self.outbuf += frame(ERROR,SUBSCRIPTION_ID.pack(sub_id) + error.encode())
+
+        elif frame_type == UNSUBSCRIBE_FIELD:
+            self.fields.pop(SUBSCRIPTION_ID.unpack_from(body)[0],None)
+
+    @staticmethod
+    def __checkField(sub:FieldSubscription) -> typing.Optional[str]:
+        _,class_id,msg_id = sub.pattern
+        if class_id is None or msg_id is None:
+            return "Field subscriptions need a class and a message id"
+        try:
+            field = SCHEMAS.get(class_id,msg_id).field(sub.field)
+        except KeyError:
+            return f"Unknown field {sub.field} of message {class_id}:{msg_id}"
+        if not(field.numeric):
+            return f"Field {sub.field} is not numeric ({field.typestr})"
+        if sub.array_index is not None and not(field.array_type):
+            return f"Field {sub.field} is not an array"
+        return None
+
+    def encode(self,batch:list[tuple]) -> list[bytes]:
+        """Frames of the part of `batch` this client subscribed to."""
+        records = []
+        samples = bytearray()
+        for item in batch:
+            t,sender_id,class_id,msg_id,_,msg = item
+            key = (sender_id,class_id,msg_id)
+            if any(matches(p,key) for p in self.messages):
+                records.append(item[:5])
+            for sub in self.fields.values():
+                if not(matches(sub.pattern,key)):
+                    continue
+                try:
+                    val = msg[sub.field]
+                    if sub.array_index is not None:
+                        val = val[sub.array_index]
+                    values = [float(v) for v in val] if isinstance(val,(list,tuple)) else [float(val)]
+                except (KeyError,IndexError,TypeError,ValueError):
+                    # e.g. an array shorter than the requested index
+                    continue
+                samples += FIELD_SAMPLE.pack(sub.id,t,len(values))
+                samples += struct.pack(f'<{len(values)}d',*values)
+
+        frames = []
+        if len(records) > 0:
+            buffer,skipped = pack_records(records)
+            # Too large for a record (see msgRecord.segmentFile)
+            self.dropped += skipped
+            self.droppedTotal += skipped
+            frames.append(frame(MESSAGES,buffer))
+        if len(samples) > 0:
+            frames.append(frame(FIELDS,samples))
+        return frames
+
+
+class TelemetryServer():
+    """Serve the ingested messages to the clients of a local socket, each one receiving what it subscribed to.
+
+    `address` is either a path (Unix domain socket) or "host:port" (TCP). See the module
+    documentation for the protocol, and `TelemetryClient` for a client.
+    """
+    FLUSH_PERIOD = 0.05 # Time between two batches, in s
+    MAX_BATCH = 1000 # Messages encoded at once (the pending data of a client is checked between two batches)
+    STALL_TIMEOUT = 10. # A client that did not read anything for this long is disconnected, in s
+    MAX_PENDING = 4*1024*1024 # Default limit of the data waiting to be sent to a client, in bytes
+
+    def __init__(self,address:str,max_pending:int=MAX_PENDING,queue_size:int=1000000):
+        self.address = address
+        self.max_pending = max_pending
+
+        self.__server = open_server(address)
+        self.__server.setblocking(False)
+        self.__selector = selectors.DefaultSelector()
+        self.__selector.register(self.__server,selectors.EVENT_READ)
+
+        self.__queue = IngestQueue(queue_size)
+        # Only modified by the server thread
+        self.__clients:dict[socket.socket,ServerClient] = dict()
+        self.written = 0
+
+        self.__stopping = threading.Event()
+        self.__thread = threading.Thread(target=self.__serveLoop,name="TelemetryServer",daemon=True)
+        self.__thread.start()
+
+    def write(self,t:int,sender_id:int,class_id:int,msg_id:int,payload:str,msg:TimedPprzMessage):
+        self.__queue.push((t,sender_id,class_id,msg_id,payload,msg))
+
+    def droppedCount(self) -> int:
+        """Messages dropped before reaching the server thread (see `clientDroppedCount` for the per-client drops)."""
+        return self.__queue.dropped
+
+    def clientDroppedCount(self) -> int:
+        return sum(c.droppedTotal for c in list(self.__clients.values()))
+
+    def queueDepth(self) -> int:
+        return len(self.__queue)
+
+    def clientCount(self) -> int:
+        return len(self.__clients)
+
+    def close(self):
+        self.__stopping.set()
+        self.__thread.join()
+
+    ########## Server thread ##########
+
+    def __accept(self):
+        try:
+            sock,_ = self.__server.accept()
+        except (BlockingIOError,OSError):
+            return
+        sock.setblocking(False)
+        client = ServerClient(sock)
+        client.outbuf += MAGIC
+        self.__clients[sock] = client
+        self.__selector.register(sock,selectors.EVENT_READ)
+        self.__flush(client)
+
+    def __disconnect(self,client:ServerClient):
+        self.__clients.pop(client.sock,None)
+        try:
+            self.__selector.unregister(client.sock)
+        except (KeyError,ValueError):
+            pass
+        client.sock.close()
+
+    def __receive(self,client:ServerClient):
+        try:
+            data = client.sock.recv(65536)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b''
+        if len(data) == 0:
+            self.__disconnect(client)
+            return
+
+        client.inbuf += data
+        try:
+            for frame_type,body in split_frames(client.inbuf):
+                client.handle(frame_type,body)
+        except (struct.error,UnicodeDecodeError):
+            self.__disconnect(client)
+            return
+        if len(client.inbuf) > MAX_REQUEST:
+            # Not a client of this protocol
+            self.__disconnect(client)
+
+    def __flush(self,client:ServerClient):
+        """Send as much of the pending data as the socket accepts, without blocking."""
+        if len(client.outbuf) > 0:
+            try:
+                sent = client.sock.send(client.outbuf)
+            except BlockingIOError:
+                sent = 0
+            except OSError:
+                self.__disconnect(client)
+                return
+            if sent > 0:
+                del client.outbuf[:sent]
+                client.lastProgress = time.monotonic()
+            elif time.monotonic() - client.lastProgress > self.STALL_TIMEOUT:
+                print(f"Disconnecting stalled telemetry client ({client.droppedTotal} messages dropped)")
+                self.__disconnect(client)
+                return
+        else:
+            client.lastProgress = time.monotonic()
+
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if len(client.outbuf) > 0 else 0)
+        self.__selector.modify(client.sock,events)
+
+    def __dispatch(self,batch:list[tuple]):
+        for client in list(self.__clients.values()):
+            frames = client.encode(batch)
+            if len(frames) == 0:
+                continue
+
+            if len(client.outbuf) >= self.max_pending:
+                # Slow client: drop this batch for it only
+                dropped = sum(1 for item in batch if client.wants(item[1:4]))
+                client.dropped += dropped
+                client.droppedTotal += dropped
+                continue
+
+            if client.dropped > 0:
+                client.outbuf += frame(DROPPED,DROPPED_COUNT.pack(client.dropped))
+                client.dropped = 0
+            for f in frames:
+                client.outbuf += f
+            self.__flush(client)
+
+    def __serveLoop(self):
+        while not(self.__stopping.is_set()):
+            deadline = time.monotonic() + self.FLUSH_PERIOD
+            while True:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                for key,events in self.__selector.select(timeout):
+                    if key.fileobj is self.__server:
+                        self.__accept()
+                        continue
+                    client = self.__clients.get(key.fileobj)
+                    if client is None:
+                        continue
+                    if events & selectors.EVENT_READ:
+                        self.__receive(client)
+                    if events & selectors.EVENT_WRITE and client.sock in self.__clients:
+                        self.__flush(client)
+
+            batch = self.__queue.drain(self.MAX_BATCH)
+            while len(batch) > 0:
+                self.__dispatch(batch)
+                self.written += len(batch)
+                batch = self.__queue.drain(self.MAX_BATCH)
+            # Stalled clients are only noticed when flushing
+            for client in list(self.__clients.values()):
+                if len(client.outbuf) > 0:
+                    self.__flush(client)
+
+        for client in list(self.__clients.values()):
+            self.__disconnect(client)
+        self.__selector.close()
+        close_server(self.__server,self.address)
+
+
+class TelemetryClient():
+    """Blocking client of a TelemetryServer.
+
+        client = TelemetryClient("/tmp/pprz.sock")
+        sub = client.subscribeField(FieldIndex.from_ints(1,1,6,'phi'))
+        while True:
+            for frame_type,content in client.receive():
+                ...
+    """
+    def __init__(self,address:str,timeout:typing.Optional[float]=None):
+        self.sock = connect(address)
+        self.sock.settimeout(timeout)
+        self.__buffer = bytearray()
+        self.__nextId = 0
+        # Mapping : subscription id -> FieldIndex
+        self.fields:dict[int,FieldIndex] = dict()
+
+        magic = self.__read(len(MAGIC))
+        if magic != MAGIC:
+            self.close()
+            raise ConnectionError(f"Not a telemetry server: {address}")
+
+    def __read(self,n:int) -> bytes:
+        while len(self.__buffer) < n:
+            data = self.sock.recv(65536)
+            if len(data) == 0:
+                raise ConnectionError("Telemetry server closed the connection")
+            self.__buffer += data
+        data = bytes(self.__buffer[:n])
+        del self.__buffer[:n]
+        return data
+
+    def subscribeMessage(self,index:MessageIndex):
+        """Receive every `index` message (None ids match any sender, class or message)."""
+        self.sock.sendall(frame(SUBSCRIBE_MESSAGE,pack_pattern(index.sender_id,index.class_id,index.message_id)))
+
+    def unsubscribeMessage(self,index:MessageIndex):
+        self.sock.sendall(frame(UNSUBSCRIBE_MESSAGE,pack_pattern(index.sender_id,index.class_id,index.message_id)))
+
+    def subscribeField(self,index:FieldIndex) -> int:
+        """Receive the values of a numeric field. Returns the subscription id, found in the FIELDS frames."""
+        sub_id = self.__nextId
+        self.__nextId += 1
+        self.fields[sub_id] = index
+        key = FIELD_KEY.pack(sub_id,ANY_SENDER if index.sender_id is None else index.sender_id,index.class_id,index.message_id,
+                             NO_ARRAY_INDEX if index.array_index is None else index.array_index)
+        self.sock.sendall(frame(SUBSCRIBE_FIELD,key + index.field.encode()))
+        return sub_id
+
+    def unsubscribeField(self,sub_id:int):
+        self.fields.pop(sub_id,None)
+        self.sock.sendall(frame(UNSUBSCRIBE_FIELD,SUBSCRIPTION_ID.pack(sub_id)))
+
+    def receive(self) -> list[tuple[int,typing.Any]]:
+        """Wait for data, and return the frames received as (frame type,content):
+        - MESSAGES: list of (timestamp,sender_id,class_id,msg_id,payload),
+        - FIELDS: list of (subscription id,timestamp,values),
+        - DROPPED: number of messages dropped,
+        - ERROR: (subscription id,message).
+        """
+        frames = split_frames(self.__buffer)
+        while len(frames) == 0:
+            data = self.sock.recv(65536)
+            if len(data) == 0:
+                raise ConnectionError("Telemetry server closed the connection")
+            self.__buffer += data
+            frames = split_frames(self.__buffer)
+
+        result = []
+        for frame_type,body in frames:
+            if frame_type == MESSAGES:
+                result.append((frame_type,self.__records(body)))
+            elif frame_type == FIELDS:
+                result.append((frame_type,self.__samples(body)))
+            elif frame_type == DROPPED:
+                result.append((frame_type,DROPPED_COUNT.unpack(body)[0]))
+            elif frame_type == ERROR:
+                sub_id, = SUBSCRIPTION_ID.unpack_from(body)
+                self.fields.pop(sub_id,None)
+                result.append((frame_type,(sub_id,body[SUBSCRIPTION_ID.size:].decode())))
+        return result
+
+    @staticmethod
+    def __records(body:bytes) -> list[tuple[int,int,int,int,str]]:
+        records = []
+        pos = 0
+        while pos < len(body):
+            t,sender_id,class_id,msg_id,length = RECORD_HEADER.unpack_from(body,pos)
+            pos += RECORD_HEADER.size
+            records.append((t,sender_id,class_id,msg_id,body[pos:pos+length].decode()))
+            pos += length
+        return records
+
+    @staticmethod
+    def __samples(body:bytes) -> list[tuple[int,int,tuple[float,...]]]:
+        samples = []
+        pos = 0
+        while pos < len(body):
+            sub_id,t,count = FIELD_SAMPLE.unpack_from(body,pos)
+            pos += FIELD_SAMPLE.size
+            samples.append((sub_id,t,struct.unpack_from(f'<{count}d',body,pos)))
+            pos += 8*count
+        return samples
+
+    def close(self):
+        self.sock.close()
@@ -0,0 +1,117 @@
+# Copyright (C) 2024 Mael FEURGARD <mael.feurgard@enac.fr>
+# 
+# This file is part of messages_python.
+# 
+# messages_python is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# messages_python is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with messages_python.  If not, see <https://www.gnu.org/licenses/>.
+
+import typing
+import pathlib
+import threading
+
+from msgRecord.ivyRecorder import IvyRecorder
+from msgRecord.messageLog import MessageLog,FieldIndex
+
+from PyQt5.QtWidgets import QWidget,QAction,QFileDialog,QMessageBox
+from PyQt5.QtCore import QObject,pyqtSignal,pyqtSlot
+
+# Mapping : file dialog filter -> default suffix
+EXPORT_FILTERS = {
+    "NumPy archive (*.npz)" : '.npz',
+    "Parquet directory (*.parquet)" : '.parquet',
+    "HDF5 (*.h5 *.hdf5)" : '.h5',
+}
+
+class ExportTask(QObject):
+    """Run `msgRecord.export.export_records` in a background thread, reporting through Qt signals."""
+    progress = pyqtSignal(int,int) # (tables written,table count)
+    finished = pyqtSignal(int) # (rows written)
+    failed = pyqtSignal(str) # (error message)
+
+    def __init__(self,records:dict[int,dict[int,dict[int,MessageLog]]],path:typing.Union[str,pathlib.Path],
+                 fields:typing.Optional[typing.Iterable[FieldIndex]]=None,fmt:typing.Optional[str]=None) -> None:
+        super().__init__()
+        self.records = records
+        self.path = pathlib.Path(path)
+        self.fields = None if fields is None else list(fields)
+        self.fmt = fmt
+
+        self.__cancelled = threading.Event()
+        self.__thread:typing.Optional[threading.Thread] = None
+
+    def start(self):
+        self.__thread = threading.Thread(target=self.__run,name="ExportTask",daemon=True)
+        self.__thread.start()
+
+    def cancel(self):
+        self.__cancelled.set()
+
+    def wait(self):
+        if self.__thread is not None:
+            self.__thread.join()
+
+    def __run(self):
+        # The export needs NumPy (and optionally pyarrow or h5py): it is only imported when used
+        from msgRecord.export import export_records
+        try:
+            rows = export_records(self.records,self.path,self.fields,self.fmt,
+                                  progress=self.progress.emit,cancelled=self.__cancelled)
+        except Exception as e:
+            self.failed.emit(str(e))
+        else:
+            self.finished.emit(rows)
+
+
+class ExportAction(QAction):
+    """Ask for a file, then export the whole history of `ivy` in the background."""
+    def __init__(self, ivy:IvyRecorder, parent:QWidget) -> None:
+        super().__init__("Export history...",parent)
+        self.ivy = ivy
+        self.dialogParent = parent
+        self.task:typing.Optional[ExportTask] = None
+        
+        self.triggered.connect(self.export)
+        
+    @pyqtSlot()
+    def export(self):
+        path,selected = QFileDialog.getSaveFileName(self.dialogParent,"Export history","",";;".join(EXPORT_FILTERS.keys()))
+        if path == "":
+            return
+        
+        from msgRecord.export import EXPORT_FORMATS
+        path = pathlib.Path(path)
+        if not(path.suffix.lower() in EXPORT_FORMATS.keys()):
+            path = path.with_suffix(EXPORT_FILTERS.get(selected,'.npz'))
+        
+        self.task = ExportTask(self.ivy.records,path)
+        self.task.finished.connect(self.__onFinished)
+        self.task.failed.connect(self.__onFailed)
+        self.setEnabled(False)
+        self.setText(f"Exporting to {path.name}...")
+        self.task.start()
+        
+    def __done(self):
+        self.setEnabled(True)
+        self.setText("Export history...")
+        self.task = None
+        
+    @pyqtSlot(int)
+    def __onFinished(self,rows:int):
+        path = self.task.path
+        self.__done()
+        QMessageBox.information(self.dialogParent,"Export done",f"{rows} samples written to {path}")
+        
+    @pyqtSlot(str)
+    def __onFailed(self,error:str):
+        self.__done()
+        QMessageBox.warning(self.dialogParent,"Export failed",error)
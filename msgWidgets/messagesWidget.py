@@ -114,10 +114,10 @@ QTreeView::branch:open:has-children:has-siblings  {
         
         def gen_cb(item:MessageItem,fstr:str):
             msg = item.msg
-            field = msg.get_full_field(fstr)
+            field = msg.schema().field(fstr)
             if not('int8' in field.typestr or 'char' in field.typestr):      
                 return lambda: (item.toSubgroups(fstr) if QMessageBox.warning(self,'Confirm message grouping',
-                        f"The field '{field.name}' in message '{msg.msg_name()}' is of type '{field.typestr}', which is likely to have a lot of different values. Are you sure you want to proceed ?",
+                        f"The field '{field.name}' in message '{msg.msg_name()}' is of type '{field.typestr}', which is likely to have a lot of different values (only the {msg.maxGroups} most recently received ones are kept). Are you sure you want to proceed ?",
                         QMessageBox.StandardButton.Cancel | QMessageBox.StandardButton.Yes,
                         QMessageBox.StandardButton.Cancel) == QMessageBox.StandardButton.Yes else None)
             else:
@@ -128,7 +128,7 @@ QTreeView::branch:open:has-children:has-siblings  {
             parentItem = item.parent()
             
             if isinstance(parentItem,MessageItem):
-                field = parentItem.msg.get_full_field(item.fieldName())
+                field = parentItem.msg.schema().field(item.fieldName())
                 if field.array_type:
                     return
                 
@@ -147,8 +147,9 @@ QTreeView::branch:open:has-children:has-siblings  {
             else:
                 submenu = menu.addMenu(f"Group by field:")
                 
+                schema = item.msg.schema()
                 for f in item.fieldMap.keys():
-                    field = item.msg.get_full_field(f)
+                    field = schema.field(f)
                     if field.array_type:
                         continue
                     
@@ -248,11 +249,16 @@ class MessagesWidget(QWidget):
         self.filterWidget.pinFiltering.connect(filteredModel.setCheckedOnly)
         
         self.filterWidget.multiSenderPin.connect(ivyModel.setMultiSenderPinning)
+        
+        # The tree only shows the newest messages: no need to record the senders
+        # when the recorder keeps the newest message of every message anyway (see RateLog)
+        self.latestOnly = getattr(ivy,'tracksInterest',lambda: False)()
 
         
     @pyqtSlot(int)
     def newSender(self,id:int):
-        self.ivy.recordSender(id)
+        if not(self.latestOnly):
+            self.ivy.recordSender(id)
         self.model.update()
         
         newView = SenderMessagesView(self.filteredModel,id,self)
@@ -0,0 +1,131 @@
+# Copyright (C) 2024 Mael FEURGARD <mael.feurgard@enac.fr>
+#
+# This file is part of messages_python.
+#
+# messages_python is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# messages_python is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with messages_python.  If not, see <https://www.gnu.org/licenses/>.
+
+import typing
+import time
+
+from msgRecord.perfStats import PERF,STAGES,COUNTERS,StageStats
+
+from PyQt5.QtWidgets import QWidget,QDockWidget,QTableWidget,QTableWidgetItem,QVBoxLayout,QPushButton,QHeaderView
+from PyQt5.QtCore import QTimer,pyqtSlot
+
+STAGE_HEADERS = ["Stage","Runs","Runs/s","Mean (ms)","p50 (ms)","p95 (ms)","Max (ms)","Load (%)"]
+COUNTER_HEADERS = ["Counter","Total","Per second"]
+
+def format_histogram(stats:StageStats) -> str:
+    counts,edges = stats.histogram(10)
+    lines = []
+    for c,low,high in zip(counts,edges[:-1],edges[1:]):
+        lines.append(f"{low/1e6:8.3f} - {high/1e6:8.3f} ms : {c}")
+    return "\n".join(lines)
+
+class PerfPanel(QDockWidget):
+    """Dockable view of PERF: per-stage durations (over the last runs) and counters."""
+    def __init__(self, parent: QWidget | None = None) -> None:
+        super().__init__("Performance",parent)
+
+        widget = QWidget(self)
+        layout = QVBoxLayout(widget)
+
+        self.stageTable = QTableWidget(len(STAGES),len(STAGE_HEADERS),widget)
+        self.stageTable.setHorizontalHeaderLabels(STAGE_HEADERS)
+        self.stageTable.verticalHeader().setVisible(False)
+        self.stageTable.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        for i,(name,desc) in enumerate(STAGES.items()):
+            item = QTableWidgetItem(name)
+            item.setToolTip(desc)
+            self.stageTable.setItem(i,0,item)
+
+        self.counterTable = QTableWidget(len(COUNTERS),len(COUNTER_HEADERS),widget)
+        self.counterTable.setHorizontalHeaderLabels(COUNTER_HEADERS)
+        self.counterTable.verticalHeader().setVisible(False)
+        self.counterTable.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        for i,(name,desc) in enumerate(COUNTERS.items()):
+            item = QTableWidgetItem(name)
+            item.setToolTip(desc)
+            self.counterTable.setItem(i,0,item)
+
+        resetButton = QPushButton("Reset",widget)
+        resetButton.clicked.connect(self.reset)
+
+        layout.addWidget(self.stageTable)
+        layout.addWidget(self.counterTable)
+        layout.addWidget(resetButton)
+        self.setWidget(widget)
+
+        # Values at the previous refresh, to compute rates
+        self.__last = time.monotonic()
+        self.__lastRuns:dict[str,tuple[int,int]] = dict() # Mapping : stage -> (count,total time)
+        self.__lastCounters:dict[str,int] = dict()
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(1000)
+
+    @pyqtSlot()
+    def reset(self):
+        PERF.reset()
+        self.__lastRuns.clear()
+        self.__lastCounters.clear()
+        self.refresh()
+
+    def __setRow(self,table:QTableWidget,row:int,values:list[str],tooltip:typing.Optional[str]=None):
+        for col,v in enumerate(values,start=1):
+            item = table.item(row,col)
+            if item is None:
+                item = QTableWidgetItem()
+                table.setItem(row,col,item)
+            item.setText(v)
+            if tooltip is not None:
+                item.setToolTip(tooltip)
+
+    @pyqtSlot()
+    def refresh(self):
+        now = time.monotonic()
+        dt = max(now - self.__last,1e-6)
+        self.__last = now
+
+        stages,counters = PERF.snapshot()
+
+        for i,name in enumerate(STAGES.keys()):
+            try:
+                s = stages[name]
+            except KeyError:
+                self.__setRow(self.stageTable,i,["-"]*(len(STAGE_HEADERS)-1))
+                continue
+
+            count,total = s.count,s.total
+            last_count,last_total = self.__lastRuns.get(name,(0,0))
+            self.__lastRuns[name] = (count,total)
+
+            p50,p95,pmax = s.percentiles([50,95,100])
+            mean = total/count if count > 0 else float('nan')
+            self.__setRow(self.stageTable,i,
+                          [str(count),
+                           f"{(count-last_count)/dt:.1f}",
+                           f"{mean/1e6:.3f}",
+                           f"{p50/1e6:.3f}",
+                           f"{p95/1e6:.3f}",
+                           f"{pmax/1e6:.3f}",
+                           f"{100*(total-last_total)/1e9/dt:.1f}"],
+                          format_histogram(s))
+
+        for i,name in enumerate(COUNTERS.keys()):
+            total = counters.get(name,0)
+            last = self.__lastCounters.get(name,0)
+            self.__lastCounters[name] = total
+            self.__setRow(self.counterTable,i,[str(total),f"{(total-last)/dt:.0f}"])
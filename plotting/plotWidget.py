@@ -17,8 +17,9 @@ from PyQt5.QtWidgets import QGraphicsSceneContextMenuEvent, QSplitter,QMainWindo
                             
 from msgRecord.messageLog import MessageLog,MessageIndex,FieldIndex
 from msgRecord.ivyRecorder import IvyRecorder
+from msgRecord.perfStats import PERF
+from msgRecord.messageSchema import SCHEMAS
 
-from pprzlink.message import PprzMessage
 
 # Fetch color palette from: http://tsitsul.in/blog/coloropt/
 # Bright and Dark:
@@ -31,6 +32,8 @@ ALPHA_STOP = 50
 LINEWIDTH_START = 1
 LINEWIDTH_STOP = 8
 
+POINTS_MIN_WIDTH = 200 # Plot width assumed when asking for decimated data, if the widget is narrower (in pixels)
+
 
 class SelectablePlotDataItem(pg.PlotDataItem):
     deleteMe = pyqtSignal(object)
@@ -167,7 +170,7 @@ class FieldPlotInfo(QObject):
         # field_scale = float(split[4])
         
         
-        msg = PprzMessage(class_name,msg_name)
+        msg = SCHEMAS.get(class_name,msg_name)
         
         if '[' in field_info:
             # This is an array field
@@ -184,7 +187,7 @@ class FieldPlotInfo(QObject):
             field_name = field_info
             index_range = [None]
             
-        field = msg.get_full_field(field_name)
+        field = msg.field(field_name)
         if field.alt_unit_coef is not None:
             field_scale = field.alt_unit_coef
             field_unit = field.alt_unit
@@ -217,16 +220,13 @@ class FieldPlotInfo(QObject):
         
     def getMIMEtxt(self) -> str:
         sender = self.index.sender_id
-        msg = self.index.pprzMsg()
+        msg = self.index.schema()
         class_name = msg.msg_class
         msg_name = msg.name
         
         field_name = self.index.field
         
-        full_field = msg.get_full_field(field_name)
-        field_scale = full_field.alt_unit_coef
-        if field_scale is None:
-            field_scale = 1.
+        field_scale = msg.field(field_name).altCoef()
         
         
         if self.index.array_index is None:
@@ -281,9 +281,34 @@ class PlotWidget(pg.PlotWidget):
         else:
             self.timer.start()
 
+    def paintEvent(self,ev):
+        if not(PERF.enabled):
+            return super().paintEvent(ev)
+        
+        t0 = time.perf_counter_ns()
+        super().paintEvent(ev)
+        PERF.record('plot_redraw',time.perf_counter_ns()-t0)
+
+    def plotRange(self) -> tuple[typing.Optional[int],typing.Optional[int],int]:
+        """(t0,t1,n): time range to plot, in ns (None for everything), and number of points to ask for."""
+        vb = self.plotItem.getViewBox()
+        # Two points (min and max) per horizontal pixel
+        n = 2 * max(int(vb.width()),POINTS_MIN_WIDTH)
+        if vb.autoRangeEnabled()[0]:
+            return None,None,n
+        now = time.time_ns()
+        xmin,xmax = vb.viewRange()[0]
+        return now + int(xmin*1e9),now + int(xmax*1e9),n
+
     @pyqtSlot()
     def update(self):
         now = time.time_ns()
+        perf = PERF.enabled
+        points = 0
+        if perf:
+            start = time.perf_counter_ns()
+        
+        t0,t1,n = self.plotRange()
         
         for s,sd in self.plotItemMap.items(): # Senders
             for c,cd in sd.items(): # Classes
@@ -295,24 +320,26 @@ class PlotWidget(pg.PlotWidget):
                     except KeyError:
                         continue
                     
-                    times = []
-                    
-                    data:dict[str,list] = dict()
-                    for f in md.keys(): # Fields
-                        data[f] = []
-                    
-                    for mm in msgLog.queue:
-                        times.append((mm.timestamp-now)/10**9)
-                        for f,l in data.items():
-                            l.append(mm[f])
+                    if msgLog.sample_count() == 0:
+                        continue
                     
                     for f,p in md.items():
-                        if isinstance(p,dict):
-                            for a_id,pp in p.items():
-                                dd = np.asarray(data[f]).T[a_id]
-                                pp.updatePlot(times,dd)
-                        else:
-                            p.updatePlot(times,np.asarray(data[f]))
+                        plots = p.items() if isinstance(p,dict) else [(None,p)]
+                        for a_id,pp in plots:
+                            try:
+                                times,values = msgLog.decimated(f,n,t0,t1,a_id)
+                            except ValueError:
+                                # Not a numeric field: plot the raw samples
+                                times = np.asarray(msgLog.timestamps(),dtype=np.int64)
+                                values = np.asarray(msgLog.field_values(f))
+                                if a_id is not None:
+                                    values = values[:,a_id]
+                            pp.updatePlot((times-now)/10**9,values)
+                            points += len(times)
+                            
+        if perf:
+            PERF.record('plot_update',time.perf_counter_ns()-start)
+            PERF.count('points_plotted',points)
                             
     @pyqtSlot(FieldPlotInfo)
     def removePlotItem(self,p:FieldPlotInfo):
@@ -327,9 +354,18 @@ class PlotWidget(pg.PlotWidget):
                 if len(a) == 0:
                     del a_dict[index.field]
             
-            #TODO : Find a proper way to unsubscribe, in the case there are multiple plotters sharing the same logger
             if len(a_dict) == 0:
                 del self.plotItemMap[index.sender_id][index.class_id][index.message_id]
+            
+            # Acquired by addPlots: the recorder frees the message once its last consumer is gone
+            self.ivyRecorder.release(index.msgIndex)
+            
+            # The log is shared: other plots (here or in another plotter) may still use its rollups
+            if self.ivyRecorder.consumerCount(index.msgIndex) == 0:
+                try:
+                    self.ivyRecorder.getMessage(index.msgIndex).dropRollups()
+                except KeyError:
+                    pass
         except KeyError:
             pass
         
@@ -361,8 +397,12 @@ class PlotWidget(pg.PlotWidget):
         # "{sender}:{class_name}:{msg_name}:{field_name}:{field_scale}"
         # OR, if the field is of array type:
         # "{sender}:{class_name}:{msg_name}:{field_name}[{array_range}]:{field_scale}"
-        txt = mimedata.text()
+        self.addPlots(mimedata.text())
         
+        e.acceptProposedAction()
+        
+    def addPlots(self,txt:str):
+        """Plot the field(s) described by `txt`, in the drag and drop format (see FieldPlotInfo.from_MIMEtxt)."""
         pltInfo_lst,self.__line_count = FieldPlotInfo.from_MIMEtxt(txt,self.__line_count)
         
         for p in pltInfo_lst:
@@ -410,9 +450,7 @@ class PlotWidget(pg.PlotWidget):
                 
                 p.deleteMe.connect(self.removePlotItem)
 
-            self.ivyRecorder.recordMessage(p.index.sender_id,p.index.pprzMsg())
+            self.ivyRecorder.acquire(p.index.msgIndex)
                 
         self.update()
-        
-        e.acceptProposedAction()
         
\ No newline at end of file
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2024 Mael FEURGARD <mael.feurgard@enac.fr>
+#
+# This file is part of messages_python.
+#
+# messages_python is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# messages_python is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with messages_python.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Headless recorder: write every Ivy message to segment files, stream or serve it on a local socket and/or share it in memory.
+
+Does not use Qt, so it can run on a machine without display (e.g. a ground
+station server). Segments can be replayed in messages.py and rtplotter.py with
+--replay, and the socket stream (same format as the segments) can be read by any client.
+With --serve, clients (see msgRecord.telemetryServer.TelemetryClient) only receive
+the messages and fields they subscribed to.
+With --share NAME, messages.py and rtplotter.py started with --attach NAME read the
+history directly from shared memory, without decoding the messages again.
+"""
+
+import argparse
+import signal
+import threading
+import time
+
+from msgRecord.recorderCore import RecorderCore
+
+def print_stats(recorder:RecorderCore,elapsed:float,rate:float):
+    line = f"[{elapsed:8.1f} s] {recorder.ingestedCount()} messages ({rate:.0f} msg/s), " \
+           f"queue {recorder.queueDepth()}, dropped {recorder.droppedCount()}, errors {recorder.errorCount()}"
+    sink = recorder.recordingSink()
+    if sink is not None:
+        line += f" | disk: {sink.written} written, {sink.droppedCount()} dropped, {len(sink.segments)} segments"
+    stream = recorder.streamingSink()
+    if stream is not None:
+        line += f" | socket: {stream.clientCount()} clients, {stream.droppedCount()} dropped"
+    server = recorder.servingSink()
+    if server is not None:
+        line += f" | server: {server.clientCount()} clients, {server.clientDroppedCount()} dropped"
+    shared = recorder.sharingSink()
+    if shared is not None:
+        line += f" | shared: {shared.messageCount()} messages, {shared.errors} errors"
+    print(line,flush=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bus',help="Ivy bus (default: the Ivy default bus)")
+    parser.add_argument('--output',metavar='DIR',help="Write the messages to segment files in DIR")
+    parser.add_argument('--prefix',default="recording",help="Name prefix of the segment files")
+    parser.add_argument('--segment-size',type=int,default=256,help="Size of a segment file, in MiB")
+    parser.add_argument('--socket',metavar='ADDRESS',help="Stream the messages to a Unix socket path, or host:port (TCP)")
+    parser.add_argument('--serve',metavar='ADDRESS',help="Serve subscribed messages and fields on a Unix socket path, or host:port (TCP)")
+    parser.add_argument('--share',metavar='NAME',help="Publish the messages in shared memory, for viewers started with --attach NAME")
+    parser.add_argument('--share-size',type=int,metavar='SAMPLES',help="Samples kept in shared memory per message")
+    parser.add_argument('--stats',type=float,default=10.,metavar='SECONDS',help="Period of the statistics printout (0 to disable)")
+    parser.add_argument('--duration',type=float,help="Stop after this many seconds")
+    args = parser.parse_args()
+
+    if args.output is None and args.socket is None and args.serve is None and args.share is None:
+        parser.error("at least one of --output, --socket, --serve and --share is required")
+
+    # Only the raw payloads are needed: keep a single (undecoded) message per log
+    recorder = RecorderCore("pprzrecord",ivy_bus=args.bus,buffer_size=1,lazy=True,
+                            per_message_signals=False,record_all_senders=True)
+
+    if args.output is not None:
+        recorder.startRecording(args.output,args.prefix,args.segment_size*1024*1024)
+    if args.socket is not None:
+        recorder.startStreaming(args.socket)
+    if args.serve is not None:
+        recorder.startServing(args.serve)
+    if args.share is not None:
+        recorder.startSharing(args.share,args.share_size)
+
+    stopping = threading.Event()
+    signal.signal(signal.SIGINT,lambda *_: stopping.set())
+    signal.signal(signal.SIGTERM,lambda *_: stopping.set())
+
+    start = time.monotonic()
+    end = start + args.duration if args.duration is not None else None
+    last_count = recorder.ingestedCount()
+    last = start
+    period = args.stats if args.stats > 0 else 1.
+
+    while not(stopping.is_set()):
+        timeout = period if end is None else max(min(period,end - time.monotonic()),0)
+        stopping.wait(timeout)
+        now = time.monotonic()
+        if args.stats > 0 and now - last >= period:
+            count = recorder.ingestedCount()
+            # Rate over the last period only
+            print_stats(recorder,now - start,(count - last_count)/(now - last))
+            last_count,last = count,now
+        if end is not None and now >= end:
+            break
+
+    recorder.stop()
+    print(f"Stopped after {time.monotonic()-start:.1f} s, {recorder.ingestedCount()} messages recorded")
+
+if __name__ == '__main__':
+    main()
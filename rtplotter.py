@@ -1,19 +1,26 @@
 #!/usr/bin/env python3
 
 import typing
+import argparse
+import sys
 
-import numpy as np
-
-
+# Before the other imports, so that they are timed too
+from msgRecord.importProfile import IMPORT_PROFILE
+if __name__ == '__main__' and '--profile-imports' in sys.argv:
+    IMPORT_PROFILE.install()
 
 from PyQt5.QtWidgets import QSplitter,QMainWindow,QMdiArea,QMdiSubWindow,QApplication,QWidget,\
                             QTreeView
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt,QTimer
 
 from msgRecord.messageLog import MessageLog
 from msgRecord.ivyRecorder import IvyRecorder
+from msgRecord.messageSchema import SCHEMAS
+from msgRecord.perfStats import PERF
+from msgWidgets.exportAction import ExportAction
+from msgWidgets.perfPanel import PerfPanel
 
-from plotting.plotWidget import PlotWidget,FieldPlotInfo
+# plotting.plotWidget (pyqtgraph and NumPy) is imported once the window is shown
 
 class RTPlotterMain(QSplitter):
     def __init__(self, ivy:IvyRecorder,parent: QWidget | None = None) -> None:
@@ -47,14 +54,48 @@ QSplitter::handle {
 
 
 
+def showPlots(window:QMainWindow,ivy:IvyRecorder):
+    from plotting.plotWidget import PlotWidget
+    window.setCentralWidget(PlotWidget(ivy,window))
+    IMPORT_PROFILE.mark('plots shown')
+
 if __name__ == '__main__':
+    IMPORT_PROFILE.mark('imports done')
     app = QApplication([])
     app.setApplicationName("RT Plotter")
     
-    ivy = IvyRecorder(buffer_size=200)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--replay',nargs='+',metavar='SEGMENT',help="Replay recorded segment files (or directories) instead of listening to the Ivy bus")
+    parser.add_argument('--speed',type=float,default=1.,help="Replay speed factor, 0 for as fast as possible")
+    parser.add_argument('--data',nargs='+',metavar='FILE',help="Open Paparazzi telemetry logs (.data) instead of listening to the Ivy bus")
+    parser.add_argument('--attach',metavar='NAME',help="View the messages shared by another recorder (e.g. pprzrecord.py --share NAME) instead of listening to the Ivy bus")
+    parser.add_argument('--serve',metavar='ADDRESS',help="Also serve the received messages to local clients, on a Unix socket path or host:port (TCP)")
+    parser.add_argument('--perf',action='store_true',help="Time the processing stages and show them in a performance panel (same as PPRZ_PERF=1)")
+    parser.add_argument('--profile-imports',action='store_true',help="Print the import times and startup milestones on stderr (same as PPRZ_IMPORT_PROFILE=1)")
+    args = parser.parse_args()
+    if args.perf:
+        PERF.setEnabled(True)
+    
+    if args.attach is not None:
+        if args.replay is not None or args.data is not None:
+            parser.error("--attach cannot be combined with --replay or --data")
+        # Imported here, as it needs NumPy and shared memory support
+        from msgRecord.sharedRecorder import SharedRecorder,SharedStoreError
+        try:
+            ivy = SharedRecorder(args.attach)
+        except SharedStoreError as e:
+            parser.error(str(e))
+    else:
+        ivy = IvyRecorder(buffer_size=200,columnar=True,per_message_signals=False,live=args.replay is None and args.data is None)
+    if args.serve is not None:
+        if args.attach is not None:
+            parser.error("--serve cannot be combined with --attach")
+        ivy.startServing(args.serve)
     window = QMainWindow()
     # window.setAcceptDrops(True)
-    window.setCentralWidget(PlotWidget(ivy,window))
+    window.menuBar().addMenu("File").addAction(ExportAction(ivy,window))
+    if PERF.enabled:
+        window.addDockWidget(Qt.DockWidgetArea.BottomDockWidgetArea,PerfPanel(window))
     window.setWindowTitle("Paparazzi RT Plotter")
 
     # window = PlotWidget(ivy)
@@ -62,4 +103,21 @@ if __name__ == '__main__':
     app.aboutToQuit.connect(ivy.stop)
     
     window.show()
+    IMPORT_PROFILE.mark('window shown')
+    # Once the (empty) window is painted: import the plotting modules, then load the message definitions
+    QTimer.singleShot(0,lambda: showPlots(window,ivy))
+    QTimer.singleShot(0,lambda: IMPORT_PROFILE.reportWhenDone(SCHEMAS.preload(),'message definitions loaded'))
+    
+    # Only imported when needed (the data files need NumPy)
+    if args.replay is not None:
+        from msgRecord.segmentFile import Recording
+        from msgRecord.replay import ReplaySource
+        replay = ReplaySource(ivy,Recording(args.replay),args.speed)
+        app.aboutToQuit.connect(replay.stop)
+        # Start once the event loop runs (after the plots are shown), so that the widgets see the first senders
+        QTimer.singleShot(0,replay.start)
+    if args.data is not None:
+        from msgRecord.dataImport import start_import
+        # Parsed in the background, so that the window stays responsive
+        QTimer.singleShot(0,lambda: start_import(args.data,ivy))
     app.exec()
\ No newline at end of file
@@ -0,0 +1,59 @@
+# Copyright (C) 2024 Mael FEURGARD <mael.feurgard@enac.fr>
+#
+# This file is part of messages_python.
+#
+# messages_python is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# messages_python is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with messages_python.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Helpers shared by the tests of msgRecord.
+
+The tests use the message definitions of the installed pprzlink: messages are
+picked by the types of their fields rather than by name, so they do not depend
+on a particular messages XML.
+"""
+
+import os
+import time
+import typing
+
+# Never read nor write the user's definitions cache
+os.environ['PPRZ_MESSAGES_CACHE'] = ''
+
+import pytest
+
+from msgRecord.messageSchema import SCHEMAS,MessageSchema
+
+def find_schema(types:set[str],min_fields:int=2,msg_class:str='telemetry') -> MessageSchema:
+    """First message of `msg_class` whose fields are all scalars of one of `types`."""
+    for s in SCHEMAS:
+        if s.msg_class == msg_class and len(s.fields) >= min_fields and all(f.typestr in types for f in s.fields):
+            return s
+    pytest.skip(f"No {msg_class} message with only {types} fields")
+
+def float_schema() -> MessageSchema:
+    return find_schema({'float','double'})
+
+def int_schema() -> MessageSchema:
+    return find_schema({'int8','uint8','int16','uint16','int32','uint32'})
+
+def payload(schema:MessageSchema,i:int) -> str:
+    """Ivy payload of `schema` (scalar fields only), whose values all derive from `i`."""
+    return ' '.join(str(i % 100) if f.typestr not in ('float','double') else f"{i}.5" for f in schema.fields)
+
+def wait_until(condition:typing.Callable[[],bool],timeout:float=5.) -> bool:
+    end = time.monotonic() + timeout
+    while not(condition()):
+        if time.monotonic() > end:
+            return False
+        time.sleep(0.01)
+    return True
@@ -0,0 +1,75 @@
+# Copyright (C) 2024 Mael FEURGARD <mael.feurgard@enac.fr>
+#
+# This file is part of messages_python.
+#
+# messages_python is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# messages_python is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with messages_python.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import asyncio
+
+import pytest
+
+from msgRecord.asyncStream import RecordStream,DROP_NEWEST,DROP_OLDEST
+from msgRecord.recorderCore import RecorderCore
+from msgRecord.messageLog import LazyTimedMessage,MessageIndex,FieldIndex
+
+from conftest import float_schema,payload
+
+@pytest.fixture
+def core():
+    core = RecorderCore(live=False)
+    yield core
+    core.stop()
+
+def message(schema,i:int) -> LazyTimedMessage:
+    return LazyTimedMessage('1',schema.name,payload(schema,i),i)
+
+def test_field_samples(core:RecorderCore):
+    schema = float_schema()
+    field = schema.fields[0].name
+
+    async def consume() -> list:
+        samples = []
+        async with core.stream(FieldIndex.from_ints(1,schema.class_id,schema.msg_id,field)) as stream:
+            # The stream records the message
+            assert core.consumerCount(MessageIndex(1,schema.class_id,schema.msg_id)) == 1
+            for i in range(5):
+                core.injectLine(i,'1',schema.name,payload(schema,i))
+            async for sample in stream:
+                samples.append(sample)
+                if len(samples) == 5:
+                    break
+        return samples
+
+    samples = asyncio.run(asyncio.wait_for(consume(),10))
+    assert [(s.timestamp,s.value) for s in samples] == [(i,i + .5) for i in range(5)]
+    assert core.consumerCount(MessageIndex(1,schema.class_id,schema.msg_id)) == 0
+
+@pytest.mark.parametrize('policy,kept',[(DROP_OLDEST,[7,8,9]),(DROP_NEWEST,[0,1,2])])
+def test_drop_policy(core:RecorderCore,policy:str,kept:list[int]):
+    schema = float_schema()
+    stream = RecordStream(core,MessageIndex(1,schema.class_id,schema.msg_id),maxsize=3,batch=True,policy=policy)
+    for i in range(10):
+        stream.push(message(schema,i))
+    stream.finish()
+    assert stream.dropped == 7
+
+    async def consume() -> list:
+        return [batch async for batch in stream]
+    batches = asyncio.run(consume())
+    assert [[s.timestamp for s in b] for b in batches] == [kept]
+
+def test_unknown_policy(core:RecorderCore):
+    with pytest.raises(ValueError):
+        RecordStream(core,MessageIndex(1,1,1),policy='drop_all')
@@ -0,0 +1,100 @@
+# Copyright (C) 2024 Mael FEURGARD <mael.feurgard@enac.fr>
+#
+# This file is part of messages_python.
+#
+# messages_python is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# messages_python is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with messages_python.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import numpy as np
+
+from msgRecord.columnarLog import ColumnarMessageLog,FieldColumn
+from msgRecord.messageLog import MessageLog,LazyTimedMessage,RetentionPolicy
+
+from conftest import float_schema,int_schema,payload
+
+def fill(log,schema,count:int,start:int=0):
+    for i in range(start,start+count):
+        log.addMessage(LazyTimedMessage('1',schema.name,payload(schema,i),i*10_000_000))
+
+def test_mirrored_ring_buffer():
+    col = FieldColumn(4,np.dtype(np.int32))
+    for i in range(6):
+        col.write(i % 4,i)
+    # Slots 2,3,0,1 hold 2,3,4,5: contiguous from slot 2
+    assert col.view(2,4).tolist() == [2,3,4,5]
+
+def test_same_values_as_message_log():
+    for schema in (float_schema(),int_schema()):
+        columnar = ColumnarMessageLog(20)
+        plain = MessageLog(20)
+        fill(columnar,schema,50)
+        fill(plain,schema,50)
+
+        assert columnar.sample_count() == plain.sample_count() == 20
+        assert columnar.timestamps().tolist() == plain.timestamps()
+        for f in schema.fieldnames:
+            assert columnar.field_values(f).tolist() == plain.field_values(f)
+        assert columnar.newest() is columnar.queue[0]
+
+def test_float_fields_are_float64():
+    schema = float_schema()
+    log = ColumnarMessageLog(10)
+    log.addMessage(LazyTimedMessage('1',schema.name,' '.join(['0.1'] * len(schema.fields)),0))
+    log.addMessage(LazyTimedMessage('1',schema.name,' '.join(['0.2'] * len(schema.fields)),1))
+    values = log.field_values(schema.fields[0].name)
+    assert values.dtype == np.float64
+    assert values[0] == 0.1
+
+def test_rows_hold_python_values():
+    schema = int_schema()
+    log = ColumnarMessageLog(10)
+    fill(log,schema,3)
+    row = log.queue[2]
+    val = row[schema.fields[0].name]
+    assert type(val) is int
+    assert row.timestamp == 0
+
+def test_unbounded_growth_and_shrink():
+    schema = float_schema()
+    log = ColumnarMessageLog(None)
+    fill(log,schema,1000)
+    assert log.sample_count() == 1000
+    assert log._capacity >= 1000
+    assert log.timestamps()[0] == 0
+
+    allocated = log.nbytes()
+    log.trim(10)
+    assert log.sample_count() == 10
+    assert log.nbytes() < allocated / 4
+    assert log.timestamps().tolist() == [i*10_000_000 for i in range(990,1000)]
+
+def test_memory_limit_caps_allocation():
+    schema = float_schema()
+    log = ColumnarMessageLog(None)
+    log.setRetention(RetentionPolicy(max_samples=None,max_bytes=8192))
+    fill(log,schema,5000)
+    assert log.nbytes() <= 8192
+    assert log.newest().timestamp == 4999 * 10_000_000
+    assert log.timestamps()[-1] == 4999 * 10_000_000
+
+def test_load_columns():
+    schema = float_schema()
+    source = ColumnarMessageLog(None)
+    fill(source,schema,100)
+
+    log = ColumnarMessageLog(30)
+    log.load(source.timestamps().copy(),{f:source.field_values(f).copy() for f in schema.fieldnames},source.newest())
+    assert log.sample_count() == 30
+    assert log.stats.count == 100
+    assert log.field_values(schema.fields[0].name)[-1] == 99.5
@@ -0,0 +1,95 @@
+# Copyright (C) 2024 Mael FEURGARD <mael.feurgard@enac.fr>
+#
+# This file is part of messages_python.
+#
+# messages_python is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# messages_python is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with messages_python.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import pathlib
+
+import numpy as np
+
+from msgRecord.dataImport import read_data_file,start_import,chunk_bounds,_parse_columns,log_start_time
+from msgRecord.messageSchema import MessageSchema,FieldSchema
+
+from conftest import float_schema,int_schema,payload
+
+def write_log(path:pathlib.Path,schemas,count:int,tail:str="") -> pathlib.Path:
+    with open(path,'w') as f:
+        for i in range(count):
+            for s in schemas:
+                f.write(f"{i/10:.3f} 5 {s.name} {payload(s,i)}\n")
+        f.write(tail)
+    return path
+
+def test_read_data_file(tmp_path:pathlib.Path):
+    fs,ints = float_schema(),int_schema()
+    path = write_log(tmp_path / "flight.data",(fs,ints),200)
+    logs = read_data_file(path,processes=1,start_time=0,chunk_size=1000)
+    assert len(chunk_bounds(path,1000)) > 1
+
+    log = logs[(5,fs.class_id,fs.msg_id)]
+    assert log.sample_count() == 200
+    assert log.timestamps()[-1] == 19_900_000_000
+    assert log.field_values(fs.fields[0].name).tolist() == [i + .5 for i in range(200)]
+    assert log.newest()[fs.fields[0].name] == 199.5
+    assert logs[(5,ints.class_id,ints.msg_id)].field_values(ints.fields[0].name).tolist() == [i % 100 for i in range(200)]
+
+def test_truncated_last_line(tmp_path:pathlib.Path):
+    fs = float_schema()
+    cut = payload(fs,99).rsplit(' ',1)[0]
+    path = write_log(tmp_path / "cut.data",(fs,),10,f"1.000 5 {fs.name} {cut}")
+    logs = read_data_file(path,processes=1,start_time=0)
+    log = logs[(5,fs.class_id,fs.msg_id)]
+    assert log.sample_count() == 10
+    assert log.newest()[fs.fields[0].name] == 9.5
+
+def test_unknown_messages_are_skipped(tmp_path:pathlib.Path):
+    fs = float_schema()
+    path = write_log(tmp_path / "unknown.data",(fs,),3,"0.5 5 NOT_A_MESSAGE 1 2\n")
+    logs = read_data_file(path,processes=1,start_time=0)
+    assert list(logs.keys()) == [(5,fs.class_id,fs.msg_id)]
+
+def test_wide_integers_are_exact():
+    def field(name:str,position:int,typestr:str) -> FieldSchema:
+        return FieldSchema(name,position,typestr,typestr,False,None,True,None,None,None,None,None)
+    fields = (field('big',0,'uint64'),field('small',1,'int8'))
+    schema = MessageSchema(1,'telemetry',1,'WIDE',fields,{f.name:f for f in fields})
+
+    columns = _parse_columns(schema,[f"{2**63 + 1} -3","1 4"])
+    assert columns['big'].dtype == np.uint64
+    assert columns['big'].tolist() == [2**63 + 1,1]
+    assert columns['small'].tolist() == [-3,4]
+
+def test_log_start_time():
+    assert log_start_time("24_01_02__03_04_05.data") > 0
+    assert log_start_time("flight.data") == 0
+
+class _Recorder():
+    """Stands in for IvyRecorder.loadLogs."""
+    def __init__(self):
+        self.loaded = []
+
+    def loadLogs(self,logs):
+        self.loaded.append(logs)
+
+def test_start_import_skips_bad_files(tmp_path:pathlib.Path):
+    fs = float_schema()
+    good = write_log(tmp_path / "good.data",(fs,),5)
+    recorder = _Recorder()
+    thread = start_import([tmp_path / "missing.data",good],recorder,processes=1)
+    thread.join(10)
+    assert not(thread.is_alive())
+    assert len(recorder.loaded) == 1
+    assert recorder.loaded[0][(5,fs.class_id,fs.msg_id)].sample_count() == 5
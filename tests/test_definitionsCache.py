@@ -0,0 +1,46 @@
+# Copyright (C) 2024 Mael FEURGARD <mael.feurgard@enac.fr>
+#
+# This file is part of messages_python.
+#
+# messages_python is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# messages_python is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with messages_python.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import pathlib
+
+from msgRecord import definitionsCache
+from msgRecord.definitionsCache import read_cache,write_cache,cache_dir
+
+def test_roundtrip(tmp_path:pathlib.Path):
+    path = tmp_path / 'sub' / 'definitions.pickle'
+    write_cache(path,1,'abc',{'a':[1,2]})
+    assert read_cache(path,1,'abc') == {'a':[1,2]}
+    # No temporary file left behind
+    assert [p.name for p in path.parent.iterdir()] == ['definitions.pickle']
+
+def test_stale_or_bad_files_are_ignored(tmp_path:pathlib.Path):
+    path = tmp_path / 'definitions.pickle'
+    write_cache(path,1,'abc',{'a':1})
+    assert read_cache(path,2,'abc') is None
+    assert read_cache(path,1,'def') is None
+
+    path.write_bytes(b'not a pickle')
+    assert read_cache(path,1,'abc') is None
+    assert read_cache(tmp_path / 'missing',1,'abc') is None
+
+def test_cache_dir(monkeypatch,tmp_path:pathlib.Path):
+    monkeypatch.setenv('PPRZ_MESSAGES_CACHE','')
+    assert cache_dir() is None
+    assert definitionsCache.cache_path('x') is None
+    monkeypatch.setenv('PPRZ_MESSAGES_CACHE',str(tmp_path))
+    assert cache_dir() == tmp_path
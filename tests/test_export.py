@@ -0,0 +1,76 @@
+# Copyright (C) 2024 Mael FEURGARD <mael.feurgard@enac.fr>
+#
+# This file is part of messages_python.
+#
+# messages_python is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# messages_python is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with messages_python.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import pathlib
+
+import numpy as np
+import pytest
+
+from msgRecord.export import export_records,export_format,ExportError,_TableWriter
+from msgRecord.columnarLog import ColumnarMessageLog
+from msgRecord.messageLog import MessageLog,LazyTimedMessage,FieldIndex
+
+from conftest import float_schema,int_schema,payload
+
+def records():
+    fs,ints = float_schema(),int_schema()
+    columnar = ColumnarMessageLog(None)
+    plain = MessageLog(None)
+    for i in range(100):
+        columnar.addMessage(LazyTimedMessage('2',fs.name,payload(fs,i),i))
+        plain.addMessage(LazyTimedMessage('2',ints.name,payload(ints,i),i))
+    recs = {2:dict()}
+    recs[2].setdefault(fs.class_id,dict())[fs.msg_id] = columnar
+    recs[2].setdefault(ints.class_id,dict())[ints.msg_id] = plain
+    return recs,fs,ints
+
+def test_npz_roundtrip(tmp_path:pathlib.Path):
+    recs,fs,ints = records()
+    path = tmp_path / "export.npz"
+    progress = []
+    rows = export_records(recs,path,chunk_rows=30,progress=lambda i,n: progress.append((i,n)))
+    assert rows == 200
+    assert progress == [(1,2),(2,2)]
+
+    with np.load(path) as archive:
+        prefix = f"2_{fs.msg_class}_{fs.name}"
+        assert archive[f"{prefix}/timestamp"].tolist() == list(range(100))
+        assert archive[f"{prefix}/{fs.fields[0].name}"].tolist() == [i + .5 for i in range(100)]
+        prefix = f"2_{ints.msg_class}_{ints.name}"
+        assert archive[f"{prefix}/{ints.fields[0].name}"].tolist() == [i % 100 for i in range(100)]
+
+def test_field_selection(tmp_path:pathlib.Path):
+    recs,fs,_ = records()
+    path = tmp_path / "export.npz"
+    field = fs.fields[0].name
+    rows = export_records(recs,path,fields=[FieldIndex.from_ints(2,fs.class_id,fs.msg_id,field)])
+    assert rows == 100
+    with np.load(path) as archive:
+        prefix = f"2_{fs.msg_class}_{fs.name}"
+        assert sorted(archive.files) == sorted([f"{prefix}/timestamp",f"{prefix}/{field}"])
+
+def test_unknown_format(tmp_path:pathlib.Path):
+    assert export_format("a.H5") == 'hdf5'
+    with pytest.raises(ExportError):
+        export_format(tmp_path / "export.csv")
+    with pytest.raises(ExportError):
+        export_records({},tmp_path / "export.npz",fmt='csv')
+
+def test_writers_must_write_chunks():
+    with pytest.raises(TypeError):
+        _TableWriter()
@@ -0,0 +1,59 @@
+# Copyright (C) 2024 Mael FEURGARD <mael.feurgard@enac.fr>
+#
+# This file is part of messages_python.
+#
+# messages_python is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# messages_python is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with messages_python.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import io
+import sys
+
+from msgRecord.importProfile import ImportProfile
+
+def test_times_imports(tmp_path,monkeypatch):
+    (tmp_path / 'profiled_parent.py').write_text("import profiled_child\n")
+    (tmp_path / 'profiled_child.py').write_text("import time\ntime.sleep(0.02)\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    profile = ImportProfile()
+    profile.install()
+    try:
+        import profiled_parent
+        profile.mark('imported')
+    finally:
+        profile.uninstall()
+        sys.modules.pop('profiled_parent',None)
+        sys.modules.pop('profiled_child',None)
+    assert profile not in sys.meta_path
+
+    cumul,self_t = profile.times['profiled_child']
+    assert self_t >= 20_000_000
+    parent_cumul,parent_self = profile.times['profiled_parent']
+    # The time of the child is not counted in the self time of the parent
+    assert parent_cumul >= cumul
+    assert parent_self < 20_000_000
+    assert [l for l,_ in profile.marks] == ['imported']
+
+def test_report():
+    profile = ImportProfile()
+    out = io.StringIO()
+    profile.report(file=out)
+    assert out.getvalue() == "" # Not installed
+
+    profile.install()
+    profile.uninstall()
+    profile.installed = True
+    profile.times['some.module'] = (3_000_000,1_000_000)
+    profile.report(file=out)
+    assert "some.module" in out.getvalue()
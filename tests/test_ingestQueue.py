@@ -0,0 +1,44 @@
+# Copyright (C) 2024 Mael FEURGARD <mael.feurgard@enac.fr>
+#
+# This file is part of messages_python.
+#
+# messages_python is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# messages_python is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with messages_python.  If not, see <https://www.gnu.org/licenses/>.
+
+
+from msgRecord.ingestQueue import IngestQueue
+
+def test_fifo_order():
+    q = IngestQueue(10)
+    for i in range(5):
+        q.push(i)
+    assert q.drain(2) == [0,1]
+    assert q.drain() == [2,3,4]
+    assert len(q) == 0
+
+def test_full_queue_drops_and_counts():
+    q = IngestQueue(3)
+    results = [q.push(i) for i in range(5)]
+    assert results == [True,True,True,False,False]
+    assert q.pushed == 3
+    assert q.dropped == 2
+    assert q.drain() == [0,1,2]
+
+def test_control_items_are_never_dropped():
+    q = IngestQueue(2)
+    q.push(0)
+    q.push(1)
+    q.pushControl((None,'control'))
+    assert not(q.push(2))
+    assert q.dropped == 1
+    assert q.drain() == [0,1,(None,'control')]
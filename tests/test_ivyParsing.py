@@ -0,0 +1,51 @@
+# Copyright (C) 2024 Mael FEURGARD <mael.feurgard@enac.fr>
+#
+# This file is part of messages_python.
+#
+# messages_python is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# messages_python is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with messages_python.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import pytest
+
+from msgRecord.ivyParsing import UnknownMessageError,sender_id,split_ivy_payload,parse_field_value,decode_ivy_payload,message_class
+
+from conftest import float_schema,payload
+
+def test_split_payload():
+    assert split_ivy_payload("1  2 3") == ['1','2','3']
+    assert split_ivy_payload('1 |4,5,6| "a b" 2') == ['1','|4,5,6|','"a b"','2']
+    assert split_ivy_payload("") == []
+
+def test_parse_field_value():
+    assert parse_field_value('int16','-3') == -3
+    assert parse_field_value('float','1.5') == 1.5
+    assert parse_field_value('int16[]','|1,2,3|') == [1,2,3]
+    assert parse_field_value('float[2]','"1.5,2"') == [1.5,2.]
+    assert parse_field_value('char[]','"a b"') == 'a b'
+    assert parse_field_value('string','"name"') == 'name'
+
+def test_sender_id():
+    assert sender_id('12') == 12
+    assert sender_id('ground') == 0
+
+def test_decode_payload():
+    schema = float_schema()
+    s_id,msg = decode_ivy_payload('3',schema.name,payload(schema,1))
+    assert s_id == 3
+    assert msg.name == schema.name
+    assert float(msg[schema.fields[0].name]) == 1.5
+
+def test_unknown_message():
+    with pytest.raises(UnknownMessageError):
+        message_class('3','NOT_A_MESSAGE')
@@ -0,0 +1,45 @@
+# Copyright (C) 2024 Mael FEURGARD <mael.feurgard@enac.fr>
+#
+# This file is part of messages_python.
+#
+# messages_python is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# messages_python is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with messages_python.  If not, see <https://www.gnu.org/licenses/>.
+
+
+from msgRecord.loadGenerator import TrafficSpec,SyntheticTraffic
+from msgRecord.ivyParsing import split_ivy_payload,decode_ivy_payload
+from msgRecord.messageSchema import SCHEMAS
+
+def test_payloads_follow_the_definitions():
+    traffic = SyntheticTraffic(TrafficSpec(messages=1000,variants=2,array_size=3))
+    assert len(traffic.msg_names) > 0
+    for name,payloads in traffic.payloads.items():
+        schema = SCHEMAS.get('telemetry',name)
+        for p in payloads:
+            assert len(split_ivy_payload(p)) == len(schema.fields)
+            _,msg = decode_ivy_payload('1',name,p)
+            assert msg.name == name
+
+def test_lines():
+    traffic = SyntheticTraffic(TrafficSpec(senders=2,messages=3,rate=10.))
+    lines = traffic.lines(1.,start=100)
+    assert len(lines) == 10 * 2 * len(traffic.msg_names)
+    assert lines[0][0] == 100
+    assert lines[-1][0] == 100 + 9 * traffic.period()
+    assert {l[1] for l in lines} == {'1','2'}
+
+def test_repeatable():
+    a = SyntheticTraffic(TrafficSpec(seed=3))
+    b = SyntheticTraffic(TrafficSpec(seed=3))
+    assert a.msg_names == b.msg_names
+    assert a.payloads == b.payloads
@@ -0,0 +1,66 @@
+# Copyright (C) 2024 Mael FEURGARD <mael.feurgard@enac.fr>
+#
+# This file is part of messages_python.
+#
+# messages_python is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# messages_python is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with messages_python.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import numpy as np
+
+from msgRecord.lodRollup import FieldRollup
+
+def test_spike_survives_decimation():
+    rollup = FieldRollup(base=1000,factor=4,levels=4,capacity=1000)
+    n = 100_000
+    times = np.arange(n) * 100
+    values = np.zeros(n)
+    values[54321] = 10.
+    for t,v in zip(times,values):
+        rollup.add(int(t),v)
+
+    t,v = rollup.decimated(0,int(times[-1]),200)
+    assert len(t) <= 400
+    assert v.max() == 10.
+    assert t[np.argmax(v)] == times[54321]
+    assert np.all(np.diff(t) >= 0)
+
+def test_reaches_newest_sample():
+    rollup = FieldRollup(base=1000,factor=4,levels=4,capacity=1000)
+    for i in range(1000):
+        rollup.add(i*100,float(i))
+    # Still in the open buckets of the finer levels
+    t,v = rollup.decimated(0,99_900,10)
+    assert t[-1] == 99_900
+    assert v[-1] == 999.
+
+def test_extend_matches_add():
+    times = np.arange(5000) * 37
+    values = np.sin(np.arange(5000) / 50)
+    one = FieldRollup(base=1000,factor=4,levels=4,capacity=1000)
+    for t,v in zip(times,values):
+        one.add(int(t),v)
+    batch = FieldRollup(base=1000,factor=4,levels=4,capacity=1000)
+    batch.extend(times,values)
+
+    for a,b in zip(one.buckets(0,int(times[-1]),50),batch.buckets(0,int(times[-1]),50)):
+        assert np.allclose(a,b)
+
+def test_backfill_keeps_live_samples():
+    rollup = FieldRollup(base=1000,factor=4,levels=4,capacity=1000)
+    rollup.beginBackfill()
+    rollup.add(5000,7.)
+    rollup.extend(np.arange(50)*100,np.ones(50))
+    start,vmin,vmax,mean = rollup.buckets(0,5000,100)
+    assert vmax.max() == 7.
+    assert rollup.start() == 0
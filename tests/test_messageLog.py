@@ -0,0 +1,123 @@
+# Copyright (C) 2024 Mael FEURGARD <mael.feurgard@enac.fr>
+#
+# This file is part of messages_python.
+#
+# messages_python is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# messages_python is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with messages_python.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import numpy as np
+import pytest
+
+from msgRecord.messageLog import MessageLog,LazyTimedMessage,NoMessageError,RetentionPolicy
+
+from conftest import float_schema,int_schema,payload
+
+def lazy(schema,i:int,t:int=None,sender:str='1') -> LazyTimedMessage:
+    return LazyTimedMessage(sender,schema.name,payload(schema,i),i*10_000_000 if t is None else t)
+
+def test_truncated_payload_is_rejected():
+    schema = float_schema()
+    with pytest.raises(ValueError):
+        LazyTimedMessage('1',schema.name,payload(schema,1).rsplit(' ',1)[0],0)
+
+def test_size_limit_keeps_newest():
+    schema = float_schema()
+    log = MessageLog(5)
+    for i in range(20):
+        log.addMessage(lazy(schema,i))
+    assert log.sample_count() == 5
+    assert log.newest().timestamp == 190_000_000
+    assert log.timestamps() == [i*10_000_000 for i in range(15,20)]
+    with pytest.raises(NoMessageError):
+        MessageLog().newest()
+
+def test_time_window():
+    schema = float_schema()
+    log = MessageLog(None,window=0.1)
+    for i in range(100):
+        log.addMessage(lazy(schema,i))
+    # Samples of the last 100 ms (10 ms apart)
+    assert log.sample_count() == 11
+    assert log.timestamps()[0] == 890_000_000
+
+def test_memory_limit_and_balance():
+    schema = float_schema()
+    log = MessageLog(None)
+    log.setRetention(RetentionPolicy(max_samples=None,max_bytes=10_000))
+    for i in range(1000):
+        msg = lazy(schema,i)
+        log.addMessage(msg)
+        msg[schema.fields[0].name] # Decoding grows the message after it was stored
+    assert 1 < log.sample_count() < 1000
+    assert log.nbytes() <= 10_000 + log.newest().nbytes()
+
+    log.trim(1)
+    assert log.sample_count() == 1
+    assert log.nbytes() == log._sizes[0]
+
+def test_bad_group_value_leaves_log_untouched():
+    schema = int_schema()
+    key = schema.fields[0].name
+    log = MessageLog(10)
+    for i in range(3):
+        log.addMessage(lazy(schema,i))
+    log.groupBy(key)
+
+    bad = LazyTimedMessage('1',schema.name,' '.join(['x'] + payload(schema,3).split()[1:]),30_000_000)
+    with pytest.raises(ValueError):
+        log.addMessage(bad)
+    assert log.sample_count() == 3
+    assert log.newest().timestamp == 20_000_000
+
+    log.addMessage(lazy(schema,4))
+    assert sorted(log.subgroups().keys()) == [0,1,2,4]
+    assert log.subgroup(4).newest().timestamp == 40_000_000
+
+def test_group_by_backfills_and_follows_eviction():
+    schema = int_schema()
+    key = schema.fields[0].name
+    log = MessageLog(6)
+    for i in range(6):
+        log.addMessage(lazy(schema,i % 2,t=i))
+    log.groupBy(key)
+    groups = log.subgroups()
+    assert groups[0].timestamps() == [0,2,4]
+    assert groups[1].timestamps() == [1,3,5]
+
+    log.addMessage(lazy(schema,1,t=6))
+    assert log.subgroup(0).timestamps() == [2,4]
+    assert log.subgroup(1).timestamps() == [1,3,5,6]
+
+def test_decimated():
+    schema = float_schema()
+    field = schema.fields[0].name
+    log = MessageLog(50)
+    for i in range(1000):
+        log.addMessage(lazy(schema,i))
+
+    # By default, the stored samples
+    t,v = log.decimated(field,100)
+    assert len(t) == 50
+    assert t[0] == 950 * 10_000_000
+    assert np.all(v == np.arange(950,1000) + .5)
+
+    # Further back: from the rollups, which were built from the stored samples then updated
+    for i in range(1000,2000):
+        log.addMessage(lazy(schema,i))
+    t,v = log.decimated(field,20,t0=1000*10_000_000)
+    assert len(t) <= 40
+    assert v.max() == 1999.5
+    assert v.min() < 1100
+    log.dropRollups()
+    assert log.totalBytes() == log.nbytes()
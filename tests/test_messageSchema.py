@@ -0,0 +1,54 @@
+# Copyright (C) 2024 Mael FEURGARD <mael.feurgard@enac.fr>
+#
+# This file is part of messages_python.
+#
+# messages_python is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# messages_python is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with messages_python.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import pytest
+
+from msgRecord.messageSchema import SCHEMAS
+
+def test_ids_and_names_agree():
+    assert len(SCHEMAS) > 0
+    for s in SCHEMAS:
+        assert SCHEMAS.get(s.class_id,s.msg_id) is s
+        assert SCHEMAS.get(s.msg_class,s.name) is s
+
+def test_fields_in_payload_order():
+    for s in SCHEMAS:
+        msg = s.newMessage()
+        assert s.fieldnames == list(msg.fieldnames)
+        for i,f in enumerate(s.fields):
+            assert f.position == i
+            assert s.field(f.name) is f
+            assert f.typestr == msg.get_full_field(f.name).typestr
+
+def test_unknown_message_raises_key_error():
+    with pytest.raises(KeyError):
+        SCHEMAS.get('telemetry','NOT_A_MESSAGE')
+    s = next(iter(SCHEMAS))
+    with pytest.raises(KeyError):
+        s.field('not_a_field')
+
+def test_format_value():
+    for s in SCHEMAS:
+        for f in s.fields:
+            if f.numeric and not(f.array_type):
+                valstr,altstr = f.formatValue(2)
+                assert valstr.endswith(f.unit_suffix)
+                if f.altCoef() != 1.:
+                    assert altstr.startswith(f"{2*f.alt_unit_coef:.3f}")
+                else:
+                    assert altstr == ""
@@ -0,0 +1,65 @@
+# Copyright (C) 2024 Mael FEURGARD <mael.feurgard@enac.fr>
+#
+# This file is part of messages_python.
+#
+# messages_python is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# messages_python is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with messages_python.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import numpy as np
+
+from msgRecord.messageStats import MessageStats
+
+def test_steady_rate():
+    s = MessageStats()
+    for i in range(100):
+        s.update(i * 10_000_000,20)
+    assert s.count == 100
+    assert s.rate() == 100.
+    assert s.byteRate() == 2000.
+    assert s.gaps == 0
+    assert s.minInterval == s.maxInterval == 10_000_000
+    p = s.percentile(50)
+    assert 10_000_000 <= p <= 10_000_000 * 2**(1/8)
+
+def test_gap_detection():
+    s = MessageStats()
+    times = [i * 10_000_000 for i in range(20)] + [1_000_000_000]
+    for t in times:
+        s.update(t)
+    assert s.gaps == 1
+    assert s.maxInterval == 1_000_000_000 - 190_000_000
+
+def test_update_many_matches_update():
+    rng = np.random.default_rng(0)
+    times = np.cumsum(rng.integers(5_000_000,15_000_000,500))
+    times[300] += 500_000_000
+    times[301:] += 500_000_000
+    sizes = rng.integers(10,40,500)
+
+    one = MessageStats()
+    for t,n in zip(times,sizes):
+        one.update(int(t),int(n))
+    many = MessageStats()
+    many.updateMany(times[:100],sizes[:100])
+    many.updateMany(times[100:],sizes[100:])
+
+    assert many.count == one.count
+    assert many.last == one.last
+    assert many.totalBytes == one.totalBytes
+    assert many.gaps == one.gaps == 1
+    assert many.minInterval == one.minInterval
+    assert many.maxInterval == one.maxInterval
+    assert many.histogram == one.histogram
+    assert np.isclose(many.interval,one.interval,rtol=1e-3)
+    assert np.isclose(many.size,one.size,rtol=1e-3)
@@ -0,0 +1,50 @@
+# Copyright (C) 2024 Mael FEURGARD <mael.feurgard@enac.fr>
+#
+# This file is part of messages_python.
+#
+# messages_python is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# messages_python is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with messages_python.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import numpy as np
+
+from msgRecord.perfStats import PerfStats
+
+def test_record_and_count():
+    perf = PerfStats(enabled=True)
+    for d in range(1,101):
+        perf.record('decode',d)
+    perf.count('messages_in')
+    perf.count('messages_in',4)
+
+    stages,counters = perf.snapshot()
+    assert counters == {'messages_in':5}
+    decode = stages['decode']
+    assert decode.count == 100
+    assert decode.total == 5050
+    assert np.allclose(decode.percentiles([0,50,100]),[1,50.5,100])
+    counts,edges = decode.histogram(10)
+    assert counts.sum() == 100
+    assert len(edges) == 11
+
+def test_window_and_reset():
+    perf = PerfStats()
+    perf.WINDOW = 10
+    for d in range(100):
+        perf.record('log',d)
+    stages,_ = perf.snapshot()
+    assert len(stages['log'].durations) == 10
+    assert stages['log'].count == 100
+
+    perf.reset()
+    assert perf.snapshot() == ({},{})
@@ -0,0 +1,166 @@
+# Copyright (C) 2024 Mael FEURGARD <mael.feurgard@enac.fr>
+#
+# This file is part of messages_python.
+#
+# messages_python is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# messages_python is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with messages_python.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import time
+
+import pytest
+
+from msgRecord.recorderCore import RecorderCore
+from msgRecord.messageLog import MessageIndex,RateLog,RetentionPolicy
+
+from conftest import float_schema,int_schema,payload,wait_until
+
+@pytest.fixture
+def cores():
+    started = []
+    def make(cls=RecorderCore,**kwargs) -> RecorderCore:
+        core = cls(live=False,**kwargs)
+        started.append(core)
+        return core
+    yield make
+    for core in started:
+        core.stop()
+
+def index(schema,sender_id:int=1) -> MessageIndex:
+    return MessageIndex(sender_id,schema.class_id,schema.msg_id)
+
+@pytest.mark.parametrize('columnar',[False,True])
+def test_malformed_lines_do_not_stop_ingestion(cores,columnar:bool):
+    schema = float_schema()
+    core = cores(columnar=columnar,record_all_senders=True)
+    core.injectLine(0,'1',schema.name,payload(schema,0))
+    core.injectLine(1,'1',schema.name,payload(schema,1).rsplit(' ',1)[0]) # Truncated
+    core.injectLine(2,'1','NOT_A_MESSAGE',"1 2 3")
+    core.injectLine(3,'1',schema.name,payload(schema,3))
+
+    assert wait_until(lambda: core.ingestedCount() + core.errorCount() == 4)
+    assert core.errorCount() == 2
+    assert core.ingestedCount() == 2
+    log = core.getMessage(index(schema))
+    assert list(log.timestamps()) == [0,3]
+
+@pytest.mark.parametrize('columnar',[False,True])
+def test_bad_value_in_grouped_log(cores,columnar:bool):
+    schema = int_schema()
+    key = schema.fields[0].name
+    core = cores(columnar=columnar,record_all_senders=True)
+    core.injectLine(0,'1',schema.name,payload(schema,0))
+    assert wait_until(lambda: core.ingestedCount() == 1)
+    core.getMessage(index(schema)).groupBy(key)
+
+    core.injectLine(1,'1',schema.name,' '.join(['x'] + payload(schema,1).split()[1:]))
+    core.injectLine(2,'1',schema.name,payload(schema,2))
+    assert wait_until(lambda: core.ingestedCount() + core.errorCount() == 3)
+    assert core.errorCount() == 1
+
+    log = core.getMessage(index(schema))
+    assert list(log.timestamps()) == [0,2]
+    assert sorted(log.subgroups().keys()) == [0,2]
+
+class _SlowCore(RecorderCore):
+    # The worker only drains the queue every 0.5 s, so that it fills up
+    INGEST_PERIOD = 0.5
+
+def test_full_queue(cores):
+    schema = float_schema()
+    senders = []
+    core = cores(_SlowCore,queue_size=5,record_all_senders=True,on_new_sender=senders.append)
+    time.sleep(0.05) # Let the worker start waiting
+
+    for s in ('1','2'):
+        for i in range(20):
+            core.injectLine(i,s,schema.name,payload(schema,i))
+    assert core.droppedCount() > 0
+
+    # New senders are announced, even if they first show up when the queue is full
+    assert wait_until(lambda: sorted(senders) == [1,2])
+    # Only the messages are counted, not the control items
+    assert wait_until(lambda: core.ingestedCount() == 40 - core.droppedCount())
+    assert core.errorCount() == 0
+    assert core.queueDepth() == 0
+
+def test_retention(cores):
+    schema = float_schema()
+    core = cores(retention=RetentionPolicy(max_samples=None,window=0.05),record_all_senders=True)
+    for i in range(100):
+        core.injectLine(i*1_000_000,'1',schema.name,payload(schema,i))
+    assert wait_until(lambda: core.ingestedCount() == 100)
+    assert core.getMessage(index(schema)).sample_count() == 51
+
+def test_memory_budget(cores):
+    fs,ints = float_schema(),int_schema()
+    core = cores(buffer_size=1000,record_all_senders=True,memory_budget=1)
+    time.sleep(RecorderCore.BUDGET_PERIOD)
+    for i in range(100):
+        core.injectLine(i,'1',fs.name,payload(fs,i))
+        core.injectLine(i,'1',ints.name,payload(ints,i))
+    assert wait_until(lambda: core.ingestedCount() == 200)
+
+    # Over budget: every log is trimmed to its newest sample
+    assert wait_until(lambda: core.getMessage(index(fs)).sample_count() == 1)
+    assert core.getMessage(index(ints)).sample_count() == 1
+    usage = core.memoryUsage()
+    assert usage.total == sum(usage.per_message.values()) == usage.per_sender[1]
+
+def test_track_interest(cores):
+    schema = float_schema()
+    field = schema.fields[0].name
+    core = cores(track_interest=True)
+    for i in range(3):
+        core.injectLine(i,'4',schema.name,payload(schema,i))
+    assert wait_until(lambda: core.ingestedCount() == 3)
+
+    # Counted, not recorded: only the newest message is there
+    log = core.getMessage(index(schema,4))
+    assert type(log) is RateLog
+    assert log.sample_count() == 0
+    assert log.stats.count == 3
+    assert log.newest()[field] == 2.5
+    assert log.get_full_field(field).name == field
+
+    # Recorded from the newest message on
+    idx = index(schema,4)
+    core.acquire(idx)
+    core.acquire(idx)
+    assert core.consumerCount(idx) == 2
+    core.injectLine(3,'4',schema.name,payload(schema,3))
+    assert wait_until(lambda: core.ingestedCount() == 4)
+    log = core.getMessage(idx)
+    assert type(log) is not RateLog
+    assert list(log.timestamps()) == [2,3]
+
+    core.release(idx)
+    assert core.consumerCount(idx) == 1
+    core.release(idx)
+    assert core.consumerCount(idx) == 0
+    assert wait_until(lambda: type(core.records[4][schema.class_id][schema.msg_id]) is RateLog)
+
+def test_load_logs(cores):
+    schema = float_schema()
+    source = cores(record_all_senders=True)
+    for i in range(10):
+        source.injectLine(i,'7',schema.name,payload(schema,i))
+    assert wait_until(lambda: source.ingestedCount() == 10)
+
+    log = source.getMessage(index(schema,7))
+    senders = []
+    core = cores(on_new_sender=senders.append)
+    core.loadLogs({(7,schema.class_id,schema.msg_id):log})
+    assert wait_until(lambda: senders == [7])
+    assert core.getMessage(index(schema,7)) is log
+    assert core.ingestedCount() == 0
@@ -0,0 +1,62 @@
+# Copyright (C) 2024 Mael FEURGARD <mael.feurgard@enac.fr>
+#
+# This file is part of messages_python.
+#
+# messages_python is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# messages_python is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with messages_python.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import pathlib
+
+from msgRecord.replay import ReplaySource
+from msgRecord.recorderCore import RecorderCore
+from msgRecord.segmentFile import SegmentWriter,Recording
+from msgRecord.messageSchema import SCHEMAS
+from msgRecord.messageLog import MessageIndex
+
+from conftest import float_schema,payload,wait_until
+
+def unknown_id(class_id:int) -> int:
+    ids = {s.msg_id for s in SCHEMAS if s.class_id == class_id}
+    return next(i for i in range(255,0,-1) if not(i in ids))
+
+def test_replay(tmp_path:pathlib.Path):
+    schema = float_schema()
+    unknown = unknown_id(schema.class_id)
+    writer = SegmentWriter(tmp_path)
+    for i in range(50):
+        writer.write(i*1_000_000,3,schema.class_id,schema.msg_id,payload(schema,i))
+        writer.write(i*1_000_000,3,schema.class_id,unknown,"1 2 3")
+    writer.close()
+
+    core = RecorderCore(live=False,buffer_size=100,record_all_senders=True)
+    recording = Recording([tmp_path])
+    replay = ReplaySource(core,recording,speed=None)
+    try:
+        replay.start()
+        assert wait_until(replay.isFinished)
+        assert wait_until(lambda: core.ingestedCount() == 50)
+        # Unknown messages are counted, not injected
+        assert replay.skipped == 50
+        assert replay.position() == 49_000_000
+
+        log = core.getMessage(MessageIndex(3,schema.class_id,schema.msg_id))
+        times = list(log.timestamps())
+        assert len(times) == 50
+        # Replayed on the wall clock, with the recorded spacing
+        assert times[-1] - times[0] == 49_000_000
+        assert log.newest()[schema.fields[0].name] == 49.5
+    finally:
+        replay.stop()
+        core.stop()
+        recording.close()
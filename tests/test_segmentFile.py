@@ -0,0 +1,84 @@
+# Copyright (C) 2024 Mael FEURGARD <mael.feurgard@enac.fr>
+#
+# This file is part of messages_python.
+#
+# messages_python is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# messages_python is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with messages_python.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import pathlib
+
+import pytest
+
+from msgRecord.segmentFile import MAGIC,RECORD_HEADER,SegmentWriter,SegmentReader,SegmentError,Recording,pack_records
+
+def records(n:int,start:int=0) -> list[tuple[int,int,int,int,str]]:
+    return [(1000*i,i % 3,1,i % 200,f"{i} {i/2}") for i in range(start,start+n)]
+
+def test_pack_skips_oversized_records():
+    buffer,skipped = pack_records([(0,1,1,1,"a"),(1,1,1,1,"x" * 70000),(2,70000,1,1,"b")])
+    assert skipped == 2
+    assert len(buffer) == RECORD_HEADER.size + 1
+
+def test_roundtrip(tmp_path:pathlib.Path):
+    writer = SegmentWriter(tmp_path,"test")
+    for r in records(500):
+        writer.write(*r)
+    writer.close()
+    assert writer.written == 500
+    assert writer.droppedCount() == 0
+
+    recording = Recording.from_directory(tmp_path,"test")
+    try:
+        assert len(recording) == 500
+        assert recording.record(123) == records(1,123)[0]
+        assert recording.startTime() == 0
+        assert recording.endTime() == 499_000
+        assert recording.find(10_500) == 11
+        assert recording.find(10**9) == 500
+    finally:
+        recording.close()
+
+def test_segments_roll_over(tmp_path:pathlib.Path):
+    writer = SegmentWriter(tmp_path,"test",segment_size=1000)
+    writer.CHUNK = 10
+    for r in records(300):
+        writer.write(*r)
+    writer.close()
+    assert len(writer.segments) > 1
+
+    recording = Recording(writer.segments)
+    try:
+        assert len(recording) == 300
+        assert [recording.timestamp(i) for i in range(300)] == [1000*i for i in range(300)]
+        assert recording.record(299) == records(1,299)[0]
+    finally:
+        recording.close()
+
+def test_truncated_last_record_is_ignored(tmp_path:pathlib.Path):
+    path = tmp_path / "cut.pprzrec"
+    buffer,_ = pack_records(records(10))
+    path.write_bytes(MAGIC + bytes(buffer[:-3]))
+    reader = SegmentReader(path)
+    try:
+        assert len(reader) == 9
+        assert reader.record(8) == records(1,8)[0]
+    finally:
+        reader.close()
+
+def test_not_a_segment(tmp_path:pathlib.Path):
+    for content in (b"",b"hello world"):
+        path = tmp_path / "bad.pprzrec"
+        path.write_bytes(content)
+        with pytest.raises(SegmentError):
+            SegmentReader(path)
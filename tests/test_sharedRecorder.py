@@ -0,0 +1,65 @@
+# Copyright (C) 2024 Mael FEURGARD <mael.feurgard@enac.fr>
+#
+# This file is part of messages_python.
+#
+# messages_python is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# messages_python is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with messages_python.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import os
+
+import pytest
+
+pytest.importorskip('PyQt5')
+os.environ.setdefault('QT_QPA_PLATFORM','offscreen')
+
+from PyQt5.QtCore import QCoreApplication
+
+from msgRecord.sharedRecorder import SharedRecorder
+from msgRecord.recorderCore import RecorderCore
+from msgRecord.messageLog import MessageIndex
+
+from conftest import float_schema,payload,wait_until
+
+def test_shared_recorder():
+    app = QCoreApplication.instance() or QCoreApplication([])
+    schema = float_schema()
+    name = f"pprzview{os.getpid()}"
+    core = RecorderCore(live=False,record_all_senders=True)
+    publisher = core.startSharing(name,capacity=64)
+    viewer = SharedRecorder(name,period=10)
+    senders = []
+    viewer.new_sender.connect(senders.append)
+    try:
+        for i in range(5):
+            core.injectLine(i,'6',schema.name,payload(schema,i))
+        assert wait_until(lambda: publisher.written == 5)
+        viewer.poll()
+        assert senders == [6]
+
+        index = MessageIndex(6,schema.class_id,schema.msg_id)
+        log = viewer.getMessage(index)
+        assert log.sample_count() == 5
+        assert log.newest()[schema.fields[0].name] == 4.5
+
+        # Consumers are only counted
+        viewer.acquire(index)
+        viewer.acquire(index)
+        viewer.release(index)
+        assert viewer.consumerCount(index) == 1
+        viewer.release(index)
+        viewer.release(index)
+        assert viewer.consumerCount(index) == 0
+    finally:
+        viewer.stop()
+        core.stop()
@@ -0,0 +1,69 @@
+# Copyright (C) 2024 Mael FEURGARD <mael.feurgard@enac.fr>
+#
+# This file is part of messages_python.
+#
+# messages_python is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# messages_python is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with messages_python.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import os
+
+import numpy as np
+import pytest
+
+from msgRecord.sharedStore import SharedIndex,SharedMessageLog,SharedStoreError
+from msgRecord.recorderCore import RecorderCore
+
+from conftest import float_schema,payload,wait_until
+
+def test_publish_and_read():
+    schema = float_schema()
+    field = schema.fields[0].name
+    name = f"pprztest{os.getpid()}"
+    core = RecorderCore(live=False,record_all_senders=True)
+    publisher = core.startSharing(name,capacity=64)
+    try:
+        for i in range(10):
+            core.injectLine(i,'5',schema.name,payload(schema,i))
+        assert wait_until(lambda: publisher.written == 10)
+
+        index = SharedIndex(name)
+        assert index.entries() == [(5,schema.class_id,schema.msg_id)]
+        assert index.entries(1) == []
+        index.close()
+
+        log = SharedMessageLog(name,5,schema.class_id,schema.msg_id)
+        try:
+            assert log.refresh()
+            assert not(log.refresh())
+            assert log.sample_count() == 10
+            assert log.timestamps().tolist() == list(range(10))
+            assert np.asarray(log.field_values(field)).tolist() == [i + .5 for i in range(10)]
+            assert log.newest()[field] == 9.5
+
+            # Older samples are overwritten, the readers only see the newest ones
+            for i in range(10,200):
+                core.injectLine(i,'5',schema.name,payload(schema,i))
+            assert wait_until(lambda: publisher.written == 200)
+            assert log.refresh()
+            assert log.sample_count() == log.size < 64
+            assert log.timestamps()[-1] == 199
+            # Samples overwritten before the refresh are not accounted for
+            assert log.stats.count == 10 + log.sample_count()
+        finally:
+            log.close()
+    finally:
+        core.stop()
+
+    with pytest.raises(SharedStoreError):
+        SharedIndex(name)
@@ -0,0 +1,67 @@
+# Copyright (C) 2024 Mael FEURGARD <mael.feurgard@enac.fr>
+#
+# This file is part of messages_python.
+#
+# messages_python is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# messages_python is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with messages_python.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import pathlib
+
+from msgRecord.telemetryServer import TelemetryClient,MESSAGES,FIELDS,ERROR,split_frames,frame
+from msgRecord.recorderCore import RecorderCore
+from msgRecord.messageLog import MessageIndex,FieldIndex
+
+from conftest import float_schema,payload,wait_until
+
+def test_split_frames():
+    buffer = bytearray(frame(MESSAGES,b"abc") + frame(FIELDS,b"") + frame(ERROR,b"xyz")[:-1])
+    assert split_frames(buffer) == [(MESSAGES,b"abc"),(FIELDS,b"")]
+    # The incomplete frame is kept
+    assert len(buffer) == len(frame(ERROR,b"xyz")) - 1
+
+def receive(client:TelemetryClient,counts:dict[int,int]) -> dict[int,list]:
+    """Content of the frames received until there are `counts[frame type]` items of each type."""
+    content = {t:[] for t in counts.keys()}
+    while any(len(content[t]) < n for t,n in counts.items()):
+        for t,c in client.receive():
+            if t in content:
+                content[t].extend(c if isinstance(c,list) else [c])
+    return content
+
+def test_subscriptions(tmp_path:pathlib.Path):
+    schema = float_schema()
+    field = schema.fields[0].name
+    core = RecorderCore(live=False,record_all_senders=True)
+    address = str(tmp_path / "server.sock")
+    server = core.startServing(address)
+    client = TelemetryClient(address,timeout=10)
+    try:
+        sub = client.subscribeField(FieldIndex.from_ints(2,schema.class_id,schema.msg_id,field))
+        bad = client.subscribeField(FieldIndex.from_ints(2,schema.class_id,schema.msg_id,'not_a_field'))
+        client.subscribeMessage(MessageIndex(None,schema.class_id,schema.msg_id))
+        assert wait_until(lambda: server.clientCount() == 1)
+
+        errors = receive(client,{ERROR:1})[ERROR]
+        assert errors[0][0] == bad
+
+        for i in range(10):
+            core.injectLine(i,'2',schema.name,payload(schema,i))
+        content = receive(client,{FIELDS:10,MESSAGES:10})
+        assert content[FIELDS] == [(sub,i,(i + .5,)) for i in range(10)]
+        records = content[MESSAGES]
+        assert [r[:4] for r in records] == [(i,2,schema.class_id,schema.msg_id) for i in range(10)]
+        assert records[3][4] == payload(schema,3)
+    finally:
+        client.close()
+        core.stop()